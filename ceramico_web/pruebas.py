@@ -0,0 +1,10 @@
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class DescubrirDesdeProyecto(DiscoverRunner):
+    # La raíz del repositorio tiene un __init__.py: sin esto unittest sube un nivel y busca
+    # los tests como "package.inventario.tests", que no se puede importar. Así
+    # "python manage.py test inventario" funciona igual que "inventario.tests".
+    def __init__(self, *args, top_level=None, **kwargs):
+        super().__init__(*args, top_level=top_level or str(settings.BASE_DIR), **kwargs)
@@ -60,8 +60,11 @@ INSTALLED_APPS = [
 # MIDDLEWARE
 # -----------------------------
 MIDDLEWARE = [
+    # Primero, para medir también el resto de middlewares (ver inventario/instrumentacion.py)
+    'inventario.instrumentacion.InstrumentacionMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise con soporte async (ver inventario/estaticos.py)
+    'inventario.estaticos.EstaticosMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -71,10 +74,12 @@ MIDDLEWARE = [
 ]
 
 # -----------------------------
-# URLs y WSGI
+# URLs, WSGI y ASGI
 # -----------------------------
 ROOT_URLCONF = 'ceramico_web.urls'
 WSGI_APPLICATION = 'ceramico_web.wsgi.application'
+# Producción corre en ASGI (gunicorn + workers de uvicorn, ver Procfile)
+ASGI_APPLICATION = 'ceramico_web.asgi.application'
 
 # -----------------------------
 # TEMPLATES
@@ -101,17 +106,50 @@ TEMPLATES = [
 DATABASE_URL = os.environ.get('DATABASE_URL')
 
 if DATABASE_URL:
+    # Bajo ASGI cada petición usa un hilo distinto del pool de sync_to_async y las
+    # conexiones persistentes quedarían abiertas por hilo: se usa el pool de psycopg
     DATABASES = {
-        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=600)
+        'default': dj_database_url.parse(DATABASE_URL, conn_max_age=0)
+    }
+    DATABASES['default'].setdefault('OPTIONS', {})['pool'] = {
+        'min_size': int(os.getenv('DB_POOL_MIN', 2)),
+        'max_size': int(os.getenv('DB_POOL_MAX', 10)),
     }
 else:
+    # SQLite de las sucursales: WAL deja leer mientras alguien escribe, synchronous=NORMAL
+    # es seguro con WAL (solo el último commit puede perderse si se corta la luz) y
+    # mmap evita copiar páginas al leer. IMMEDIATE toma el bloqueo de escritura al
+    # empezar la transacción: sin él dos ventas que leen y luego escriben chocan con
+    # "database is locked" sin esperar al busy timeout. Las escrituras del mismo proceso
+    # además hacen fila en inventario/escritura.py.
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.sqlite3',
             'NAME': BASE_DIR / 'db.sqlite3',
+            'OPTIONS': {
+                'init_command': (
+                    'PRAGMA journal_mode=WAL;'
+                    'PRAGMA synchronous=NORMAL;'
+                    f"PRAGMA mmap_size={int(os.getenv('SQLITE_MMAP_BYTES', 256 * 1024 * 1024))};"
+                    'PRAGMA temp_store=MEMORY;'
+                ),
+                'timeout': int(os.getenv('SQLITE_TIMEOUT', 20)),  # busy timeout en segundos
+                'transaction_mode': 'IMMEDIATE',
+            },
         }
     }
 
+# -----------------------------
+# CACHÉ
+# -----------------------------
+# Basada en archivos para que todos los workers de gunicorn compartan los datos
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('DJANGO_CACHE_DIR', str(BASE_DIR / 'cache')),
+    }
+}
+
 # -----------------------------
 # VALIDACIÓN DE CONTRASEÑAS
 # -----------------------------
@@ -153,6 +191,18 @@ LOGOUT_REDIRECT_URL = '/login/'
 # -----------------------------
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 DATA_UPLOAD_MAX_NUMBER_FIELDS = 10000
+TEST_RUNNER = 'ceramico_web.pruebas.DescubrirDesdeProyecto'
+
+# Importaciones de Excel en segundo plano
+IMPORTACION_HILOS = int(os.getenv('IMPORTACION_HILOS', '2'))  # trabajos simultáneos por proceso
+# Sin noticias de un trabajo en este tiempo se da por interrumpido (worker reiniciado)
+IMPORTACION_LATIDO_SEGUNDOS = int(os.getenv('IMPORTACION_LATIDO_SEGUNDOS', '900'))
+
+# Métricas por vista expuestas en /metrics (token para el recolector de Prometheus)
+INSTRUMENTACION_ACTIVA = os.getenv('INSTRUMENTACION_ACTIVA', 'True') == 'True'
+METRICAS_TOKEN = os.getenv('METRICAS_TOKEN', '')
+# Registra en el log "inventario.consultas_lentas" las consultas que superen estos ms (vacío = apagado)
+INSTRUMENTACION_CONSULTA_LENTA_MS = float(os.getenv('CONSULTA_LENTA_MS')) if os.getenv('CONSULTA_LENTA_MS') else None
 
 # -----------------------------
 # SEGURIDAD EXTRA PARA RENDER
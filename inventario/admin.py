@@ -1,9 +1,10 @@
 from django.contrib import admin
-from .models import Producto, Categoria, Cliente, Caja, Sale, SaleItem
+from .models import Producto, Categoria, Cliente, Caja, Venta, DetalleVenta
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ('nombre', 'marca', 'categoria', 'stock', 'unidad_medida', 'precio_venta', 'proveedor')
+    list_display = ('nombre', 'marca', 'categoria', 'stock', 'unidad_medida', 'precio_venta', 'proveedor', 'codigo_barras')
+    search_fields = ('nombre', 'codigo_barras')
     readonly_fields = ('id',)  # si quieres mostrar el ID nada más
 
 @admin.register(Categoria)
@@ -18,11 +19,11 @@ class ClienteAdmin(admin.ModelAdmin):
 class CajaAdmin(admin.ModelAdmin):
     list_display = ('usuario', 'monto_inicial', 'monto_cierre', 'abierta', 'fecha_apertura', 'fecha_cierre', 'total')
 
-class SaleItemInline(admin.TabularInline):
-    model = SaleItem
+class DetalleVentaInline(admin.TabularInline):
+    model = DetalleVenta
     extra = 1
 
-@admin.register(Sale)
-class SaleAdmin(admin.ModelAdmin):
+@admin.register(Venta)
+class VentaAdmin(admin.ModelAdmin):
     list_display = ('numero_venta', 'cliente', 'tipo_comprobante', 'fecha', 'total', 'caja')
-    inlines = [SaleItemInline]
+    inlines = [DetalleVentaInline]
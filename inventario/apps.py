@@ -6,6 +6,8 @@ class InventarioConfig(AppConfig):
     name = 'inventario'
 
     def ready(self):
+        from . import signals  # registra los receptores de señales
+
         # Crear superusuario en Render automáticamente
         if not settings.DEBUG and settings.ALLOWED_HOSTS:
             try:
@@ -0,0 +1,174 @@
+import random
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .. import busqueda, kardex, respaldo, resumenes
+from ..models import (
+    Caja, Categoria, Cliente, DetalleVenta, MovimientoCaja, MovimientoStock, Producto, Secuencia, Venta,
+)
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+ARCHIVO_MUESTRA = Path(settings.BASE_DIR) / "datos.json"
+TAMANO_LOTE = 1000
+LINEAS_POR_VENTA = (1, 8)
+COMPROBANTES = {"Nota": 6, "Boleta": 3, "Factura": 1}  # pesos relativos
+
+ESCALAS = {
+    "pequena": {"productos": 500, "clientes": 50, "cajas": 10, "ventas": 2000, "dias": 60},
+    "mediana": {"productos": 5000, "clientes": 500, "cajas": 60, "ventas": 30000, "dias": 365},
+    "grande": {"productos": 20000, "clientes": 2000, "cajas": 250, "ventas": 150000, "dias": 730},
+}
+
+
+# --------------------------
+# PERFIL DE LA MUESTRA
+# --------------------------
+def perfil(ruta=ARCHIVO_MUESTRA):
+    # Distribuciones reales (categorías, marcas, medidas, palabras, precios) para imitar el catálogo
+    with respaldo.abrir(ruta) as texto:
+        objetos = list(respaldo.objetos(texto))
+    categorias = {o["pk"]: o["fields"]["nombre"] for o in objetos if o["model"] == "inventario.categoria"}
+    productos = [o["fields"] for o in objetos if o["model"] == "inventario.producto"]
+    return {
+        "categorias": Counter(categorias.get(p["categoria"], "OTROS") for p in productos),
+        "marcas": Counter(p["marca"] for p in productos),
+        "unidades": Counter(p["unidad_medida"] for p in productos),
+        "proveedores": Counter(p["proveedor"] or "" for p in productos),
+        "palabras": Counter(palabra for p in productos for palabra in p["nombre"].split()),
+        "precios": [Decimal(p["precio_venta"]) for p in productos if Decimal(p["precio_venta"]) > 0],
+    }
+
+
+def _elegir(rng, contador):
+    return rng.choices(list(contador), weights=list(contador.values()))[0]
+
+
+# --------------------------
+# GENERADOR
+# --------------------------
+def generar(escala, semilla=42, ruta_muestra=ARCHIVO_MUESTRA):
+    # Llena la BD actual con datos sintéticos reproducibles (misma semilla -> mismos datos)
+    rng = random.Random(semilla)
+    muestra = perfil(ruta_muestra)
+    with transaction.atomic():
+        usuario, _ = User.objects.get_or_create(username="benchmark")
+        categorias = _generar_categorias(muestra)
+        productos = _generar_productos(rng, muestra, categorias, escala["productos"])
+        clientes = Cliente.objects.bulk_create(
+            [Cliente(nombre=f"Cliente {i:05d}") for i in range(escala["clientes"])], batch_size=TAMANO_LOTE
+        )
+        cajas = _generar_cajas(usuario, escala["cajas"])
+        ventas = _generar_ventas(rng, escala, productos, clientes, cajas)
+
+    # Índices derivados, igual que tras una importación o una reconstrucción
+    busqueda.reindexar_todo()
+    resumenes.reconstruir()
+    return {
+        "usuario": usuario,
+        "categorias": len(categorias),
+        "productos": len(productos),
+        "clientes": len(clientes),
+        "cajas": len(cajas),
+        "ventas": ventas,
+    }
+
+
+def _generar_categorias(muestra):
+    return [Categoria.objects.get_or_create(nombre=nombre.upper())[0] for nombre in muestra["categorias"]]
+
+
+def _generar_productos(rng, muestra, categorias, cantidad):
+    por_nombre = {c.nombre: c for c in categorias}
+    palabras = muestra["palabras"]
+    productos = []
+    for i in range(cantidad):
+        categoria = por_nombre[_elegir(rng, muestra["categorias"]).upper()]
+        nombre = " ".join(_elegir(rng, palabras) for _ in range(rng.randint(2, 4)))
+        precio = rng.choice(muestra["precios"]) * Decimal(rng.uniform(0.8, 1.2))
+        productos.append(Producto(
+            nombre=f"{nombre} {i:05d}",
+            marca=_elegir(rng, muestra["marcas"]),
+            categoria=categoria,
+            unidad_medida=_elegir(rng, muestra["unidades"]),
+            precio_venta=precio.quantize(Decimal("0.01")),
+            stock=Decimal(rng.randint(0, 500)),
+            proveedor=_elegir(rng, muestra["proveedores"]),
+        ))
+    productos = Producto.objects.bulk_create(productos, batch_size=TAMANO_LOTE)
+    # bulk_create no dispara señales: el kardex arranca con el stock generado
+    kardex.registrar(
+        MovimientoStock(producto_id=p.pk, tipo="inicial", cantidad=p.stock, referencia="benchmark")
+        for p in productos
+    )
+    return productos
+
+
+def _generar_cajas(usuario, cantidad):
+    # Todas cerradas menos la última, que queda abierta para registrar ventas
+    return Caja.objects.bulk_create([
+        Caja(usuario=usuario, monto_inicial=0, abierta=(i == cantidad - 1)) for i in range(cantidad)
+    ])
+
+
+def _generar_ventas(rng, escala, productos, clientes, cajas):
+    ahora = timezone.now()
+    dias = escala["dias"]
+    # Fechas ordenadas: la numeración correlativa sigue el orden cronológico
+    fechas = sorted(ahora - timedelta(seconds=rng.uniform(0, dias * 86400)) for _ in range(escala["ventas"]))
+    tipos = [_elegir(rng, COMPROBANTES) for _ in fechas]
+    numeros = {tipo: iter(Secuencia.reservar(Venta.serie(tipo), tipos.count(tipo))) for tipo in COMPROBANTES}
+
+    creadas = 0
+    for inicio in range(0, len(fechas), TAMANO_LOTE):
+        ventas, lineas_por_venta = [], []
+        for fecha, tipo in zip(fechas[inicio:inicio + TAMANO_LOTE], tipos[inicio:inicio + TAMANO_LOTE]):
+            lineas = [
+                (producto, Decimal(rng.randint(1, 10)), producto.precio_venta)
+                for producto in rng.sample(productos, rng.randint(*LINEAS_POR_VENTA))
+            ]
+            antiguedad = (ahora - fecha).total_seconds() / (dias * 86400)
+            caja = cajas[min(len(cajas) - 1, int((1 - antiguedad) * len(cajas)))]
+            ventas.append(Venta(
+                cliente=rng.choice(clientes),
+                tipo_comprobante=tipo,
+                numero_venta=next(numeros[tipo]),
+                total=Venta.calcular_total((cantidad, precio) for _, cantidad, precio in lineas),
+                caja=caja,
+                fecha=fecha,
+            ))
+            lineas_por_venta.append(lineas)
+
+        ventas = Venta.objects.bulk_create(ventas)
+        # auto_now_add pisa la fecha al insertar; bulk_update la deja como se generó
+        for venta, fecha in zip(ventas, fechas[inicio:inicio + TAMANO_LOTE]):
+            venta.fecha = fecha
+        Venta.objects.bulk_update(ventas, ["fecha"])
+        DetalleVenta.objects.bulk_create([
+            DetalleVenta(sale=venta, producto=producto, cantidad=cantidad, precio=precio)
+            for venta, lineas in zip(ventas, lineas_por_venta)
+            for producto, cantidad, precio in lineas
+        ], batch_size=TAMANO_LOTE)
+        MovimientoCaja.objects.bulk_create([
+            MovimientoCaja(caja_id=venta.caja_id, venta=venta, tipo="venta", monto=venta.total) for venta in ventas
+        ])
+        creadas += len(ventas)
+
+    # Totales de caja coherentes con su libro de movimientos. El historial no descuenta
+    # stock: el stock generado ya es el "actual" y el kardex solo tiene el saldo inicial.
+    totales = dict(
+        MovimientoCaja.objects.values("caja_id").annotate(total=Sum("monto")).values_list("caja_id", "total")
+    )
+    for caja in cajas:
+        caja.total = totales.get(caja.pk, Decimal("0"))
+    Caja.objects.bulk_update(cajas, ["total"])
+    return creadas
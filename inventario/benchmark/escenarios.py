@@ -0,0 +1,182 @@
+import io
+import math
+import random
+import statistics
+import time
+
+import openpyxl
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from ..importacion import ENCABEZADOS, MODO_ACTUALIZAR
+from ..models import Producto
+
+FILAS_IMPORTACION = 200
+ESPERA_IMPORTACION = 120  # segundos máximos esperando al hilo de importación
+
+
+class ErrorBenchmark(Exception):
+    pass
+
+
+# --------------------------
+# MEDICIÓN
+# --------------------------
+def _percentil(ordenados, p):
+    # Rango más cercano: con pocas muestras no interpola valores que nunca ocurrieron
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def _consumir(respuesta):
+    # Las respuestas en streaming (exportar) solo hacen el trabajo al recorrerlas
+    if respuesta.streaming:
+        for _ in respuesta.streaming_content:
+            pass
+    return respuesta
+
+
+def medir(peticion, repeticiones, calentamiento=1):
+    tiempos, consultas = [], []
+    for i in range(calentamiento + repeticiones):
+        with CaptureQueriesContext(connection) as capturadas:
+            inicio = time.perf_counter()
+            respuesta = _consumir(peticion())
+            duracion = (time.perf_counter() - inicio) * 1000
+        if respuesta.status_code >= 400:
+            raise ErrorBenchmark(f"La petición respondió {respuesta.status_code}")
+        if i >= calentamiento:
+            tiempos.append(duracion)
+            consultas.append(len(capturadas))
+    ordenados = sorted(tiempos)
+    return {
+        "repeticiones": repeticiones,
+        "p50_ms": round(_percentil(ordenados, 50), 2),
+        "p95_ms": round(_percentil(ordenados, 95), 2),
+        "p99_ms": round(_percentil(ordenados, 99), 2),
+        "max_ms": round(ordenados[-1], 2),
+        "media_ms": round(statistics.fmean(tiempos), 2),
+        "consultas": max(consultas),
+    }
+
+
+# --------------------------
+# ESCENARIOS
+# --------------------------
+# Cada escenario recibe el contexto y devuelve una función sin argumentos que hace
+# una petición con el cliente de pruebas. Los datos variables salen de un Random
+# con semilla, así dos corridas hacen exactamente las mismas peticiones.
+def _registrar_venta(ctx):
+    rng = ctx["rng"]
+    con_stock = list(Producto.objects.filter(stock__gte=50).values_list("id", "precio_venta")[:1000])
+
+    def peticion():
+        carrito = rng.sample(con_stock, min(5, len(con_stock)))
+        return ctx["cliente"].post(reverse("registrar_venta"), {
+            "cliente": "Cliente benchmark",
+            "tipo_comprobante": "Nota",
+            "producto_id[]": [pid for pid, _ in carrito],
+            "cantidad[]": ["1"] * len(carrito),
+            "precio[]": [str(precio) for _, precio in carrito],
+        })
+    return peticion
+
+
+def _lista_productos(ctx):
+    return lambda: ctx["cliente"].get(reverse("lista_productos"))
+
+
+def _lista_productos_busqueda(ctx):
+    rng = ctx["rng"]
+    palabras = [p for p in ctx["palabras"] if len(p) > 3] or ["porcelanato"]
+    return lambda: ctx["cliente"].get(reverse("lista_productos"), {"q": rng.choice(palabras)})
+
+
+def _listar_ventas(ctx):
+    return lambda: ctx["cliente"].get(reverse("listar_ventas"))
+
+
+def _dashboard(ctx):
+    return lambda: ctx["cliente"].get(reverse("dashboard"))
+
+
+def _exportar_excel(ctx):
+    return lambda: ctx["cliente"].get(reverse("exportar_excel"), {"formato": "xlsx"})
+
+
+def _libro_importacion(filas):
+    wb = openpyxl.Workbook()
+    ws = wb.active
+    ws.title = "BENCHMARK"
+    ws.append(ENCABEZADOS)
+    for nombre, marca, categoria, unidad, precio, stock, proveedor in filas:
+        ws.append([nombre, marca, categoria, unidad, float(precio), float(stock) + 1, 0, proveedor or ""])
+    archivo = io.BytesIO()
+    wb.save(archivo)
+    return archivo.getvalue()
+
+
+def _importar_excel(ctx):
+    # Modo actualizar sobre productos existentes: mide de punta a punta, subida + trabajo
+    # en segundo plano. Las consultas contadas son solo las del hilo de la petición.
+    filas = Producto.objects.order_by("id").values_list(
+        "nombre", "marca", "categoria__nombre", "unidad_medida", "precio_venta", "stock", "proveedor"
+    )[:FILAS_IMPORTACION]
+    contenido = _libro_importacion(filas)
+    cliente = ctx["cliente"]
+
+    def peticion():
+        archivo = SimpleUploadedFile("benchmark.xlsx", contenido)
+        respuesta = cliente.post(reverse("importar_excel"), {"archivo": archivo, "modo": MODO_ACTUALIZAR})
+        trabajo_id = int(respuesta["Location"].rsplit("=", 1)[1])
+        limite = time.monotonic() + ESPERA_IMPORTACION
+        while time.monotonic() < limite:
+            estado = cliente.get(reverse("estado_importacion", args=[trabajo_id]))
+            datos = estado.json()
+            if datos["terminado"]:
+                if datos["estado"] == "error":
+                    raise ErrorBenchmark(f"La importación falló: {datos['errores']}")
+                return estado
+            time.sleep(0.01)
+        raise ErrorBenchmark("La importación no terminó a tiempo")
+    return peticion
+
+
+ESCENARIOS = {
+    "registrar_venta": _registrar_venta,
+    "lista_productos": _lista_productos,
+    "lista_productos_busqueda": _lista_productos_busqueda,
+    "listar_ventas": _listar_ventas,
+    "dashboard": _dashboard,
+    "importar_excel": _importar_excel,
+    "exportar_excel": _exportar_excel,
+}
+
+
+def ejecutar(usuario, palabras, nombres=None, repeticiones=20, semilla=42):
+    cliente = Client()
+    cliente.force_login(usuario)
+    ctx = {"cliente": cliente, "rng": random.Random(semilla), "palabras": sorted(palabras)}
+    resultados = {}
+    for nombre in nombres or ESCENARIOS:
+        resultados[nombre] = medir(ESCENARIOS[nombre](ctx), repeticiones)
+    return resultados
+
+
+# --------------------------
+# LÍNEA BASE
+# --------------------------
+def comparar(resultados, linea_base, umbral=0.25):
+    # Regresión: p95 más lento que la base en más del umbral, o más consultas que la base
+    regresiones = []
+    for nombre, actual in resultados.items():
+        base = linea_base.get("escenarios", {}).get(nombre)
+        if not base:
+            continue
+        if actual["p95_ms"] > base["p95_ms"] * (1 + umbral):
+            regresiones.append(f"{nombre}: p95 {actual['p95_ms']} ms (base {base['p95_ms']} ms)")
+        if actual["consultas"] > base["consultas"]:
+            regresiones.append(f"{nombre}: {actual['consultas']} consultas (base {base['consultas']})")
+    return regresiones
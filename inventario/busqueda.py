@@ -0,0 +1,111 @@
+import math
+import re
+import unicodedata
+
+from django.db import connection, transaction
+from django.db.models import Count
+
+from .models import Producto, TrigramaProducto
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+CAMPOS_INDEXADOS = ["nombre", "marca", "proveedor", "unidad_medida"]
+TAMANO_LOTE = 500  # productos por lote al reindexar
+SIMILITUD_MINIMA = 0.5  # fracción de trigramas de la búsqueda que debe coincidir
+LIMITE_RESULTADOS = 200
+
+_NO_ALFANUMERICO = re.compile(r"[^a-z0-9]+")
+
+
+# --------------------------
+# NORMALIZACIÓN
+# --------------------------
+def normalizar(texto):
+    # "Porcelanato Ébano 60X60" -> "porcelanato ebano 60x60"
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c)).lower()
+    return _NO_ALFANUMERICO.sub(" ", texto).strip()
+
+
+def trigramas(texto):
+    # Igual que pg_trgm: cada palabra se rellena con dos espacios al inicio y uno al final
+    resultado = set()
+    for palabra in normalizar(texto).split():
+        relleno = f"  {palabra} "
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def trigramas_producto(valores):
+    return trigramas(" ".join(str(v) for v in valores if v))
+
+
+# --------------------------
+# MANTENIMIENTO DEL ÍNDICE
+# --------------------------
+def indexar(producto_ids):
+    # Reconstruye las entradas de los productos indicados (altas, cambios o importaciones)
+    producto_ids = list(producto_ids)
+    # INSERT con executemany: con unos 40 trigramas por producto, armar una instancia
+    # de modelo por fila (bulk_create) costaba tres veces más que la escritura misma
+    insertar = "INSERT INTO %s (trigrama, producto_id) VALUES (%%s, %%s)" % (
+        connection.ops.quote_name(TrigramaProducto._meta.db_table)
+    )
+    with transaction.atomic(), connection.cursor() as cursor:
+        for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+            lote = producto_ids[inicio:inicio + TAMANO_LOTE]
+            TrigramaProducto.objects.filter(producto_id__in=lote).delete()
+            filas = Producto.objects.filter(pk__in=lote).values_list("id", *CAMPOS_INDEXADOS)
+            entradas = [(trigrama, pid) for pid, *valores in filas for trigrama in trigramas_producto(valores)]
+            if entradas:
+                cursor.executemany(insertar, entradas)
+
+
+def reindexar_todo():
+    with transaction.atomic():
+        TrigramaProducto.objects.all().delete()
+        ids = Producto.objects.order_by("id").values_list("id", flat=True)
+        indexar(ids.iterator(chunk_size=TAMANO_LOTE))
+
+
+# --------------------------
+# BÚSQUEDA
+# --------------------------
+def _coincidencias(consulta, limite):
+    buscados = trigramas(consulta)
+    if not buscados:
+        return None
+    minimo = max(1, math.ceil(len(buscados) * SIMILITUD_MINIMA))
+    return (
+        TrigramaProducto.objects.filter(trigrama__in=buscados)
+        .values("producto_id")
+        .annotate(coincidencias=Count("id"))
+        .filter(coincidencias__gte=minimo)
+        .order_by("-coincidencias", "producto_id")[:limite]
+    )
+
+
+def buscar(consulta, limite=LIMITE_RESULTADOS):
+    # Devuelve ids de productos ordenados por cantidad de trigramas en común.
+    # Tolera errores de tipeo ("porcelanto") y no distingue tildes ni mayúsculas.
+    coincidencias = _coincidencias(consulta, limite)
+    if coincidencias is None:
+        return []
+    return [fila["producto_id"] for fila in coincidencias]
+
+
+async def abuscar(consulta, limite=LIMITE_RESULTADOS):
+    # Igual que buscar(), para las vistas async
+    coincidencias = _coincidencias(consulta, limite)
+    if coincidencias is None:
+        return []
+    return [fila["producto_id"] async for fila in coincidencias]
+
+
+def buscar_productos(consulta, limite=LIMITE_RESULTADOS, queryset=None):
+    # Igual que buscar() pero devuelve los objetos Producto respetando el ranking
+    ids = buscar(consulta, limite)
+    queryset = Producto.objects.all() if queryset is None else queryset
+    encontrados = queryset.in_bulk(ids)
+    return [encontrados[pid] for pid in ids if pid in encontrados]
@@ -0,0 +1,135 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.db import transaction
+from django.db.models import Exists, F, Max, Min, OuterRef
+
+from .models import Producto, ProductoEliminado, Secuencia
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+# Lo que el POS necesita para vender sin conexión, en filas compactas (listas, no dicts)
+CAMPOS = ("id", "nombre", "marca", "precio_venta", "stock", "unidad_medida", "codigo_barras")
+LIMITE_CAMBIOS = 1000
+
+# Ids borrados dentro de eliminacion_agrupada(); las lápidas se escriben juntas al salir
+_eliminados_agrupados = ContextVar("eliminados_agrupados", default=None)
+
+
+# --------------------------
+# VERSIONES
+# --------------------------
+def version_actual():
+    # Marca de agua: el valor confirmado del contador. Quien escribe productos toma su
+    # versión como último paso y la fila del contador queda bloqueada hasta su commit,
+    # así toda versión <= a este número ya está confirmada (o se descartó).
+    # Cambia solo cuando cambia el catálogo: sirve también de ETag de la instantánea.
+    valor = Secuencia.objects.filter(nombre=Producto.SECUENCIA_CATALOGO).values_list("valor", flat=True).first()
+    return valor or 0
+
+
+def renumerar():
+    # Tras restaurar un respaldo: todo el catálogo recibe versiones nuevas, por encima de
+    # cualquiera que traiga el respaldo, así los POS lo vuelven a bajar por delta.
+    # Una sola UPDATE: versión = id + desplazamiento.
+    limites = Producto.objects.aggregate(minimo=Min("id"), maximo=Max("id"))
+    if limites["minimo"] is None:
+        return 0
+    # Un respaldo sin la tabla de secuencias puede traer versiones por encima del contador
+    techo = ProductoEliminado.objects.aggregate(version=Max("version_catalogo"))["version"] or 0
+    Secuencia.objects.get_or_create(nombre=Producto.SECUENCIA_CATALOGO)
+    Secuencia.objects.filter(nombre=Producto.SECUENCIA_CATALOGO, valor__lt=techo).update(valor=techo)
+    rango = Producto.reservar_versiones(limites["maximo"] - limites["minimo"] + 1)
+    return Producto.objects.update(version_catalogo=F("id") + (rango.start - limites["minimo"]))
+
+
+# --------------------------
+# LÁPIDAS DE PRODUCTOS BORRADOS
+# --------------------------
+def producto_eliminado(producto_id):
+    # Llamado desde pre_delete (signals.py)
+    pendientes = _eliminados_agrupados.get()
+    if pendientes is not None:
+        pendientes.append(producto_id)
+    else:
+        registrar_eliminados([producto_id])
+
+
+def registrar_eliminados(ids):
+    ids = list(ids)
+    if not ids:
+        return
+    with transaction.atomic():
+        versiones = Producto.reservar_versiones(len(ids))
+        ProductoEliminado.objects.bulk_create(
+            [ProductoEliminado(producto_id=pid, version_catalogo=v) for pid, v in zip(ids, versiones)],
+            batch_size=LIMITE_CAMBIOS,
+        )
+
+
+@contextmanager
+def eliminacion_agrupada():
+    # Para borrados masivos (importación en modo reemplazo): una reserva de versiones y
+    # un bulk_create de lápidas en vez de uno por producto.
+    if _eliminados_agrupados.get() is not None:
+        yield
+        return
+    pendientes = []
+    with transaction.atomic():
+        token = _eliminados_agrupados.set(pendientes)
+        try:
+            yield
+        finally:
+            _eliminados_agrupados.reset(token)
+        registrar_eliminados(pendientes)
+
+
+# --------------------------
+# INSTANTÁNEA Y CAMBIOS
+# --------------------------
+def instantanea():
+    # La versión se lee ANTES que las filas: lo que se confirme en medio viene en las filas
+    # y también en el siguiente delta, que el POS aplica sin problema dos veces.
+    version = version_actual()
+    filas = Producto.objects.order_by("id").values_list(*CAMPOS)
+    return {"version": version, "campos": CAMPOS, "productos": list(filas.iterator(chunk_size=LIMITE_CAMBIOS))}
+
+
+def cambios(desde, limite=LIMITE_CAMBIOS):
+    actual = version_actual()
+    if desde > actual:
+        # El cliente viene de otra base (o de antes de una restauración): que baje todo
+        return {"version": actual, "completo": True, "hay_mas": False, "campos": CAMPOS, "productos": [], "eliminados": []}
+
+    productos = Producto.objects.filter(version_catalogo__gt=desde, version_catalogo__lte=actual).order_by(
+        "version_catalogo", "id"
+    ).values_list(*CAMPOS, "version_catalogo")
+    # Un id que volvió a existir (restauración con pk explícita) no se borra en el POS
+    eliminados = ProductoEliminado.objects.filter(version_catalogo__gt=desde, version_catalogo__lte=actual).filter(
+        ~Exists(Producto.objects.filter(pk=OuterRef("producto_id")))
+    ).order_by("version_catalogo", "id").values_list("producto_id", "version_catalogo")
+
+    # Si una lista llenó la página, el cursor queda justo antes de su última versión:
+    # todas las filas escritas en una misma transacción la comparten y así ninguna se
+    # corta a medias; la siguiente página empieza por ellas.
+    hasta = actual
+    filas = {}
+    for nombre, consulta in (("productos", productos), ("eliminados", eliminados)):
+        filas[nombre] = list(consulta[:limite])
+        if len(filas[nombre]) == limite:
+            primera, ultima = filas[nombre][0][-1], filas[nombre][-1][-1]
+            if primera == ultima:
+                # Página entera con la misma versión: se entrega completa esa versión
+                filas[nombre] = list(consulta.filter(version_catalogo__lte=ultima))
+                hasta = min(hasta, ultima)
+            else:
+                hasta = min(hasta, ultima - 1)
+    return {
+        "version": hasta,
+        "completo": False,
+        "hay_mas": hasta < actual,
+        "campos": CAMPOS,
+        "productos": [fila[:-1] for fila in filas["productos"] if fila[-1] <= hasta],
+        "eliminados": [pid for pid, version in filas["eliminados"] if version <= hasta],
+    }
@@ -0,0 +1,38 @@
+import threading
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError, connection
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+# SQLite admite un solo escritor a la vez. En lugar de que los hilos del proceso
+# compitan por el bloqueo del archivo (y SQLite los haga esperar a ciegas con su
+# busy timeout), las escrituras pesadas hacen fila aquí. Con WAL los lectores
+# nunca esperan, así que solo hacen fila las ventas, importaciones y movimientos de caja.
+ESPERA_SEGUNDOS = getattr(settings, "ESCRITURA_ESPERA_SEGUNDOS", 60)
+
+_lock = threading.RLock()  # reentrante: una venta dentro de otra escritura no se bloquea sola
+
+
+def activa():
+    # En PostgreSQL los bloqueos por fila ya permiten escrituras concurrentes
+    return connection.vendor == "sqlite"
+
+
+@contextmanager
+def serializada():
+    # Tomarla SIEMPRE antes de abrir la transacción: con transaction_mode IMMEDIATE
+    # el BEGIN ya reserva el archivo, y esperar la fila dentro de una transacción
+    # abierta dejaría a quien la tiene esperando a SQLite hasta el timeout.
+    if not activa():
+        yield
+        return
+    if not _lock.acquire(timeout=ESPERA_SEGUNDOS):
+        raise OperationalError("database is locked: la cola de escritura no avanzó a tiempo")
+    try:
+        yield
+    finally:
+        _lock.release()
+
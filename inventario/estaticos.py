@@ -0,0 +1,53 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class EstaticosMiddleware(WhiteNoiseMiddleware):
+    # WhiteNoise solo es síncrono: bajo ASGI obligaría a Django a pasar por un hilo
+    # todo lo que está debajo, incluidas las vistas async. Aquí solo los archivos
+    # estáticos se sirven en un hilo; el resto de peticiones sigue en el event loop.
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None, *args, **kwargs):
+        super().__init__(get_response, *args, **kwargs)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        return super().__call__(request)
+
+    async def _acall(self, request):
+        if self.autorefresh:
+            # En DEBUG busca en disco en cada petición
+            archivo = await sync_to_async(self.find_file, thread_sensitive=False)(request.path_info)
+        else:
+            archivo = self.files.get(request.path_info)
+        if archivo is not None:
+            response = await sync_to_async(self.serve, thread_sensitive=False)(archivo, request)
+            return _en_bloques_async(response)
+        return await self.get_response(request)
+
+
+async def _bloques(archivo, tamano):
+    leer = sync_to_async(archivo.read, thread_sensitive=False)
+    while bloque := await leer(tamano):
+        yield bloque
+
+
+def servir_archivo(request, response):
+    # Para las vistas que devuelven un FileResponse (Excel, PDF, tickets): bajo ASGI
+    # Django consumiría el archivo entero en memoria antes de enviar el primer byte
+    if isinstance(request, ASGIRequest):
+        return _en_bloques_async(response)
+    return response
+
+
+def _en_bloques_async(response):
+    if getattr(response, "file_to_stream", None) is not None:
+        # Un iterador async evita que Django consuma el archivo como iterador síncrono
+        response.streaming_content = _bloques(response.file_to_stream, response.block_size)
+    return response
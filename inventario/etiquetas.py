@@ -0,0 +1,307 @@
+import hashlib
+import io
+import json
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+import barcode
+import django
+from barcode.writer import ImageWriter
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.functions import Floor
+from django.utils import timezone
+from PIL import Image, ImageDraw, TiffImagePlugin
+
+from .models import MovimientoStock, Producto
+from .tickets import escribir_atomico, fuente
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+VERSION = 1  # subir al cambiar el diseño: invalida todas las etiquetas en disco
+DIRECTORIO = Path(settings.MEDIA_ROOT) / "etiquetas"
+MAXIMO = getattr(settings, "ETIQUETAS_MAXIMO", 20000)  # etiquetas por hoja
+PROCESOS = getattr(settings, "ETIQUETAS_PROCESOS", 4)  # dibujan y comprimen páginas
+TAMANO_LOTE = 1000
+
+# Hoja A4 a 200 dpi, 3 x 8 etiquetas de unos 66 x 36 mm
+DPI = 200
+PAGINA_PX = (1654, 2339)
+MARGEN_PX = 40
+COLUMNAS, FILAS = 3, 8
+POR_PAGINA = COLUMNAS * FILAS
+CELDA_PX = ((PAGINA_PX[0] - 2 * MARGEN_PX) // COLUMNAS, (PAGINA_PX[1] - 2 * MARGEN_PX) // FILAS)
+
+# EAN-13 que empiezan con 20-29 son de uso interno: no chocan con códigos de fabricante,
+# aunque sí con un código de tienda cargado a mano; en ese caso se prueba el siguiente prefijo
+PREFIJOS_INTERNOS = [str(prefijo) for prefijo in range(20, 30)]
+
+OPCIONES_BARRAS = {
+    "module_width": 3 * 25.4 / DPI,  # 3 px exactos por barra: sin bordes difusos al imprimir
+    "module_height": 11,
+    "quiet_zone": 2,
+    "font_size": 9,
+    "text_distance": 4,
+    "dpi": DPI,
+}
+
+
+# --------------------------
+# CÓDIGOS
+# --------------------------
+def codigo_interno(producto_id, prefijo=PREFIJOS_INTERNOS[0]):
+    return barcode.get("ean13", f"{prefijo}{producto_id:010d}").get_fullcode()
+
+
+def _simbologia(codigo):
+    # EAN-13 si el código lo es (dígito verificador incluido); cualquier otro, Code 128
+    if len(codigo) == 13 and codigo.isdigit() and barcode.get("ean13", codigo[:12]).get_fullcode() == codigo:
+        return "ean13"
+    return "code128"
+
+
+def _codigos_libres(producto_ids):
+    # {id: código interno} que ningún otro producto use ya
+    codigos, pendientes = {}, list(producto_ids)
+    for prefijo in PREFIJOS_INTERNOS:
+        if not pendientes:
+            break
+        candidatos = {codigo_interno(pid, prefijo): pid for pid in pendientes}
+        ocupados = set(
+            Producto.objects.filter(codigo_barras__in=list(candidatos)).values_list("codigo_barras", flat=True)
+        )
+        codigos.update((pid, codigo) for codigo, pid in candidatos.items() if codigo not in ocupados)
+        pendientes = [pid for pid in pendientes if pid not in codigos]
+    return codigos
+
+
+def asignar_codigos(producto_ids):
+    # Al crear productos (save() vía señal, importación, restauración): los que no traen
+    # código del fabricante reciben uno interno, así imprimir etiquetas nunca escribe en la BD
+    producto_ids = list(producto_ids)
+    asignados = {}
+    with transaction.atomic():
+        for inicio in range(0, len(producto_ids), TAMANO_LOTE):
+            lote = Producto.objects.filter(pk__in=producto_ids[inicio:inicio + TAMANO_LOTE], codigo_barras__isnull=True)
+            codigos = _codigos_libres(lote.values_list("id", flat=True))
+            if not codigos:
+                continue
+            ahora = timezone.now()
+            productos = [Producto(pk=pid, codigo_barras=codigo, actualizado=ahora) for pid, codigo in codigos.items()]
+            Producto.objects.bulk_update(productos, ["codigo_barras", "actualizado"])
+            asignados.update(codigos)
+        Producto.versionar(asignados)  # el POS offline busca por código
+    return asignados
+
+
+def seleccionar(categoria_id=None, trabajo_id=None):
+    consulta = Producto.objects.order_by("nombre", "id")
+    if categoria_id is not None:
+        consulta = consulta.filter(categoria_id=categoria_id)
+    if trabajo_id is not None:
+        # Un lote de importación son los productos cuyo stock movió ese trabajo en el kardex
+        consulta = consulta.filter(pk__in=MovimientoStock.objects.filter(
+            referencia=f"importacion:{trabajo_id}"
+        ).values("producto_id"))
+    return consulta
+
+
+def _con_codigo(consulta):
+    return consulta.filter(codigo_barras__isnull=False)
+
+
+def contar(consulta, por_stock=False):
+    # Cuántas etiquetas saldrían, sin traer las filas: la vista la compara con MAXIMO
+    if not por_stock:
+        return _con_codigo(consulta).count()
+    consulta = _con_codigo(consulta).filter(stock__gt=0).order_by()
+    return int(consulta.aggregate(total=Sum(Floor("stock")))["total"] or 0)
+
+
+def etiquetas(consulta, por_stock=False):
+    # Lista de (código, nombre, precio); con por_stock, una por cada unidad en stock.
+    # Solo lectura: los códigos se asignan al crear el producto. Los que aún no tienen
+    # (cargas masivas sin señales) quedan fuera hasta correr asignar_codigos.
+    resultado = []
+    consulta = _con_codigo(consulta)
+    for codigo, nombre, precio, stock in consulta.values_list("codigo_barras", "nombre", "precio_venta", "stock"):
+        copias = max(0, int(stock)) if por_stock else 1
+        resultado.extend([(codigo, nombre, precio)] * copias)
+    return resultado
+
+
+# --------------------------
+# RENDERIZADO
+# --------------------------
+def _huella(*partes):
+    contenido = json.dumps([VERSION, *partes], cls=DjangoJSONEncoder, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _dibujar(codigo, nombre, precio):
+    ancho, alto = CELDA_PX
+    celda = Image.new("L", (ancho, alto), 255)
+    dibujo = ImageDraw.Draw(celda)
+    letra = fuente(20)
+    y = 12
+    for renglon in _partir(nombre, letra, ancho - 24)[:2]:
+        dibujo.text((12, y), renglon, font=letra, fill=0)
+        y += 24
+    dibujo.text((ancho - 12, y + 2), f"S/ {precio:.2f}", font=fuente(28), fill=0, anchor="ra")
+    y += 40
+
+    barras = barcode.get(_simbologia(codigo), codigo, writer=ImageWriter()).render(OPCIONES_BARRAS).convert("L")
+    espacio = (ancho - 16, alto - y - 6)
+    if barras.width > espacio[0] or barras.height > espacio[1]:
+        # Códigos largos en Code 128: se reducen sin suavizar para no difuminar las barras
+        barras.thumbnail(espacio, Image.NEAREST)
+    celda.paste(barras, ((ancho - barras.width) // 2, y))
+    return celda.convert("1")
+
+
+def _partir(texto, letra, ancho):
+    renglones, actual = [], ""
+    for palabra in texto.split():
+        propuesta = f"{actual} {palabra}".strip()
+        if actual and letra.getlength(propuesta) > ancho:
+            renglones.append(actual)
+            actual = palabra
+        else:
+            actual = propuesta
+    return renglones + [actual] if actual else renglones
+
+
+def _etiqueta(codigo, nombre, precio):
+    # Caché en disco por contenido: reetiquetar reutiliza los PNG ya dibujados
+    huella = _huella(codigo, nombre, precio)
+    ruta = DIRECTORIO / huella[:2] / f"{huella}.png"
+    if ruta.exists():
+        return Image.open(ruta)
+    celda = _dibujar(codigo, nombre, precio)
+    salida = io.BytesIO()
+    celda.save(salida, "PNG")
+    escribir_atomico(ruta, salida.getvalue())
+    return celda
+
+
+def _pagina(lote):
+    pagina = Image.new("1", PAGINA_PX, 1)
+    dibujadas = {}  # la misma etiqueta repetida (por stock) se abre una sola vez
+    for i, (codigo, nombre, precio) in enumerate(lote):
+        clave = (codigo, nombre, precio)
+        if clave not in dibujadas:
+            dibujadas[clave] = _etiqueta(codigo, nombre, precio)
+        fila, columna = divmod(i, COLUMNAS)
+        pagina.paste(dibujadas[clave], (MARGEN_PX + columna * CELDA_PX[0], MARGEN_PX + fila * CELDA_PX[1]))
+    return _g4(pagina)
+
+
+def _g4(pagina):
+    # Pillow solo comprime CCITT G4 dentro de un TIFF. Con una sola tira, sus bytes son el
+    # flujo que el PDF entiende; dónde empiezan y cuánto miden lo dicen las etiquetas del TIFF.
+    salida = io.BytesIO()
+    pagina.save(salida, "TIFF", compression="group4", strip_size=math.ceil(PAGINA_PX[0] / 8) * PAGINA_PX[1])
+    with Image.open(salida) as tiff:
+        (inicio,) = tiff.tag_v2[TiffImagePlugin.STRIPOFFSETS]
+        (largo,) = tiff.tag_v2[TiffImagePlugin.STRIPBYTECOUNTS]
+    return salida.getvalue()[inicio:inicio + largo]
+
+
+# --------------------------
+# HOJA IMPRIMIBLE
+# --------------------------
+def _pdf(paginas):
+    # PDF mínimo: cada página es una imagen CCITT ya comprimida, sin volver a codificarla
+    ancho, alto = PAGINA_PX
+    ancho_pt, alto_pt = f"{ancho * 72 / DPI:.2f}", f"{alto * 72 / DPI:.2f}"
+    # La imagen ocupa la página entera
+    contenido = f"q {ancho_pt} 0 0 {alto_pt} 0 0 cm /Im Do Q".encode("ascii")
+    objetos = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+            b" ".join(b"%d 0 R" % (3 + 3 * i) for i in range(len(paginas))), len(paginas)
+        ),
+    ]
+    for i, datos in enumerate(paginas):
+        n = 3 + 3 * i
+        objetos.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s] /Resources << /XObject << /Im %d 0 R >> >> "
+            b"/Contents %d 0 R >>" % (f"{ancho_pt} {alto_pt}".encode("ascii"), n + 2, n + 1)
+        )
+        objetos.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(contenido), contenido))
+        objetos.append(
+            b"<< /Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceGray "
+            b"/BitsPerComponent 1 /Filter [/CCITTFaxDecode] "
+            b"/DecodeParms [<< /K -1 /BlackIs1 true /Columns %d /Rows %d >>] /Length %d >>\nstream\n%s\nendstream"
+            % (ancho, alto, ancho, alto, len(datos), datos)
+        )
+
+    salida = io.BytesIO()
+    salida.write(b"%PDF-1.4\n")
+    posiciones = []
+    for numero, objeto in enumerate(objetos, start=1):
+        posiciones.append(salida.tell())
+        salida.write(b"%d 0 obj\n%s\nendobj\n" % (numero, objeto))
+    inicio_xref = salida.tell()
+    salida.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objetos) + 1))
+    salida.write(b"".join(b"%010d 00000 n \n" % posicion for posicion in posiciones))
+    salida.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objetos) + 1, inicio_xref))
+    return salida.getvalue()
+
+
+# --------------------------
+# POOL DE PROCESOS
+# --------------------------
+# Dibujar y comprimir una página es puro CPU: un pool de procesos por worker web, creado
+# al primer uso y reutilizado entre peticiones (arrancar Django en cada proceso cuesta
+# más que una hoja chica). "spawn": no se clona un proceso con hilos y event loop.
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=PROCESOS, mp_context=multiprocessing.get_context("spawn"), initializer=django.setup,
+            )
+        return _pool
+
+
+def _descartar_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _paginas(lotes):
+    if len(lotes) == 1 or PROCESOS <= 1:
+        return [_pagina(lote) for lote in lotes]
+    pool = _obtener_pool()
+    try:
+        return list(pool.map(_pagina, lotes))
+    except BrokenProcessPool:
+        # Un proceso murió (OOM, kill): se descarta el pool y esta hoja sale en el proceso web
+        _descartar_pool(pool)
+        return [_pagina(lote) for lote in lotes]
+
+
+def hoja(lista):
+    # PDF de varias páginas. Cada etiqueta distinta se dibuja una vez y queda en disco; la
+    # hoja completa también queda en caché, así que repetir la misma selección es inmediato.
+    ruta = DIRECTORIO / "hojas" / f"{_huella(lista)}.pdf"
+    if ruta.exists():
+        return ruta
+    paginas = _paginas([lista[i:i + POR_PAGINA] for i in range(0, len(lista), POR_PAGINA)])
+    escribir_atomico(ruta, _pdf(paginas))
+    return ruta
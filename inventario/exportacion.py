@@ -0,0 +1,157 @@
+import csv
+import io
+import tempfile
+import zlib
+from itertools import chain, islice
+
+import openpyxl
+from asgiref.sync import sync_to_async
+from openpyxl.utils import get_column_letter
+from django.http import FileResponse, StreamingHttpResponse
+
+from .importacion import ENCABEZADOS
+from .models import Producto
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+TAMANO_BLOQUE = 2000  # filas por cada viaje a la BD
+FILAS_MUESTRA = 200  # filas usadas para estimar el ancho de columnas
+FORMATOS = ("xlsx", "csv", "csv.gz")
+
+
+def _fila(producto):
+    return [
+        producto.nombre,
+        producto.marca,
+        producto.categoria.nombre if producto.categoria else "",
+        producto.unidad_medida,
+        producto.precio_venta,
+        producto.stock,
+        producto.vendidos,
+        producto.proveedor or "",
+    ]
+
+
+def _filas():
+    productos = Producto.objects.select_related("categoria").order_by("id")
+    for producto in productos.iterator(chunk_size=TAMANO_BLOQUE):
+        yield _fila(producto)
+
+
+def _bloque(despues):
+    # Una página por clave (id > despues): cada llamada es una consulta completa, sin
+    # cursor abierto entre llamadas, así puede correr en cualquier hilo de sync_to_async
+    productos = list(Producto.objects.select_related("categoria").filter(pk__gt=despues).order_by("id")[:TAMANO_BLOQUE])
+    return (productos[-1].pk if productos else despues), [_fila(producto) for producto in productos]
+
+
+# --------------------------
+# XLSX (write-only)
+# --------------------------
+def _anchos_estimados(muestra):
+    anchos = [len(col) for col in ENCABEZADOS]
+    for fila in muestra:
+        for i, valor in enumerate(fila):
+            anchos[i] = max(anchos[i], len(str(valor)))
+    return [ancho + 2 for ancho in anchos]
+
+
+def exportar_xlsx():
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Inventario")
+
+    filas = _filas()
+    muestra = list(islice(filas, FILAS_MUESTRA))
+    # En modo write-only los anchos deben fijarse antes de escribir filas
+    for i, ancho in enumerate(_anchos_estimados(muestra), 1):
+        ws.column_dimensions[get_column_letter(i)].width = ancho
+
+    ws.append(ENCABEZADOS)
+    for fila in chain(muestra, filas):
+        fila[4:7] = [float(valor) for valor in fila[4:7]]
+        ws.append(fila)
+
+    # openpyxl vuelca las filas a disco; la respuesta se sirve por bloques desde el archivo
+    archivo = tempfile.TemporaryFile()
+    wb.save(archivo)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename="Inventario.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
+
+
+# --------------------------
+# CSV / CSV.GZ (streaming real)
+# --------------------------
+def _csv(filas):
+    texto = io.StringIO()
+    csv.writer(texto).writerows(filas)
+    return texto.getvalue()
+
+
+ENCABEZADO_CSV = "\ufeff" + _csv([ENCABEZADOS])  # BOM para que Excel detecte UTF-8
+
+
+def _textos_csv():
+    # Un texto por bloque de TAMANO_BLOQUE filas
+    yield ENCABEZADO_CSV
+    despues, filas = _bloque(0)
+    while filas:
+        yield _csv(filas)
+        despues, filas = _bloque(despues)
+
+
+async def _textos_csv_async():
+    # Bajo ASGI Django consumiría un iterador síncrono entero en memoria antes de enviar
+    # nada; aquí cada bloque se lee en un hilo y se envía apenas está listo
+    leer = sync_to_async(_bloque)
+    yield ENCABEZADO_CSV
+    despues, filas = await leer(0)
+    while filas:
+        yield _csv(filas)
+        despues, filas = await leer(despues)
+
+
+def _compresor():
+    return zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> formato gzip
+
+
+def _comprimir(textos):
+    compresor = _compresor()
+    for texto in textos:
+        if datos := compresor.compress(texto.encode("utf-8")):
+            yield datos
+    yield compresor.flush()
+
+
+async def _comprimir_async(textos):
+    compresor = _compresor()
+    async for texto in textos:
+        if datos := compresor.compress(texto.encode("utf-8")):
+            yield datos
+    yield compresor.flush()
+
+
+def exportar_csv(comprimido=False, asincrono=False):
+    # asincrono: la petición llegó por ASGI y la respuesta debe llevar un iterador async
+    textos = _textos_csv_async() if asincrono else _textos_csv()
+    if comprimido:
+        contenido = _comprimir_async(textos) if asincrono else _comprimir(textos)
+        response = StreamingHttpResponse(contenido, content_type="application/gzip")
+        response["Content-Disposition"] = 'attachment; filename="Inventario.csv.gz"'
+    else:
+        response = StreamingHttpResponse(textos, content_type="text/csv; charset=utf-8")
+        response["Content-Disposition"] = 'attachment; filename="Inventario.csv"'
+    return response
+
+
+def exportar(formato, asincrono=False):
+    if formato == "csv":
+        return exportar_csv(asincrono=asincrono)
+    if formato == "csv.gz":
+        return exportar_csv(comprimido=True, asincrono=asincrono)
+    return exportar_xlsx()
@@ -16,7 +16,8 @@ class ProductoForm(forms.ModelForm):
             'unidad_medida',
             'precio_venta',
             'stock',
-            'proveedor'
+            'proveedor',
+            'codigo_barras',
         ]
         labels = {
             'nombre': 'Nombre',
@@ -26,6 +27,7 @@ class ProductoForm(forms.ModelForm):
             'precio_venta': 'Precio de Venta (S/)',
             'stock': 'Stock',
             'proveedor': 'Proveedor',
+            'codigo_barras': 'Código de barras',
         }
         widgets = {
             'nombre': forms.TextInput(attrs={
@@ -59,6 +61,10 @@ class ProductoForm(forms.ModelForm):
                 'class': 'form-control',
                 'placeholder': 'Ej: Nombre del proveedor'
             }),
+            'codigo_barras': forms.TextInput(attrs={
+                'class': 'form-control',
+                'placeholder': 'Escanea o escribe el código (vacío = se asigna uno interno al guardar)'
+            }),
         }
 
 
@@ -0,0 +1,265 @@
+from decimal import Decimal, InvalidOperation
+
+import openpyxl
+from django.db import transaction
+from django.utils import timezone
+
+from . import busqueda, catalogo, etiquetas, kardex, metricas
+from .escritura import serializada
+from .models import Producto, Categoria, MovimientoStock
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+ENCABEZADOS = ["Nombre", "Marca", "Categoría", "Formato", "Precio", "Stock", "Vendidos", "Proveedor"]
+TAMANO_LOTE = 1000  # filas por cada bulk_create
+
+
+class ErrorImportacion(Exception):
+    pass
+
+
+# --------------------------
+# UTILIDADES
+# --------------------------
+def _a_decimal(valor, hoja, fila):
+    if valor is None or valor == "":
+        return Decimal("0")
+    try:
+        return Decimal(str(valor).strip())
+    except InvalidOperation:
+        raise ErrorImportacion(f"Hoja {hoja}, fila {fila}: valor numérico inválido '{valor}'.")
+
+
+def _texto(valor):
+    return str(valor).strip() if valor is not None else ""
+
+
+class MapaCategorias:
+    # Resuelve nombre -> id en memoria; solo consulta la BD al crear categorías nuevas
+    def __init__(self):
+        self._ids = dict(Categoria.objects.values_list("nombre", "id"))
+
+    def resolver(self, nombre):
+        nombre = nombre.strip().upper()
+        if nombre not in self._ids:
+            self._ids[nombre] = Categoria.objects.create(nombre=nombre).id
+        return self._ids[nombre]
+
+
+# --------------------------
+# LECTURA EN STREAMING
+# --------------------------
+def leer_hoja(hoja_excel, nombre_hoja):
+    # Genera diccionarios por fila sin cargar la hoja completa en memoria.
+    # Devuelve None si la hoja no tiene los encabezados esperados.
+    filas = hoja_excel.iter_rows(values_only=True)
+    try:
+        primera_fila = [_texto(celda) for celda in next(filas)]
+    except StopIteration:
+        return None
+    if not all(col in primera_fila for col in ENCABEZADOS):
+        return None
+    idx = {col: primera_fila.index(col) for col in ENCABEZADOS}
+    return _filas_hoja(filas, idx, nombre_hoja)
+
+
+def _filas_hoja(filas, idx, nombre_hoja):
+    for numero, fila in enumerate(filas, start=2):
+        if len(fila) <= idx["Nombre"] or not fila[idx["Nombre"]]:
+            continue
+        valores = {col: (fila[i] if i < len(fila) else None) for col, i in idx.items()}
+        yield {
+            "nombre": _texto(valores["Nombre"]),
+            "marca": _texto(valores["Marca"]),
+            "categoria": _texto(valores["Categoría"]) or nombre_hoja.strip(),
+            "unidad_medida": _texto(valores["Formato"]) or "unidad",
+            "precio_venta": _a_decimal(valores["Precio"], nombre_hoja, numero),
+            "stock": _a_decimal(valores["Stock"], nombre_hoja, numero),
+            "vendidos": _a_decimal(valores["Vendidos"], nombre_hoja, numero),
+            "proveedor": _texto(valores["Proveedor"]),
+        }
+
+
+def _hojas_en_streaming(workbook):
+    for nombre_hoja in workbook.sheetnames:
+        yield nombre_hoja, leer_hoja(workbook[nombre_hoja], nombre_hoja)
+
+
+# --------------------------
+# IMPORTACIÓN MASIVA
+# --------------------------
+MODO_REEMPLAZAR = "reemplazar"
+MODO_ACTUALIZAR = "actualizar"
+MODOS = [
+    (MODO_ACTUALIZAR, "Actualizar (solo cambios)"),
+    (MODO_REEMPLAZAR, "Reemplazar todo el inventario"),
+]
+
+# Campos que se comparan/actualizan en modo upsert (la clave natural queda fuera)
+CAMPOS_ACTUALIZABLES = ["unidad_medida", "precio_venta", "stock", "vendidos", "proveedor"]
+
+
+def _clave(datos):
+    return (datos["nombre"], datos["marca"] or "", datos["categoria_id"])
+
+
+def _lotes(hojas, resumen):
+    # Filas del libro en lotes de TAMANO_LOTE; la categoría se resuelve al escribir cada lote
+    lote = []
+    for nombre_hoja, filas in hojas:
+        if filas is None:
+            resumen["hojas_invalidas"].append(nombre_hoja)
+            continue
+        for datos in filas:
+            lote.append(datos)
+            if len(lote) >= TAMANO_LOTE:
+                yield lote
+                lote = []
+    if lote:
+        yield lote
+
+
+def _insertar(lote, resumen, referencia):
+    # bulk_create no dispara señales: el índice de búsqueda, el kardex y los códigos
+    # de barras internos se actualizan aquí
+    creados = Producto.objects.bulk_create(lote)
+    busqueda.indexar(p.pk for p in creados)
+    etiquetas.asignar_codigos(p.pk for p in creados)
+    kardex.registrar(
+        MovimientoStock(producto_id=p.pk, tipo="importacion", cantidad=p.stock, referencia=referencia)
+        for p in creados
+    )
+    resumen["insertados"] += len(creados)
+    return [p.pk for p in creados]
+
+
+def _modificar(lote, resumen, referencia, stock_anterior):
+    # bulk_update no aplica auto_now: la fecha de la fila se fija explícitamente
+    ahora = timezone.now()
+    for producto in lote:
+        producto.actualizado = ahora
+    Producto.objects.bulk_update(lote, CAMPOS_ACTUALIZABLES + ["actualizado"])
+    busqueda.indexar(p.pk for p in lote)
+    kardex.registrar(
+        MovimientoStock(producto_id=p.pk, tipo="importacion", cantidad=p.stock - stock_anterior[p.pk], referencia=referencia)
+        for p in lote
+    )
+    resumen["actualizados"] += len(lote)
+    return [p.pk for p in lote]
+
+
+def _vaciar():
+    with catalogo.eliminacion_agrupada():
+        Producto.objects.all().delete()  # limpia productos antes de importar
+
+
+def _actualizar(lote, vistos, resumen, referencia):
+    # Empareja por clave natural (nombre + marca + categoría) y solo escribe lo que cambió.
+    # Las filas del lote se bloquean al leerlas, en orden de id como en ventas._confirmar:
+    # en PostgreSQL una venta no puede descontar stock entre la lectura y el bulk_update,
+    # y el kardex recibe la diferencia contra el stock que de verdad se reemplaza.
+    existentes = {}
+    consulta = (
+        Producto.objects.select_for_update().filter(nombre__in={datos["nombre"] for datos in lote})
+        .order_by("pk").values_list("id", "nombre", "marca", "categoria_id", *CAMPOS_ACTUALIZABLES)
+    )
+    for pid, nombre, marca, categoria_id, *valores in consulta:
+        actuales = dict(zip(CAMPOS_ACTUALIZABLES, valores))
+        actuales["proveedor"] = actuales["proveedor"] or ""
+        existentes[(nombre, marca or "", categoria_id)] = (pid, actuales)
+
+    nuevos, cambiados = [], []
+    stock_anterior = {}
+    for datos in lote:
+        clave = _clave(datos)
+        if clave in vistos:
+            resumen["duplicados"] += 1
+            continue
+        vistos.add(clave)
+
+        if clave not in existentes:
+            nuevos.append(Producto(**datos))
+            continue
+
+        pid, actuales = existentes[clave]
+        if all(actuales[campo] == datos[campo] for campo in CAMPOS_ACTUALIZABLES):
+            resumen["sin_cambios"] += 1
+            continue
+        cambiados.append(Producto(id=pid, **datos))
+        stock_anterior[pid] = actuales["stock"]
+
+    escritos = []
+    if nuevos:
+        escritos += _insertar(nuevos, resumen, referencia)
+    if cambiados:
+        escritos += _modificar(cambiados, resumen, referencia, stock_anterior)
+    return escritos
+
+
+def _ausentes(vistos):
+    # Los productos que ya no vienen en el archivo se conservan (tienen historial de ventas)
+    consulta = Producto.objects.values_list("nombre", "marca", "categoria_id")
+    return sum(
+        1 for nombre, marca, categoria_id in consulta.iterator(chunk_size=TAMANO_LOTE)
+        if (nombre, marca or "", categoria_id) not in vistos
+    )
+
+
+def _escribir(lote, modo, categorias, vistos, resumen, referencia):
+    for datos in lote:
+        datos["categoria_id"] = categorias.resolver(datos.pop("categoria"))
+    if modo == MODO_REEMPLAZAR:
+        escritos = _insertar([Producto(**datos) for datos in lote], resumen, referencia)
+    else:
+        escritos = _actualizar(lote, vistos, resumen, referencia)
+    Producto.versionar(escritos)  # último paso del lote (ver Producto.reservar_versiones)
+    resumen["filas_leidas"] += len(lote)
+
+
+def importar_libro(archivo, modo=MODO_ACTUALIZAR, progreso=None, referencia="importacion"):
+    # Actualizar: cada lote de TAMANO_LOTE filas se escribe en su propia transacción y
+    # suelta la cola de escritura al terminar, así una venta en caja espera a lo sumo un
+    # lote. Si un lote falla, los anteriores quedan guardados y volver a importar el
+    # archivo completa el resto (las filas ya guardadas salen sin cambios).
+    # Reemplazar: el borrado y todos los lotes van en una sola transacción. El borrado
+    # arrastra el historial de ventas, así que una fila que falle (también en la BD: un
+    # nombre demasiado largo, un número fuera de rango) deshace todo y el catálogo queda
+    # como estaba. Solo se ejecuta si se pidió explícitamente. En PostgreSQL el contador
+    # del catálogo queda tomado desde el primer lote hasta el commit: las ventas esperan
+    # al reemplazo en su último paso, como en SQLite esperan en la cola de escritura.
+    if modo not in dict(MODOS):
+        raise ValueError(f"Modo de importación inválido: {modo!r}")
+    resumen = {
+        "filas_leidas": 0,
+        "insertados": 0,
+        "actualizados": 0,
+        "sin_cambios": 0,
+        "ausentes": 0,
+        "duplicados": 0,
+        "hojas_invalidas": [],
+    }
+    workbook = openpyxl.load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        lotes = _lotes(_hojas_en_streaming(workbook), resumen)
+        categorias = MapaCategorias()
+        vistos = set()
+        if modo == MODO_REEMPLAZAR:
+            with serializada(), transaction.atomic():
+                _vaciar()
+                for lote in lotes:
+                    _escribir(lote, modo, categorias, vistos, resumen, referencia)
+                    if progreso:
+                        progreso(resumen)
+                metricas.invalidar()
+        else:
+            for lote in lotes:
+                with serializada(), transaction.atomic():
+                    _escribir(lote, modo, categorias, vistos, resumen, referencia)
+                    metricas.invalidar()
+                if progreso:
+                    progreso(resumen)
+            resumen["ausentes"] = _ausentes(vistos)
+    finally:
+        workbook.close()
+    return resumen
@@ -0,0 +1,209 @@
+import hmac
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+logger = logging.getLogger("inventario.consultas_lentas")
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+ACTIVA = getattr(settings, "INSTRUMENTACION_ACTIVA", True)
+CONSULTA_LENTA_MS = getattr(settings, "INSTRUMENTACION_CONSULTA_LENTA_MS", None)  # None = no registrar
+TOKEN = getattr(settings, "METRICAS_TOKEN", "")
+LARGO_SQL_LOG = 1000  # los IN/CASE de las operaciones masivas pueden ser enormes
+
+LIMITES_SEGUNDOS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+LIMITES_CONSULTAS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+# --------------------------
+# HISTOGRAMAS EN MEMORIA
+# --------------------------
+# Son por proceso: con varios workers, cada uno expone los suyos.
+class Histograma:
+    def __init__(self, limites):
+        self.limites = limites
+        self.cubetas = [0] * (len(limites) + 1)  # la última es +Inf
+        self.suma = 0
+        self.total = 0
+
+    def observar(self, valor):
+        self.cubetas[bisect_left(self.limites, valor)] += 1
+        self.suma += valor
+        self.total += 1
+
+
+_lock = threading.Lock()
+_duracion = {}
+_bd = {}
+_consultas = {}
+_duplicadas = {}
+_peticiones = {}
+
+
+def _registrar(vista, estado, duracion, bd, consultas, duplicadas):
+    with _lock:
+        if vista not in _duracion:
+            _duracion[vista] = Histograma(LIMITES_SEGUNDOS)
+            _bd[vista] = Histograma(LIMITES_SEGUNDOS)
+            _consultas[vista] = Histograma(LIMITES_CONSULTAS)
+            _duplicadas[vista] = 0
+        _duracion[vista].observar(duracion)
+        _bd[vista].observar(bd)
+        _consultas[vista].observar(consultas)
+        _duplicadas[vista] += duplicadas
+        clave = (vista, f"{estado // 100}xx")
+        _peticiones[clave] = _peticiones.get(clave, 0) + 1
+
+
+def reiniciar():
+    with _lock:
+        for registro in (_duracion, _bd, _consultas, _duplicadas, _peticiones):
+            registro.clear()
+
+
+# --------------------------
+# MEDICIÓN DE CONSULTAS
+# --------------------------
+class _Consultas:
+    # execute_wrapper de Django: envuelve cada consulta de la conexión durante la petición
+    def __init__(self):
+        self.cantidad = 0
+        self.tiempo = 0.0
+        self.vistas = set()
+        self.duplicadas = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duracion = time.perf_counter() - inicio
+            self.cantidad += 1
+            self.tiempo += duracion
+            firma = (sql, str(params))
+            if firma in self.vistas:
+                self.duplicadas += 1
+            else:
+                self.vistas.add(firma)
+            if CONSULTA_LENTA_MS is not None and duracion * 1000 >= CONSULTA_LENTA_MS:
+                logger.warning("Consulta lenta (%.1f ms): %s", duracion * 1000, sql[:LARGO_SQL_LOG])
+
+
+# Medidor de la petición en curso. Un ContextVar y no connection.execute_wrapper():
+# en las vistas async el ORM corre en otro hilo (sync_to_async), que hereda el
+# contexto pero no la conexión del hilo del event loop.
+_medidor = ContextVar("instrumentacion_medidor", default=None)
+
+
+def _medir(execute, sql, params, many, context):
+    medidor = _medidor.get()
+    if medidor is None:
+        return execute(sql, params, many, context)
+    return medidor(execute, sql, params, many, context)
+
+
+def _instalar(sender, connection, **kwargs):
+    # El objeto de conexión sobrevive a las reconexiones: se instala una sola vez
+    if _medir not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_medir)
+
+
+connection_created.connect(_instalar, dispatch_uid="instrumentacion_medir")
+
+
+class InstrumentacionMiddleware:
+    # Tiempo total, tiempo en BD, consultas y consultas repetidas por nombre de ruta.
+    # Funciona igual bajo WSGI (gunicorn) y ASGI (uvicorn, vistas async).
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        # Conexiones abiertas antes de cargar el middleware (comandos, shell, pruebas)
+        for conexion in connections.all(initialized_only=True):
+            _instalar(None, conexion)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self._acall(request)
+        if not ACTIVA:
+            return self.get_response(request)
+        consultas, token, inicio = self._empezar()
+        try:
+            response = self.get_response(request)
+        finally:
+            _medidor.reset(token)
+        return self._terminar(request, response, consultas, inicio)
+
+    async def _acall(self, request):
+        if not ACTIVA:
+            return await self.get_response(request)
+        consultas, token, inicio = self._empezar()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _medidor.reset(token)
+        return self._terminar(request, response, consultas, inicio)
+
+    def _empezar(self):
+        consultas = _Consultas()
+        return consultas, _medidor.set(consultas), time.perf_counter()
+
+    def _terminar(self, request, response, consultas, inicio):
+        duracion = time.perf_counter() - inicio
+        match = getattr(request, "resolver_match", None)
+        vista = (match.url_name or match.view_name) if match else "sin_ruta"
+        _registrar(vista, response.status_code, duracion, consultas.tiempo, consultas.cantidad, consultas.duplicadas)
+        return response
+
+
+# --------------------------
+# EXPOSICIÓN (formato de texto de Prometheus)
+# --------------------------
+def autorizado(request):
+    # Token en "Authorization: Bearer ..." (para el recolector) o un usuario staff
+    cabecera = request.headers.get("Authorization", "")
+    if TOKEN and cabecera.startswith("Bearer "):
+        return hmac.compare_digest(cabecera[len("Bearer "):], TOKEN)
+    return request.user.is_authenticated and request.user.is_staff
+
+
+def _histograma(lineas, nombre, ayuda, histogramas):
+    lineas.append(f"# HELP {nombre} {ayuda}")
+    lineas.append(f"# TYPE {nombre} histogram")
+    for vista, h in sorted(histogramas.items()):
+        acumulado = 0
+        for limite, cantidad in zip(h.limites, h.cubetas):
+            acumulado += cantidad
+            lineas.append(f'{nombre}_bucket{{vista="{vista}",le="{limite}"}} {acumulado}')
+        lineas.append(f'{nombre}_bucket{{vista="{vista}",le="+Inf"}} {h.total}')
+        lineas.append(f'{nombre}_sum{{vista="{vista}"}} {h.suma:.6f}')
+        lineas.append(f'{nombre}_count{{vista="{vista}"}} {h.total}')
+
+
+def exportar():
+    with _lock:
+        lineas = []
+        _histograma(lineas, "inventario_vista_duracion_segundos", "Tiempo total de la petición", _duracion)
+        _histograma(lineas, "inventario_vista_bd_segundos", "Tiempo en consultas a la BD", _bd)
+        _histograma(lineas, "inventario_vista_consultas", "Consultas por petición", _consultas)
+        lineas.append("# HELP inventario_vista_consultas_duplicadas_total Consultas idénticas repetidas en la misma petición")
+        lineas.append("# TYPE inventario_vista_consultas_duplicadas_total counter")
+        for vista, total in sorted(_duplicadas.items()):
+            lineas.append(f'inventario_vista_consultas_duplicadas_total{{vista="{vista}"}} {total}')
+        lineas.append("# HELP inventario_vista_peticiones_total Peticiones por vista y clase de estado")
+        lineas.append("# TYPE inventario_vista_peticiones_total counter")
+        for (vista, estado), total in sorted(_peticiones.items()):
+            lineas.append(f'inventario_vista_peticiones_total{{vista="{vista}",estado="{estado}"}} {total}')
+    return "\n".join(lineas) + "\n"
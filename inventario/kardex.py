@@ -0,0 +1,118 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, Max, Sum, Value, When
+from django.utils import timezone
+
+from .models import MovimientoStock, Producto, SaldoStock
+from .resumenes import inicio_del_dia
+
+TAMANO_LOTE = 1000
+
+
+# --------------------------
+# REGISTRO DE MOVIMIENTOS
+# --------------------------
+def registrar(movimientos):
+    # Un solo INSERT por lote; se llama dentro de la transacción que cambia el stock
+    movimientos = [m for m in movimientos if m.cantidad]
+    MovimientoStock.objects.bulk_create(movimientos, batch_size=TAMANO_LOTE)
+    return movimientos
+
+
+def registrar_cambio(producto, stock_anterior, tipo="ajuste", referencia=""):
+    # Para altas y ediciones manuales: guarda la diferencia entre el stock anterior y el actual
+    diferencia = Decimal(producto.stock or 0) - Decimal(stock_anterior or 0)
+    registrar([MovimientoStock(producto=producto, tipo=tipo, cantidad=diferencia, referencia=referencia)])
+
+
+# --------------------------
+# CONSULTAS A UNA FECHA
+# --------------------------
+def _ultimo_corte(fecha):
+    return SaldoStock.objects.filter(fecha__lte=fecha).aggregate(corte=Max("fecha"))["corte"]
+
+
+def stock_al(fecha=None, producto_ids=None):
+    # Stock por producto a una fecha: último saldo guardado + movimientos desde ese saldo.
+    # Solo se recorren los movimientos del periodo entre el corte y la fecha pedida.
+    fecha = fecha or timezone.now()
+    corte = _ultimo_corte(fecha)
+
+    saldos = SaldoStock.objects.filter(fecha=corte) if corte else SaldoStock.objects.none()
+    movimientos = MovimientoStock.objects.filter(fecha__lte=fecha)
+    if corte:
+        movimientos = movimientos.filter(fecha__gt=corte)
+    if producto_ids is not None:
+        saldos = saldos.filter(producto_id__in=producto_ids)
+        movimientos = movimientos.filter(producto_id__in=producto_ids)
+
+    stock = dict(saldos.values_list("producto_id", "stock"))
+    for pid, cantidad in movimientos.values("producto_id").annotate(total=Sum("cantidad")).values_list("producto_id", "total"):
+        stock[pid] = stock.get(pid, Decimal("0")) + cantidad
+    return stock
+
+
+def valorizacion_al(fecha=None):
+    # Unidades y valor del inventario a una fecha. El precio es el del último saldo
+    # (o el actual si el producto no figuraba en él): no se guarda historial de precios.
+    fecha = fecha or timezone.now()
+    stock = {pid: cantidad for pid, cantidad in stock_al(fecha).items() if cantidad}
+    corte = _ultimo_corte(fecha)
+    precios = dict(Producto.objects.filter(pk__in=list(stock)).values_list("id", "precio_venta"))
+    if corte:
+        precios.update(SaldoStock.objects.filter(fecha=corte).values_list("producto_id", "precio_venta"))
+    valor = sum((cantidad * precios.get(pid, 0) for pid, cantidad in stock.items()), Decimal("0"))
+    return {
+        "fecha": fecha,
+        "productos": len(stock),
+        "unidades": sum(stock.values(), Decimal("0")),
+        "valor": valor.quantize(Decimal("0.01")),
+    }
+
+
+# --------------------------
+# SALDOS PERIÓDICOS
+# --------------------------
+def tomar_saldos(fecha=None):
+    # Por defecto el corte es el inicio del día local: así no hay ventas en curso con fecha anterior
+    fecha = fecha or inicio_del_dia(timezone.localdate())
+    stock = stock_al(fecha)
+    precios = dict(Producto.objects.values_list("id", "precio_venta"))
+    with transaction.atomic():
+        SaldoStock.objects.filter(fecha=fecha).delete()
+        creados = SaldoStock.objects.bulk_create([
+            SaldoStock(producto_id=pid, fecha=fecha, stock=cantidad, precio_venta=precios[pid])
+            for pid, cantidad in stock.items()
+            if cantidad and pid in precios
+        ], batch_size=TAMANO_LOTE)
+    return fecha, len(creados)
+
+
+# --------------------------
+# CONCILIACIÓN
+# --------------------------
+def conciliar(corregir=False):
+    # Compara Producto.stock con lo que dice el kardex. Con corregir=True la columna
+    # se reescribe desde el libro (el kardex es la fuente de verdad).
+    segun_libro = stock_al()
+    diferencias = {}
+    for pid, columna in Producto.objects.values_list("id", "stock").iterator(chunk_size=TAMANO_LOTE):
+        libro = segun_libro.get(pid, Decimal("0"))
+        if columna != libro:
+            diferencias[pid] = (columna, libro)
+
+    if corregir and diferencias:
+        ids = list(diferencias)
+        with transaction.atomic():
+            for inicio in range(0, len(ids), TAMANO_LOTE):
+                lote = ids[inicio:inicio + TAMANO_LOTE]
+                Producto.objects.filter(pk__in=lote).update(
+                    stock=Case(
+                        *[When(pk=pid, then=Value(diferencias[pid][1])) for pid in lote],
+                        output_field=DecimalField(max_digits=10, decimal_places=2),
+                    ),
+                    actualizado=timezone.now(),
+                )
+            Producto.versionar(ids)
+    return diferencias
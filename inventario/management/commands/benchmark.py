@@ -0,0 +1,110 @@
+import json
+import platform
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.utils import timezone
+
+from inventario.benchmark import datos, escenarios
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera datos sintéticos en una BD de pruebas y mide las rutas críticas "
+        "(latencia y consultas). Compara contra una línea base en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--escala", choices=list(datos.ESCALAS), default="pequena")
+        parser.add_argument("--productos", type=int, help="Sobrescribe la cantidad de productos de la escala")
+        parser.add_argument("--ventas", type=int, help="Sobrescribe la cantidad de ventas de la escala")
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument("--repeticiones", type=int, default=20)
+        parser.add_argument(
+            "--escenario", action="append", choices=list(escenarios.ESCENARIOS),
+            help="Escenario a medir (se puede repetir). Por defecto, todos",
+        )
+        parser.add_argument(
+            "--linea-base", default=str(Path(settings.BASE_DIR) / "benchmark.json"),
+            help="Archivo JSON con la línea base",
+        )
+        parser.add_argument("--guardar", action="store_true", help="Guarda los resultados como nueva línea base")
+        parser.add_argument("--umbral", type=float, default=0.25, help="Tolerancia de p95 antes de fallar (0.25 = 25%%)")
+
+    def handle(self, *args, **options):
+        escala = dict(datos.ESCALAS[options["escala"]])
+        for clave in ("productos", "ventas"):
+            if options[clave]:
+                escala[clave] = options[clave]
+
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as temporal:
+            resultados = self._medir(escala, options, Path(temporal))
+
+        self._imprimir(resultados)
+        informe = {
+            "fecha": timezone.now().isoformat(),
+            "escala": escala,
+            "semilla": options["semilla"],
+            "motor": connection.vendor,
+            "python": platform.python_version(),
+            "escenarios": resultados,
+        }
+
+        ruta = Path(options["linea_base"])
+        if options["guardar"]:
+            ruta.write_text(json.dumps(informe, indent=2, ensure_ascii=False), encoding="utf-8")
+            self.stdout.write(self.style.SUCCESS(f"Línea base guardada en {ruta}"))
+            return
+        if not ruta.exists():
+            self.stdout.write(self.style.WARNING(f"No hay línea base en {ruta}; usa --guardar para crearla."))
+            return
+
+        regresiones = escenarios.comparar(resultados, json.loads(ruta.read_text(encoding="utf-8")), options["umbral"])
+        if regresiones:
+            raise CommandError("Regresiones de rendimiento:\n  " + "\n  ".join(regresiones))
+        self.stdout.write(self.style.SUCCESS("Sin regresiones frente a la línea base."))
+
+    def _medir(self, escala, options, temporal):
+        # BD, caché y media aislados: el benchmark nunca toca los datos reales
+        setup_test_environment()
+        if connection.vendor == "sqlite":
+            # En archivo (no en memoria) para que el hilo de importación vea los mismos datos
+            connection.settings_dict["TEST"]["NAME"] = str(temporal / "benchmark.sqlite3")
+        nombre_original = connection.settings_dict["NAME"]
+        aislado = override_settings(
+            CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+            MEDIA_ROOT=str(temporal / "media"),
+        )
+        aislado.enable()
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self.stdout.write(f"Generando datos ({escala})...")
+            generados = datos.generar(escala, semilla=options["semilla"])
+            self.stdout.write(
+                f"  {generados['productos']} productos, {generados['ventas']} ventas, {generados['cajas']} cajas"
+            )
+            try:
+                return escenarios.ejecutar(
+                    generados["usuario"],
+                    datos.perfil()["palabras"],
+                    nombres=options["escenario"],
+                    repeticiones=options["repeticiones"],
+                    semilla=options["semilla"],
+                )
+            except escenarios.ErrorBenchmark as e:
+                raise CommandError(str(e))
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+            aislado.disable()
+            teardown_test_environment()
+
+    def _imprimir(self, resultados):
+        self.stdout.write(f"{'escenario':<26}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}{'consultas':>11}")
+        for nombre, r in resultados.items():
+            self.stdout.write(
+                f"{nombre:<26}{r['p50_ms']:>9}{r['p95_ms']:>9}{r['p99_ms']:>9}{r['max_ms']:>9}{r['consultas']:>11}"
+            )
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.base import DeserializationError
+from django.db import IntegrityError
+
+from inventario import respaldo
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura un volcado JSON de dumpdata (datos.json y similares) con inserciones "
+        "masivas. Detecta la codificación por el BOM y lee el archivo en streaming."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivo", help="Ruta del JSON (UTF-8 o UTF-16, con o sin BOM)")
+
+    def handle(self, *args, **options):
+        inicio = time.perf_counter()
+
+        def progreso(resumen):
+            if options["verbosity"] > 1:
+                self.stdout.write(f"  {resumen['objetos']} objetos...")
+
+        try:
+            resumen = respaldo.cargar(options["archivo"], progreso=progreso)
+        except FileNotFoundError:
+            raise CommandError(f"No existe el archivo {options['archivo']}")
+        except (respaldo.ErrorRespaldo, DeserializationError, IntegrityError) as e:
+            raise CommandError(f"No se restauró nada: {e}")
+
+        for modelo, cantidad in sorted(resumen["modelos"].items()):
+            self.stdout.write(f"  {modelo:<32}{cantidad:>8}")
+        self.stdout.write(self.style.SUCCESS(
+            f"{resumen['objetos']} objetos restaurados en {time.perf_counter() - inicio:.1f} s."
+        ))
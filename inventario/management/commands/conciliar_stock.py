@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from inventario import kardex
+
+
+class Command(BaseCommand):
+    help = "Compara Producto.stock con el kardex y, con --corregir, lo reescribe desde el libro"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--corregir", action="store_true", help="Aplica el stock del kardex a los productos")
+
+    def handle(self, *args, **options):
+        diferencias = kardex.conciliar(corregir=options["corregir"])
+        for pid, (columna, libro) in sorted(diferencias.items())[:50]:
+            self.stdout.write(f"  producto {pid}: columna {columna} / kardex {libro}")
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS("El stock coincide con el kardex."))
+        elif options["corregir"]:
+            self.stdout.write(self.style.SUCCESS(f"{len(diferencias)} productos corregidos desde el kardex."))
+        else:
+            self.stdout.write(self.style.WARNING(f"{len(diferencias)} productos no coinciden (usa --corregir)."))
@@ -0,0 +1,28 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import metricas, resumenes
+from inventario.models import ResumenVentaDiaria, ResumenProductoDiario
+
+
+class Command(BaseCommand):
+    help = "Reconstruye (o llena por primera vez) los resúmenes diarios de ventas"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", help="Fecha inicial AAAA-MM-DD (incluida)")
+        parser.add_argument("--hasta", help="Fecha final AAAA-MM-DD (incluida)")
+
+    def handle(self, *args, **options):
+        try:
+            desde = date.fromisoformat(options["desde"]) if options["desde"] else None
+            hasta = date.fromisoformat(options["hasta"]) if options["hasta"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+
+        resumenes.reconstruir(desde, hasta)
+        metricas.invalidar()
+        self.stdout.write(self.style.SUCCESS(
+            f"Resúmenes listos: {ResumenVentaDiaria.objects.count()} filas por día/comprobante, "
+            f"{ResumenProductoDiario.objects.count()} filas por día/producto."
+        ))
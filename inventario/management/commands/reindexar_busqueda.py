@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from inventario import busqueda
+from inventario.models import TrigramaProducto
+
+
+class Command(BaseCommand):
+    help = "Reconstruye el índice de búsqueda difusa de productos"
+
+    def handle(self, *args, **options):
+        busqueda.reindexar_todo()
+        self.stdout.write(self.style.SUCCESS(
+            f"Índice reconstruido: {TrigramaProducto.objects.count()} trigramas."
+        ))
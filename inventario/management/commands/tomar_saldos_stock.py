@@ -0,0 +1,22 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario import kardex
+from inventario.resumenes import inicio_del_dia
+
+
+class Command(BaseCommand):
+    help = "Guarda la foto del stock por producto (programarlo a diario o semanalmente)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", help="Corte AAAA-MM-DD (inicio del día local). Por defecto, hoy")
+
+    def handle(self, *args, **options):
+        try:
+            fecha = inicio_del_dia(date.fromisoformat(options["fecha"])) if options["fecha"] else None
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+
+        corte, filas = kardex.tomar_saldos(fecha)
+        self.stdout.write(self.style.SUCCESS(f"Saldo al {corte:%Y-%m-%d %H:%M}: {filas} productos con stock."))
@@ -0,0 +1,61 @@
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .models import Producto, Venta, ResumenVentaDiaria, ResumenProductoDiario
+from .resumenes import rango_dias
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+STOCK_BAJO = 5
+TOP_PRODUCTOS = 5
+CACHE_SEGUNDOS = 3600  # red de seguridad; lo normal es que una señal invalide antes
+
+
+def _clave(hoy):
+    # La fecha local va en la clave: a medianoche el panel empieza de cero solo
+    return f"dashboard:metricas:{hoy.isoformat()}"
+
+
+# --------------------------
+# CÁLCULO
+# --------------------------
+async def acalcular(hoy=None):
+    # Async: el panel se sirve desde el event loop (ver views.dashboard)
+    hoy = hoy or timezone.localdate()
+    desde, hasta = rango_dias(hoy, hoy)
+    top = (
+        ResumenProductoDiario.objects.values("producto__nombre")
+        .annotate(total_cantidad=Sum("cantidad"))
+        .order_by("-total_cantidad")[:TOP_PRODUCTOS]
+    )
+    top = [fila async for fila in top]
+    total = await ResumenVentaDiaria.objects.aaggregate(n=Sum("num_ventas"))
+    return {
+        # Rango semiabierto del día local, no fecha=date.today() sobre un DateTimeField
+        "ventas_hoy": await Venta.objects.filter(fecha__gte=desde, fecha__lt=hasta).acount(),
+        "total_ventas": total["n"] or 0,
+        "stock_bajo": await Producto.objects.filter(stock__lte=STOCK_BAJO).acount(),
+        "productos": [fila["producto__nombre"] for fila in top],
+        "cantidades": [float(fila["total_cantidad"]) for fila in top],
+    }
+
+
+async def aobtener():
+    # Una sola lectura de caché por carga del panel mientras no cambie nada
+    clave = _clave(timezone.localdate())
+    metricas = await cache.aget(clave)
+    if metricas is None:
+        metricas = await acalcular()
+        await cache.aset(clave, metricas, CACHE_SEGUNDOS)
+    return metricas
+
+
+# --------------------------
+# INVALIDACIÓN
+# --------------------------
+def invalidar():
+    # Tras el commit, para que otra petición no vuelva a guardar datos viejos
+    transaction.on_commit(lambda: cache.delete(_clave(timezone.localdate())))
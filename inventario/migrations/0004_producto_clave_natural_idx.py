@@ -0,0 +1,17 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0003_rename_saleitem_detalleventa_rename_sale_venta'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['nombre', 'marca', 'categoria'], name='producto_clave_natural_idx'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:07
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def inicializar_series(apps, schema_editor):
+    # Cada serie continúa desde el último número ya emitido para ese comprobante
+    Venta = apps.get_model('inventario', 'Venta')
+    Secuencia = apps.get_model('inventario', 'Secuencia')
+    ultimos = Venta.objects.values('tipo_comprobante').annotate(ultimo=Max('numero_venta'))
+    for fila in ultimos:
+        Secuencia.objects.update_or_create(
+            nombre=f"venta:{fila['tipo_comprobante']}",
+            defaults={'valor': fila['ultimo'] or 0},
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0005_trabajoimportacion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Secuencia',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('nombre', models.CharField(max_length=50, unique=True)),
+                ('valor', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='venta',
+            name='numero_venta',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='venta',
+            constraint=models.UniqueConstraint(fields=('tipo_comprobante', 'numero_venta'), name='venta_numero_por_serie'),
+        ),
+        migrations.RunPython(inicializar_series, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    # Las cajas existentes abren el libro con su total actual
+    Caja = apps.get_model('inventario', 'Caja')
+    MovimientoCaja = apps.get_model('inventario', 'MovimientoCaja')
+    MovimientoCaja.objects.bulk_create([
+        MovimientoCaja(caja_id=caja_id, tipo='saldo_inicial', monto=total)
+        for caja_id, total in Caja.objects.exclude(total=0).values_list('id', 'total')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_secuencia_numeracion_por_serie'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoCaja',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('saldo_inicial', 'Saldo inicial'), ('venta', 'Venta'), ('ajuste', 'Ajuste de venta'), ('traslado', 'Traslado entre cajas')], max_length=20)),
+                ('monto', models.DecimalField(decimal_places=2, max_digits=15)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('caja', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.caja')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_caja', to='inventario.venta')),
+            ],
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:10
+
+import re
+import unicodedata
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+# Copia de la normalización de inventario/busqueda.py al crear el índice: la migración
+# no importa el módulo para que cambios posteriores en él no alteren su resultado.
+CAMPOS_INDEXADOS = ['nombre', 'marca', 'proveedor', 'unidad_medida']
+NO_ALFANUMERICO = re.compile(r'[^a-z0-9]+')
+
+
+def trigramas_producto(valores):
+    texto = unicodedata.normalize('NFKD', ' '.join(str(v) for v in valores if v))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c)).lower()
+    resultado = set()
+    for palabra in NO_ALFANUMERICO.sub(' ', texto).split():
+        relleno = f'  {palabra} '
+        resultado.update(relleno[i:i + 3] for i in range(len(relleno) - 2))
+    return resultado
+
+
+def indexar_existentes(apps, schema_editor):
+    Producto = apps.get_model('inventario', 'Producto')
+    TrigramaProducto = apps.get_model('inventario', 'TrigramaProducto')
+    lote = []
+    for pid, *valores in Producto.objects.values_list('id', *CAMPOS_INDEXADOS).iterator(chunk_size=500):
+        lote.extend(TrigramaProducto(producto_id=pid, trigrama=t) for t in trigramas_producto(valores))
+        if len(lote) >= 5000:
+            TrigramaProducto.objects.bulk_create(lote)
+            lote = []
+    TrigramaProducto.objects.bulk_create(lote)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_movimientocaja'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrigramaProducto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigrama', models.CharField(max_length=3)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='trigramas', to='inventario.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('trigrama', 'producto'), name='trigrama_producto_unico')],
+            },
+        ),
+        migrations.RunPython(indexar_existentes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:13
+
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def llenar_resumenes(apps, schema_editor):
+    # Todo el historial, con los modelos de esta migración (no importa inventario.resumenes)
+    Venta = apps.get_model('inventario', 'Venta')
+    DetalleVenta = apps.get_model('inventario', 'DetalleVenta')
+    ResumenVentaDiaria = apps.get_model('inventario', 'ResumenVentaDiaria')
+    ResumenProductoDiario = apps.get_model('inventario', 'ResumenProductoDiario')
+    zona = timezone.get_current_timezone()
+    importe = DecimalField(max_digits=15, decimal_places=2)
+
+    por_dia = (
+        Venta.objects.annotate(dia=TruncDate('fecha', tzinfo=zona))
+        .values('dia', 'tipo_comprobante')
+        .annotate(suma_ventas=Count('id'), suma_total=Sum('total'))
+        .order_by()
+    )
+    ResumenVentaDiaria.objects.bulk_create([
+        ResumenVentaDiaria(
+            fecha=fila['dia'], tipo_comprobante=fila['tipo_comprobante'],
+            num_ventas=fila['suma_ventas'], total=fila['suma_total'] or 0,
+        )
+        for fila in por_dia
+    ], batch_size=1000)
+
+    por_producto = (
+        DetalleVenta.objects.annotate(dia=TruncDate('sale__fecha', tzinfo=zona))
+        .values('dia', 'producto_id')
+        .annotate(suma_cantidad=Sum('cantidad'), suma_importe=Sum(F('cantidad') * F('precio'), output_field=importe))
+        .order_by()
+    )
+    ResumenProductoDiario.objects.bulk_create([
+        ResumenProductoDiario(
+            fecha=fila['dia'], producto_id=fila['producto_id'],
+            cantidad=fila['suma_cantidad'] or 0,
+            importe=Decimal(fila['suma_importe'] or 0).quantize(Decimal('0.01')),
+        )
+        for fila in por_producto
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_trigramaproducto'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenVentaDiaria',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('tipo_comprobante', models.CharField(max_length=50)),
+                ('num_ventas', models.PositiveIntegerField(default=0)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'tipo_comprobante'), name='resumen_venta_dia_tipo')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ResumenProductoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('cantidad', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('importe', models.DecimalField(decimal_places=2, default=0, max_digits=15)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resumenes', to='inventario.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='resumen_producto_dia')],
+            },
+        ),
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
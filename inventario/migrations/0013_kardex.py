@@ -0,0 +1,53 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def saldo_inicial(apps, schema_editor):
+    # El kardex arranca con el stock actual de cada producto
+    Producto = apps.get_model('inventario', 'Producto')
+    MovimientoStock = apps.get_model('inventario', 'MovimientoStock')
+    MovimientoStock.objects.bulk_create([
+        MovimientoStock(producto_id=producto_id, tipo='inicial', cantidad=stock)
+        for producto_id, stock in Producto.objects.exclude(stock=0).values_list('id', 'stock')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0012_producto_actualizado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('inicial', 'Saldo inicial'), ('venta', 'Venta'), ('importacion', 'Importación'), ('ajuste', 'Ajuste manual')], max_length=20)),
+                ('cantidad', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('referencia', models.CharField(blank=True, db_index=True, max_length=50)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos', to='inventario.producto')),
+                ('venta', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='movimientos_stock', to='inventario.venta')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['producto', 'fecha'], name='movimiento_producto_fecha_idx'), models.Index(fields=['fecha'], name='movimiento_fecha_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField()),
+                ('stock', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('precio_venta', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saldos', to='inventario.producto')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('fecha', 'producto'), name='saldo_stock_fecha_producto')],
+            },
+        ),
+        migrations.RunPython(saldo_inicial, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0013_kardex'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='codigo_barras',
+            field=models.CharField(blank=True, max_length=64, null=True, unique=True, verbose_name='código de barras'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0014_producto_codigo_barras'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductoEliminado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('producto_id', models.PositiveBigIntegerField()),
+                ('version_catalogo', models.PositiveBigIntegerField(db_index=True)),
+                ('fecha', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='version_catalogo',
+            field=models.PositiveBigIntegerField(db_index=True, default=0),
+        ),
+    ]
@@ -0,0 +1,47 @@
+import time
+
+from django.db import migrations
+from django.utils import timezone
+
+TAMANO_LOTE = 1000
+PREFIJOS_INTERNOS = [str(prefijo) for prefijo in range(20, 30)]
+
+
+def ean13(base):
+    # Dígito verificador EAN-13: pesos 1 y 3 alternados sobre los 12 primeros dígitos
+    suma = sum(int(digito) * (3 if posicion % 2 else 1) for posicion, digito in enumerate(base))
+    return base + str((10 - suma % 10) % 10)
+
+
+def asignar_codigos(apps, schema_editor):
+    # Hasta ahora el código interno se escribía al imprimir etiquetas; desde aquí se asigna
+    # al crear el producto, así que los que ya existen sin código lo reciben ahora
+    Producto = apps.get_model("inventario", "Producto")
+    ocupados = set(Producto.objects.filter(codigo_barras__isnull=False).values_list("codigo_barras", flat=True))
+    pendientes = list(Producto.objects.filter(codigo_barras__isnull=True).order_by("id").values_list("id", flat=True))
+    ahora = timezone.now()
+    version = time.time_ns() // 1000
+    for inicio in range(0, len(pendientes), TAMANO_LOTE):
+        lote = []
+        for pid in pendientes[inicio:inicio + TAMANO_LOTE]:
+            codigo = next(
+                (c for c in (ean13(f"{prefijo}{pid:010d}") for prefijo in PREFIJOS_INTERNOS) if c not in ocupados),
+                None,
+            )
+            if codigo is None:
+                continue
+            ocupados.add(codigo)
+            version += 1
+            lote.append(Producto(pk=pid, codigo_barras=codigo, actualizado=ahora, version_catalogo=version))
+        Producto.objects.bulk_update(lote, ["codigo_barras", "actualizado", "version_catalogo"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0015_catalogo_versionado'),
+    ]
+
+    operations = [
+        migrations.RunPython(asignar_codigos, migrations.RunPython.noop),
+    ]
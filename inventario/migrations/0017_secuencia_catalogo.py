@@ -0,0 +1,26 @@
+from django.db import migrations
+from django.db.models import Max
+
+
+def sembrar_contador(apps, schema_editor):
+    # Las versiones del catálogo eran marcas de tiempo; desde aquí salen del contador
+    # "catalogo", que arranca por encima de todas las ya entregadas a los POS
+    Secuencia = apps.get_model("inventario", "Secuencia")
+    Producto = apps.get_model("inventario", "Producto")
+    ProductoEliminado = apps.get_model("inventario", "ProductoEliminado")
+    valor = max(
+        Producto.objects.aggregate(version=Max("version_catalogo"))["version"] or 0,
+        ProductoEliminado.objects.aggregate(version=Max("version_catalogo"))["version"] or 0,
+    )
+    Secuencia.objects.update_or_create(nombre="catalogo", defaults={"valor": valor})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0016_codigos_barras_internos'),
+    ]
+
+    operations = [
+        migrations.RunPython(sembrar_contador, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,69 @@
-from django.db import models
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import models, connection, transaction, IntegrityError
 from decimal import Decimal
 from django.contrib.auth.models import User
-from django.db.models import Sum, F, FloatField
+from django.db.models import F
+
+# Ventas cuyo total se recalculará al cerrar Venta.recalculo_diferido()
+_ventas_diferidas = ContextVar("ventas_diferidas", default=None)
+
+# Caché por proceso de la caja abierta; se invalida con las señales de Caja (ver signals.py)
+CAJA_CACHE_SEGUNDOS = getattr(settings, "CAJA_CACHE_SEGUNDOS", 30)
+_caja_abierta = {"id": None, "expira": 0.0}
+
+# ========================
+# SECUENCIAS (numeración correlativa)
+# ========================
+class Secuencia(models.Model):
+    # Un contador por serie. Se incrementa dentro de la transacción de quien lo usa,
+    # así un rollback devuelve el número y la serie queda sin huecos.
+    nombre = models.CharField(max_length=50, unique=True)
+    valor = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.nombre}: {self.valor}"
+
+    @classmethod
+    def reservar(cls, nombre, cantidad=1):
+        # Reserva `cantidad` números consecutivos y devuelve el range correspondiente.
+        # La fila queda bloqueada hasta el fin de la transacción actual.
+        ultimo = cls._incrementar(nombre, cantidad)
+        if ultimo is None:
+            try:
+                with transaction.atomic():
+                    cls.objects.create(nombre=nombre)
+            except IntegrityError:
+                pass  # otro proceso la creó al mismo tiempo
+            ultimo = cls._incrementar(nombre, cantidad)
+        return range(ultimo - cantidad + 1, ultimo + 1)
+
+    @classmethod
+    def siguiente(cls, nombre):
+        return cls.reservar(nombre, 1)[0]
+
+    @classmethod
+    def _incrementar(cls, nombre, cantidad):
+        # UPDATE ... RETURNING: PostgreSQL y SQLite >= 3.35 (la misma versión desde la que
+        # Django devuelve columnas en INSERT). MariaDB/MySQL no lo admiten en UPDATE.
+        if connection.vendor == "postgresql" or (
+            connection.vendor == "sqlite" and connection.features.can_return_columns_from_insert
+        ):
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"UPDATE {cls._meta.db_table} SET valor = valor + %s WHERE nombre = %s RETURNING valor",
+                    [cantidad, nombre],
+                )
+                fila = cursor.fetchone()
+            return fila[0] if fila else None
+        # Resto: el UPDATE bloquea la fila hasta el commit, así la lectura ve el valor propio
+        if not cls.objects.filter(nombre=nombre).update(valor=F("valor") + cantidad):
+            return None
+        return cls.objects.filter(nombre=nombre).values_list("valor", flat=True).get()
+
+
 # ========================
 # CAJA
 # ========================
@@ -17,6 +79,74 @@ class Caja(models.Model):
     def __str__(self):
         return f"Caja de {self.usuario.username} - {self.fecha_apertura.date()}"
 
+    @classmethod
+    def abierta_actual_id(cls):
+        # Solo se cachea cuando hay una caja abierta, así abrir una caja se nota de inmediato
+        ahora = time.monotonic()
+        if _caja_abierta["id"] is None or ahora >= _caja_abierta["expira"]:
+            _caja_abierta["id"] = cls.objects.filter(abierta=True).order_by("pk").values_list("id", flat=True).first()
+            _caja_abierta["expira"] = ahora + CAJA_CACHE_SEGUNDOS
+        return _caja_abierta["id"]
+
+    @classmethod
+    def abierta_actual(cls):
+        caja_id = cls.abierta_actual_id()
+        if not caja_id:
+            return None
+        caja = cls.objects.filter(pk=caja_id, abierta=True).first()
+        if caja is None:
+            # Otro proceso la cerró: se vuelve a resolver
+            cls.invalidar_cache()
+            return cls.objects.filter(abierta=True).order_by("pk").first()
+        return caja
+
+    @staticmethod
+    def invalidar_cache():
+        _caja_abierta["id"] = None
+        _caja_abierta["expira"] = 0.0
+
+    @classmethod
+    def registrar_movimiento(cls, caja_id, monto, tipo, venta=None, solo_abierta=True):
+        # Suma atómica en la BD + asiento en el libro; devuelve False si la caja no admite el movimiento
+        cajas = cls.objects.filter(pk=caja_id)
+        if solo_abierta:
+            cajas = cajas.filter(abierta=True)
+        if not cajas.update(total=F("total") + monto):
+            return False
+        MovimientoCaja.objects.create(caja_id=caja_id, venta=venta, tipo=tipo, monto=monto)
+        return True
+
+    def total_segun_movimientos(self):
+        return self.movimientos.aggregate(total=models.Sum("monto"))["total"] or Decimal("0.00")
+
+
+class CajaCerrada(Exception):
+    pass
+
+
+class MovimientoCaja(models.Model):
+    # Libro de solo inserción: Caja.total es la suma de estos movimientos
+    TIPOS = [
+        ("saldo_inicial", "Saldo inicial"),
+        ("venta", "Venta"),
+        ("ajuste", "Ajuste de venta"),
+        ("traslado", "Traslado entre cajas"),
+    ]
+
+    caja = models.ForeignKey(Caja, related_name="movimientos", on_delete=models.CASCADE)
+    venta = models.ForeignKey("Venta", related_name="movimientos_caja", on_delete=models.SET_NULL, null=True, blank=True)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    monto = models.DecimalField(max_digits=15, decimal_places=2)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de caja no se modifican; registra un ajuste.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.monto} (caja {self.caja_id})"
+
 
 # ========================
 # CLIENTE
@@ -60,6 +190,52 @@ class Producto(models.Model):
     precio_venta = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     vendidos = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     proveedor = models.CharField(max_length=255, blank=True, null=True)
+    # EAN/UPC del fabricante o código interno asignado al crear el producto (ver etiquetas.py).
+    # NULL si no tiene: la restricción única ignora los NULL.
+    codigo_barras = models.CharField("código de barras", max_length=64, unique=True, null=True, blank=True)
+    # Versión de la fila para cachés HTTP; los update()/bulk_update() deben fijarla a mano
+    actualizado = models.DateTimeField(auto_now=True, db_index=True)
+    # Número del contador del catálogo en la última escritura, para la sincronización del
+    # POS (ver catalogo.py); save() lo asigna solo, los update()/bulk_update() con versionar()
+    version_catalogo = models.PositiveBigIntegerField(default=0, db_index=True)
+
+    SECUENCIA_CATALOGO = "catalogo"
+
+    class Meta:
+        indexes = [
+            # Clave natural usada por la importación incremental
+            models.Index(fields=["nombre", "marca", "categoria"], name="producto_clave_natural_idx"),
+            # Conteo de stock bajo del panel
+            models.Index(fields=["stock"], name="producto_stock_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # Recuerda el stock leído para que el kardex registre la diferencia al guardar
+        instancia = super().from_db(db, field_names, values)
+        instancia._stock_cargado = instancia.__dict__.get("stock")
+        return instancia
+
+    @classmethod
+    def reservar_versiones(cls, cantidad):
+        # Números del contador "catalogo". Su fila queda bloqueada hasta el commit, así las
+        # versiones se confirman en orden y un POS que sincroniza "desde N" nunca se salta
+        # una. Pedirlas como ÚLTIMO paso de la transacción, ya con los productos escritos:
+        # el bloqueo dura solo hasta el commit y se toma siempre después de las filas de
+        # producto (nunca al revés, que podría trabarse con una venta).
+        return Secuencia.reservar(cls.SECUENCIA_CATALOGO, cantidad)
+
+    @classmethod
+    def versionar(cls, producto_ids):
+        # Marca con una versión nueva los productos que la transacción en curso cambió
+        producto_ids = list(producto_ids)
+        if not producto_ids:
+            return None
+        with transaction.atomic():
+            version = cls.reservar_versiones(1)[0]
+            for inicio in range(0, len(producto_ids), 1000):
+                cls.objects.filter(pk__in=producto_ids[inicio:inicio + 1000]).update(version_catalogo=version)
+        return version
 
     def save(self, *args, **kwargs):
         # Nos aseguramos que los decimales estén limpios
@@ -68,12 +244,111 @@ class Producto(models.Model):
         self.vendidos = Decimal(self.vendidos or 0)
 
         # Ya no calculamos nada extra (sin ganancia, sin inversión)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.version_catalogo = Producto.versionar([self.pk])
 
     def __str__(self):
         return f"{self.nombre} ({self.marca}) - {self.stock} {self.unidad_medida}"
 
 
+class ProductoEliminado(models.Model):
+    # Lápida de un producto borrado: los POS que sincronizan por versión lo quitan de su copia
+    producto_id = models.PositiveBigIntegerField()
+    version_catalogo = models.PositiveBigIntegerField(db_index=True)
+    fecha = models.DateTimeField(auto_now_add=True)
+
+
+class TrigramaProducto(models.Model):
+    # Índice invertido de búsqueda difusa (ver busqueda.py); se mantiene con señales de Producto
+    trigrama = models.CharField(max_length=3)
+    producto = models.ForeignKey(Producto, related_name="trigramas", on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["trigrama", "producto"], name="trigrama_producto_unico"),
+        ]
+
+
+# ========================
+# KARDEX (MOVIMIENTOS DE STOCK)
+# ========================
+class MovimientoStock(models.Model):
+    # Libro de solo inserción: Producto.stock es la proyección de estos movimientos (ver kardex.py)
+    TIPOS = [
+        ("inicial", "Saldo inicial"),
+        ("venta", "Venta"),
+        ("importacion", "Importación"),
+        ("ajuste", "Ajuste manual"),
+    ]
+
+    producto = models.ForeignKey(Producto, related_name="movimientos", on_delete=models.CASCADE)
+    tipo = models.CharField(max_length=20, choices=TIPOS)
+    cantidad = models.DecimalField(max_digits=12, decimal_places=2)  # positiva entra, negativa sale
+    venta = models.ForeignKey("Venta", related_name="movimientos_stock", on_delete=models.SET_NULL, null=True, blank=True)
+    referencia = models.CharField(max_length=50, blank=True, db_index=True)  # "venta:12", "importacion:3"...
+    fecha = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["producto", "fecha"], name="movimiento_producto_fecha_idx"),
+            models.Index(fields=["fecha"], name="movimiento_fecha_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Los movimientos de stock no se modifican; registra un ajuste.")
+        super().save(*args, **kwargs)
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} {self.cantidad} (producto {self.producto_id})"
+
+
+class SaldoStock(models.Model):
+    # Foto periódica del stock: las consultas a una fecha parten de aquí y suman solo lo posterior
+    producto = models.ForeignKey(Producto, related_name="saldos", on_delete=models.CASCADE)
+    fecha = models.DateTimeField()
+    stock = models.DecimalField(max_digits=12, decimal_places=2)
+    precio_venta = models.DecimalField(max_digits=12, decimal_places=2)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "producto"], name="saldo_stock_fecha_producto"),
+        ]
+
+
+# ========================
+# IMPORTACIONES EN SEGUNDO PLANO
+# ========================
+class TrabajoImportacion(models.Model):
+    ESTADOS = [
+        ("pendiente", "Pendiente"),
+        ("procesando", "Procesando"),
+        ("completado", "Completado"),
+        ("error", "Error"),
+    ]
+
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    archivo = models.FileField(upload_to="importaciones/", blank=True)
+    modo = models.CharField(max_length=20)
+    estado = models.CharField(max_length=20, choices=ESTADOS, default="pendiente")
+    filas_leidas = models.PositiveIntegerField(default=0)
+    insertados = models.PositiveIntegerField(default=0)
+    actualizados = models.PositiveIntegerField(default=0)
+    sin_cambios = models.PositiveIntegerField(default=0)
+    ausentes = models.PositiveIntegerField(default=0)
+    duplicados = models.PositiveIntegerField(default=0)
+    hojas_invalidas = models.JSONField(default=list, blank=True)
+    errores = models.JSONField(default=list, blank=True)
+    creado = models.DateTimeField(auto_now_add=True)
+    finalizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado"]
+
+    def __str__(self):
+        return f"Importación #{self.pk} ({self.estado})"
+
 
 # ========================
 # VENTAS
@@ -89,59 +364,101 @@ class Venta(models.Model):
         ]
     )
     fecha = models.DateTimeField(auto_now_add=True)
-    numero_venta = models.PositiveIntegerField(unique=True, blank=True, null=True)
+    numero_venta = models.PositiveIntegerField(blank=True, null=True)
     total = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     caja = models.ForeignKey("Caja", on_delete=models.SET_NULL, null=True, blank=True)
 
-    def save(self, *args, **kwargs):
-        # Número de venta consecutivo
-        if not self.numero_venta:
-            last_sale = Venta.objects.order_by('-numero_venta').first()
-            self.numero_venta = 1 if not last_sale else last_sale.numero_venta + 1
+    class Meta:
+        constraints = [
+            # Cada tipo de comprobante lleva su propia serie correlativa
+            models.UniqueConstraint(fields=["tipo_comprobante", "numero_venta"], name="venta_numero_por_serie"),
+        ]
+        indexes = [
+            # Historial ordenado por (fecha, id) y filtros por rango de fechas
+            models.Index(fields=["fecha", "id"], name="venta_fecha_id_idx"),
+            # Ventas de una caja en orden cronológico
+            models.Index(fields=["caja", "fecha"], name="venta_caja_fecha_idx"),
+        ]
 
-        is_new = self.pk is None
-        previous_total = Decimal("0.00")
-        previous_caja = None
+    @staticmethod
+    def serie(tipo_comprobante):
+        return f"venta:{tipo_comprobante}"
 
-        if not is_new:
-            prev = Venta.objects.get(pk=self.pk)
-            previous_total = prev.total
-            previous_caja = prev.caja
+    def save(self, *args, **kwargs):
+        # La venta, su movimiento de caja y su resumen diario se confirman juntos
+        with transaction.atomic():
+            if not self.numero_venta:
+                self.numero_venta = Secuencia.siguiente(Venta.serie(self.tipo_comprobante))
+            self._guardar(*args, **kwargs)
+
+    @staticmethod
+    def calcular_total(lineas):
+        # Suma exacta en Decimal de pares (cantidad, precio)
+        total = sum((cantidad * precio for cantidad, precio in lineas), Decimal("0.00"))
+        return total.quantize(Decimal("0.01"))
+
+    @classmethod
+    @contextmanager
+    def recalculo_diferido(cls):
+        # Dentro del bloque, guardar o borrar DetalleVenta no recalcula la venta;
+        # al salir se hace un único cálculo y un único ajuste de caja por venta.
+        if _ventas_diferidas.get() is not None:
+            yield
+            return
+        pendientes = {}
+        token = _ventas_diferidas.set(pendientes)
+        try:
+            yield
+        finally:
+            _ventas_diferidas.reset(token)
+        for venta in pendientes.values():
+            venta.save()
+
+    def _guardar(self, *args, **kwargs):
+        previo = None
+        if self.pk is not None:
+            previo = Venta.objects.filter(pk=self.pk).values("total", "caja_id", "fecha", "tipo_comprobante").first()
+
+        # Una venta nueva aún no tiene items: se respeta el total recibido.
+        # Una existente se recalcula desde sus items para no guardar un total desactualizado.
+        if previo is not None:
+            self.total = Venta.calcular_total(self.items.values_list("cantidad", "precio"))
 
-        if is_new:
-            super().save(*args, **kwargs)
+        # Asociar a caja abierta
+        if not self.caja_id:
+            self.caja_id = Caja.abierta_actual_id()
 
-        # Calcular total desde items
-        total_calculado = self.items.aggregate(
-            total=Sum(F('cantidad') * F('precio'), output_field=FloatField())
-        )['total'] or 0
-        self.total = Decimal(str(total_calculado))
+        if kwargs.get("update_fields") is not None:
+            kwargs["update_fields"] = set(kwargs["update_fields"]) | {"total", "caja"}
+        super().save(*args, **kwargs)
 
-        # Asociar a caja abierta
-        if not self.caja:
-            caja_abierta = Caja.objects.filter(abierta=True).first()
-            if caja_abierta:
-                self.caja = caja_abierta
-
-        super().save(update_fields=['total', 'caja'])
-
-        # Ajustar caja
-        if self.caja and self.caja.abierta:
-            if self.caja.total is None:
-                self.caja.total = Decimal("0.00")
-
-            if is_new:
-                self.caja.total += self.total
-            else:
-                if previous_caja == self.caja:
-                    self.caja.total = self.caja.total - previous_total + self.total
-                else:
-                    if previous_caja:
-                        previous_caja.total = (previous_caja.total or 0) - previous_total
-                        previous_caja.save(update_fields=['total'])
-                    self.caja.total += self.total
-
-            self.caja.save(update_fields=['total'])
+        # Ajustar caja solo con la diferencia
+        if previo is None:
+            if not self._ajustar_caja(self.caja_id, self.total, "venta"):
+                raise CajaCerrada(f"La caja {self.caja_id} ya no está abierta.")
+        elif previo["caja_id"] == self.caja_id:
+            self._ajustar_caja(self.caja_id, self.total - previo["total"], "ajuste")
+        else:
+            self._ajustar_caja(previo["caja_id"], -previo["total"], "traslado", solo_abierta=False)
+            self._ajustar_caja(self.caja_id, self.total, "traslado")
+        self._ajustar_resumen(previo)
+
+    def _ajustar_resumen(self, previo):
+        # Los resúmenes diarios también reciben solo la diferencia (ver resumenes.py)
+        from . import resumenes
+
+        if previo is None:
+            resumenes.sumar_venta(self.fecha, self.tipo_comprobante, 1, self.total)
+        elif previo["tipo_comprobante"] == self.tipo_comprobante:
+            resumenes.sumar_venta(self.fecha, self.tipo_comprobante, 0, self.total - previo["total"])
+        else:
+            resumenes.sumar_venta(previo["fecha"], previo["tipo_comprobante"], -1, -previo["total"])
+            resumenes.sumar_venta(self.fecha, self.tipo_comprobante, 1, self.total)
+
+    def _ajustar_caja(self, caja_id, diferencia, tipo, solo_abierta=True):
+        if not caja_id or not diferencia:
+            return True
+        return Caja.registrar_movimiento(caja_id, diferencia, tipo, venta=self, solo_abierta=solo_abierta)
 
     def __str__(self):
         return f"Venta #{self.numero_venta} - {self.cliente}"
@@ -157,14 +474,77 @@ class DetalleVenta(models.Model):
         return self.cantidad * self.precio
 
     def save(self, *args, **kwargs):
+        from . import resumenes
+
         # Si no se envía precio, se toma el de producto
         if not self.precio and hasattr(self.producto, "precio_venta"):
             self.precio = self.producto.precio_venta
-        super().save(*args, **kwargs)
-
-        # Recalcular total de la venta
-        if self.sale_id:
+        previo = None
+        if self.pk is not None:
+            previo = DetalleVenta.objects.filter(pk=self.pk).values(
+                "producto_id", "cantidad", "precio", "sale__fecha"
+            ).first()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            # Resumen por producto: se quita la línea anterior y se suma la nueva.
+            # Los borrados se restan en la señal post_delete (signals.py), que también cubre las cascadas.
+            if previo is not None:
+                resumenes.sumar_lineas(
+                    previo["sale__fecha"], [(previo["producto_id"], previo["cantidad"], previo["precio"])], signo=-1
+                )
+            resumenes.sumar_lineas(self.sale.fecha, [(self.producto_id, self.cantidad, self.precio)])
+            self._actualizar_venta()
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            resultado = super().delete(*args, **kwargs)
+            self._actualizar_venta()
+        return resultado
+
+    def _actualizar_venta(self):
+        # Recalcular total de la venta (o dejarlo pendiente si hay un lote en curso)
+        if not self.sale_id:
+            return
+        pendientes = _ventas_diferidas.get()
+        if pendientes is not None:
+            pendientes[self.sale_id] = self.sale
+        else:
             self.sale.save()
 
     def __str__(self):
         return f"{self.producto.nombre} x {self.cantidad} {self.producto.unidad_medida}"
+
+
+# ========================
+# RESÚMENES DIARIOS (ver resumenes.py)
+# ========================
+class ResumenVentaDiaria(models.Model):
+    # Una fila por día local y tipo de comprobante
+    fecha = models.DateField()
+    tipo_comprobante = models.CharField(max_length=50)
+    num_ventas = models.PositiveIntegerField(default=0)
+    total = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "tipo_comprobante"], name="resumen_venta_dia_tipo"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.tipo_comprobante}: {self.num_ventas} ventas, S/ {self.total}"
+
+
+class ResumenProductoDiario(models.Model):
+    # Una fila por día local y producto vendido
+    fecha = models.DateField()
+    producto = models.ForeignKey(Producto, related_name="resumenes", on_delete=models.CASCADE)
+    cantidad = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    importe = models.DecimalField(max_digits=15, decimal_places=2, default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["fecha", "producto"], name="resumen_producto_dia"),
+        ]
+
+    def __str__(self):
+        return f"{self.fecha} {self.producto_id}: {self.cantidad}"
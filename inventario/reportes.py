@@ -0,0 +1,153 @@
+import tempfile
+
+import numpy as np
+import pandas as pd
+from django.conf import settings
+from django.db.models import CharField, F, FloatField, Value
+from django.db.models.functions import Cast, Coalesce
+from django.http import FileResponse
+
+from .models import DetalleVenta
+from .resumenes import rango_dias
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+TAMANO_BLOQUE = 5000  # filas por cada viaje a la BD
+# Pareto: A hasta el 80 % del importe acumulado, B hasta el 95 %, C el resto
+LIMITES_ABC = (0.80, 0.95)
+SIN_DATO = "(sin dato)"
+
+COLUMNAS = ["fecha", "comprobante", "venta_id", "producto_id", "producto", "marca", "categoria",
+            "proveedor", "cantidad", "precio"]
+
+
+# --------------------------
+# DATOS
+# --------------------------
+def datos(desde, hasta):
+    # Una sola consulta con los JOIN a venta, producto y categoría. Nada pasa por los
+    # conversores de Django fila por fila: cantidad y precio llegan como float y la
+    # fecha como texto ISO (en UTC), que pandas interpreta de una vez para toda la columna.
+    inicio, fin = rango_dias(desde, hasta)
+    filas = (
+        DetalleVenta.objects.filter(sale__fecha__gte=inicio, sale__fecha__lt=fin)
+        .annotate(
+            fecha_texto=Cast("sale__fecha", CharField()),
+            proveedor=Coalesce(F("producto__proveedor"), Value("")),
+            cantidad_real=Cast("cantidad", FloatField()),
+            precio_real=Cast("precio", FloatField()),
+        )
+        .values_list(
+            "fecha_texto", "sale__tipo_comprobante", "sale_id", "producto_id", "producto__nombre",
+            "producto__marca", "producto__categoria__nombre", "proveedor", "cantidad_real", "precio_real",
+        )
+        .order_by()
+    )
+    df = pd.DataFrame.from_records(filas.iterator(chunk_size=TAMANO_BLOQUE), columns=COLUMNAS).astype(
+        {"venta_id": "int64", "producto_id": "int64", "cantidad": "float64", "precio": "float64"}
+    )  # un rango sin ventas daría columnas object
+    df["importe"] = df["cantidad"] * df["precio"]
+    fechas = pd.to_datetime(df.pop("fecha"), format="ISO8601", utc=True).dt.tz_convert(settings.TIME_ZONE)
+    df["dia"] = fechas.dt.tz_localize(None).dt.normalize()  # día local
+    for columna in ("marca", "proveedor"):
+        df[columna] = df[columna].replace("", SIN_DATO)
+    return df
+
+
+# --------------------------
+# DESGLOSES
+# --------------------------
+def _agrupar(df, columnas):
+    total = df["importe"].sum()
+    tabla = df.groupby(columnas, sort=False).agg(
+        ventas=("venta_id", "nunique"),
+        lineas=("importe", "size"),
+        unidades=("cantidad", "sum"),
+        importe=("importe", "sum"),
+    )
+    tabla["participacion"] = tabla["importe"] / total if total else 0.0
+    return tabla
+
+
+def por_dia(df, desde, hasta):
+    # Todos los días del rango, también los que no tuvieron ventas
+    tabla = _agrupar(df, "dia").reindex(pd.date_range(desde, hasta, freq="D", name="dia"), fill_value=0)
+    tabla["ticket_promedio"] = (tabla["importe"] / tabla["ventas"].replace(0, np.nan)).fillna(0.0)
+    tabla["importe_acumulado"] = tabla["importe"].cumsum()
+    tabla.index = pd.Index(tabla.index.date, name="dia")
+    return tabla
+
+
+def por(df, columna):
+    return _agrupar(df, columna).sort_values("importe", ascending=False)
+
+
+def clasificacion_abc(df):
+    tabla = _agrupar(df, ["producto_id", "producto", "marca", "categoria"]).sort_values(
+        ["importe", "unidades"], ascending=False
+    )
+    acumulado = tabla["participacion"].cumsum()
+    # La clase se decide con lo acumulado ANTES del producto: el primero siempre es A
+    previo = acumulado - tabla["participacion"]
+    tabla["acumulado"] = acumulado
+    tabla["clase"] = np.select([previo < LIMITES_ABC[0], previo < LIMITES_ABC[1]], ["A", "B"], "C")
+    tabla["ranking"] = np.arange(1, len(tabla) + 1)
+    return tabla.reset_index().set_index("ranking")
+
+
+def resumen(df, abc):
+    ventas = df["venta_id"].nunique()
+    importe = df["importe"].sum()
+    clases = abc.groupby("clase").agg(productos=("importe", "size"), importe=("importe", "sum"))
+    filas = [
+        ("Ventas", ventas),
+        ("Líneas de venta", len(df)),
+        ("Unidades vendidas", df["cantidad"].sum()),
+        ("Importe total (S/)", importe),
+        ("Ticket promedio (S/)", importe / ventas if ventas else 0),
+        ("Productos vendidos", len(abc)),
+    ]
+    for clase in ("A", "B", "C"):
+        productos, monto = clases.loc[clase] if clase in clases.index else (0, 0.0)
+        filas.append((f"Productos clase {clase}", productos))
+        filas.append((f"Importe clase {clase} (S/)", monto))
+    return pd.DataFrame(filas, columns=["indicador", "valor"]).set_index("indicador")
+
+
+def calcular(desde, hasta):
+    df = datos(desde, hasta)
+    abc = clasificacion_abc(df)
+    return {
+        "Resumen": resumen(df, abc),
+        "Por día": por_dia(df, desde, hasta),
+        "Por categoría": por(df, "categoria"),
+        "Por marca": por(df, "marca"),
+        "Por proveedor": por(df, "proveedor"),
+        "Por comprobante": por(df, "comprobante"),
+        "ABC productos": abc,
+    }
+
+
+# --------------------------
+# XLSX
+# --------------------------
+def exportar_xlsx(desde, hasta):
+    hojas = calcular(desde, hasta)
+    archivo = tempfile.TemporaryFile()
+    with pd.ExcelWriter(archivo, engine="openpyxl") as libro:
+        for nombre, tabla in hojas.items():
+            tabla.round(4).to_excel(libro, sheet_name=nombre)
+            hoja = libro.sheets[nombre]
+            hoja.freeze_panes = "B2"
+            for columna in hoja.columns:
+                # Ancho según el encabezado y las primeras filas, como en exportacion.py
+                largo = max(len(str(celda.value or "")) for celda in columna[:200])
+                hoja.column_dimensions[columna[0].column_letter].width = min(largo + 2, 60)
+    archivo.seek(0)
+    return FileResponse(
+        archivo,
+        as_attachment=True,
+        filename=f"Reporte_ventas_{desde:%Y%m%d}_{hasta:%Y%m%d}.xlsx",
+        content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
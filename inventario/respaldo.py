@@ -0,0 +1,235 @@
+import codecs
+import io
+import json
+
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.core.serializers.python import Deserializer
+from django.db import connection, transaction
+from django.db.models import Exists, Max, OuterRef
+
+from . import busqueda, catalogo, etiquetas, kardex, resumenes
+from .models import Caja, DetalleVenta, MovimientoCaja, MovimientoStock, Producto, Secuencia, Venta
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+TAMANO_LOTE = 1000  # objetos por cada bulk_create
+TAMANO_BLOQUE = 1 << 20  # caracteres leídos del archivo por vez
+
+# El orden importa: el BOM de UTF-32 LE empieza igual que el de UTF-16 LE
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32"),
+    (codecs.BOM_UTF32_BE, "utf-32"),
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+
+class ErrorRespaldo(Exception):
+    pass
+
+
+# --------------------------
+# LECTURA EN STREAMING
+# --------------------------
+def abrir(ruta):
+    # datos.json viene en UTF-16 con BOM (volcado desde PowerShell); las copias
+    # "clean"/"utf8" en UTF-8 con BOM. Sin BOM se asume UTF-8.
+    archivo = open(ruta, "rb")
+    inicio = archivo.peek(4)[:4]
+    codificacion = next((cod for bom, cod in BOMS if inicio.startswith(bom)), "utf-8")
+    return io.TextIOWrapper(archivo, encoding=codificacion)
+
+
+def _saltar(texto, pos):
+    # Espacios y comas entre elementos de la lista
+    while pos < len(texto) and texto[pos] in " \t\r\n,":
+        pos += 1
+    return pos
+
+
+def objetos(texto):
+    # Recorre una lista JSON objeto por objeto con raw_decode: en memoria solo
+    # queda el bloque que se está leyendo, no el archivo completo.
+    decodificador = json.JSONDecoder()
+    buffer, agotado, leidos = texto.read(TAMANO_BLOQUE), False, 0
+    pos = _saltar(buffer, 0)
+    if buffer[pos:pos + 1] != "[":
+        raise ErrorRespaldo("El respaldo debe ser una lista JSON de objetos")
+    pos += 1
+
+    while True:
+        pos = _saltar(buffer, pos)
+        if buffer[pos:pos + 1] == "]":
+            return
+        try:
+            objeto, fin = decodificador.raw_decode(buffer, pos)
+        except json.JSONDecodeError:
+            fin = None
+        # Un objeto que llega justo al final del bloque puede estar cortado: se lee más
+        if fin is None or (fin == len(buffer) and not agotado):
+            if agotado:
+                raise ErrorRespaldo(f"JSON inválido o incompleto cerca del carácter {leidos + pos}")
+            bloque = texto.read(TAMANO_BLOQUE)
+            agotado = not bloque
+            leidos += pos
+            buffer, pos = buffer[pos:] + bloque, 0
+            continue
+        yield objeto
+        pos = fin
+
+
+# --------------------------
+# INSERCIÓN MASIVA
+# --------------------------
+def _campos_fecha_automatica(modelo):
+    return [
+        campo for campo in modelo._meta.concrete_fields
+        if getattr(campo, "auto_now", False) or getattr(campo, "auto_now_add", False)
+    ]
+
+
+def _insertar(modelo, deserializados, resumen):
+    # bulk_create no llama a save() (ni a sus recálculos) ni dispara señales
+    instancias = [d.object for d in deserializados]
+    automaticos = _campos_fecha_automatica(modelo)
+    # pre_save de auto_now/auto_now_add pisa las fechas del respaldo; se guardan para reponerlas
+    fechas = [[getattr(o, campo.attname) for campo in automaticos] for o in instancias]
+
+    con_pk = [o for o in instancias if o.pk is not None]
+    sin_pk = [o for o in instancias if o.pk is None]
+    campos = [c.name for c in modelo._meta.concrete_fields if not c.primary_key]
+    if con_pk:
+        # Restaurar sobre una BD con datos: las filas con la misma pk se sobrescriben
+        modelo._base_manager.bulk_create(
+            con_pk, batch_size=TAMANO_LOTE, update_conflicts=bool(campos),
+            ignore_conflicts=not campos, unique_fields=[modelo._meta.pk.name] if campos else None,
+            update_fields=campos or None,
+        )
+    if sin_pk:
+        # Claves naturales que no existían en la BD (usuarios, permisos...)
+        modelo._base_manager.bulk_create(sin_pk, batch_size=TAMANO_LOTE)
+
+    if automaticos:
+        _reponer_fechas(modelo, automaticos, instancias, fechas)
+
+    for d in deserializados:
+        for nombre, valores in (d.m2m_data or {}).items():
+            _relacionar(modelo, d.object, nombre, valores)
+
+    etiqueta = modelo._meta.label
+    resumen["modelos"][etiqueta] = resumen["modelos"].get(etiqueta, 0) + len(instancias)
+    resumen["objetos"] += len(instancias)
+
+
+def _reponer_fechas(modelo, automaticos, instancias, fechas):
+    # Un UPDATE parametrizado con executemany: bulk_update armaría un CASE de mil ramas
+    # por campo, que en Django cuesta más que el propio INSERT.
+    tabla = connection.ops.quote_name(modelo._meta.db_table)
+    pk = connection.ops.quote_name(modelo._meta.pk.column)
+    with connection.cursor() as cursor:
+        for campo, columna in zip(automaticos, zip(*fechas)):
+            filas = [
+                (campo.get_db_prep_save(valor, connection), instancia.pk)
+                for instancia, valor in zip(instancias, columna) if valor is not None
+            ]
+            if filas:
+                cursor.executemany(
+                    f"UPDATE {tabla} SET {connection.ops.quote_name(campo.column)} = %s WHERE {pk} = %s", filas
+                )
+
+
+def _relacionar(modelo, instancia, nombre, valores):
+    campo = modelo._meta.get_field(nombre)
+    intermedia = campo.remote_field.through
+    origen = campo.m2m_field_name()
+    destino = campo.m2m_reverse_field_name()
+    intermedia.objects.filter(**{origen: instancia.pk}).delete()
+    intermedia.objects.bulk_create(
+        [intermedia(**{f"{origen}_id": instancia.pk, f"{destino}_id": valor}) for valor in valores],
+        ignore_conflicts=True,
+    )
+
+
+def cargar(ruta, progreso=None):
+    # Los volcados de dumpdata ya vienen agrupados por modelo y en orden de
+    # dependencias: cada tramo del mismo modelo se inserta en lotes de TAMANO_LOTE.
+    # Todo va en una transacción con las FK verificadas al final, como loaddata.
+    resumen = {"objetos": 0, "modelos": {}}
+    modelos = set()
+    diferidos = []
+
+    with abrir(ruta) as texto, transaction.atomic():
+        with connection.constraint_checks_disabled():
+            modelo_actual, pendientes = None, []
+            deserializador = Deserializer(
+                objetos(texto), ignorenonexistent=True, handle_forward_references=True
+            )
+            for deserializado in deserializador:
+                modelo = type(deserializado.object)
+                if pendientes and (modelo is not modelo_actual or len(pendientes) >= TAMANO_LOTE):
+                    _insertar(modelo_actual, pendientes, resumen)
+                    pendientes = []
+                    if progreso:
+                        progreso(resumen)
+                modelo_actual = modelo
+                modelos.add(modelo)
+                pendientes.append(deserializado)
+                if deserializado.deferred_fields:
+                    diferidos.append(deserializado)
+            if pendientes:
+                _insertar(modelo_actual, pendientes, resumen)
+
+            # Referencias por clave natural a objetos que aparecían más adelante en el archivo
+            for deserializado in diferidos:
+                deserializado.save_deferred_fields()
+
+        connection.check_constraints(table_names=[m._meta.db_table for m in modelos])
+        _reiniciar_secuencias(modelos)
+        _derivados(modelos)
+
+    # Metadatos de ventas, tickets y búsquedas en caché ya no corresponden a la BD
+    cache.clear()
+    return resumen
+
+
+def _reiniciar_secuencias(modelos):
+    # PostgreSQL: las secuencias de id siguen donde estaban aunque se insertaran pk explícitas
+    sentencias = connection.ops.sequence_reset_sql(no_style(), list(modelos))
+    if sentencias:
+        with connection.cursor() as cursor:
+            for sql in sentencias:
+                cursor.execute(sql)
+
+
+def _derivados(modelos):
+    # Lo que las señales habrían mantenido al guardar fila por fila
+    if Producto in modelos:
+        busqueda.reindexar_todo()
+        etiquetas.asignar_codigos(Producto.objects.filter(codigo_barras__isnull=True).values_list("id", flat=True))
+        catalogo.renumerar()
+        # Respaldos anteriores al kardex: el stock restaurado entra como saldo inicial
+        sin_kardex = Producto.objects.filter(~Exists(MovimientoStock.objects.filter(producto=OuterRef("pk"))))
+        kardex.registrar(
+            MovimientoStock(producto_id=pid, tipo="inicial", cantidad=stock, referencia="respaldo")
+            for pid, stock in sin_kardex.values_list("id", "stock").iterator(chunk_size=TAMANO_LOTE)
+        )
+    if Venta in modelos:
+        # Cada serie continúa desde el último número restaurado, como en la migración 0006;
+        # si no, la siguiente venta repetiría un número ya emitido
+        ultimos = Venta.objects.values_list("tipo_comprobante").annotate(ultimo=Max("numero_venta")).order_by()
+        for tipo, ultimo in ultimos:
+            Secuencia.objects.update_or_create(nombre=Venta.serie(tipo), defaults={"valor": ultimo or 0})
+    if Venta in modelos or DetalleVenta in modelos:
+        resumenes.reconstruir()
+    if Caja in modelos:
+        # Respaldos anteriores al libro de caja: el total restaurado entra como saldo inicial (migración 0007)
+        sin_libro = Caja.objects.filter(~Exists(MovimientoCaja.objects.filter(caja=OuterRef("pk")))).exclude(total=0)
+        MovimientoCaja.objects.bulk_create(
+            (MovimientoCaja(caja_id=caja_id, tipo="saldo_inicial", monto=total)
+             for caja_id, total in sin_libro.values_list("id", "total").iterator(chunk_size=TAMANO_LOTE)),
+            batch_size=TAMANO_LOTE,
+        )
+        Caja.invalidar_cache()
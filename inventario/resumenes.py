@@ -0,0 +1,158 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, Count, DecimalField, F, Sum, Value, When
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DetalleVenta, ResumenVentaDiaria, ResumenProductoDiario, Venta
+
+CENTIMOS = Decimal("0.01")
+_DECIMAL = DecimalField(max_digits=15, decimal_places=2)
+
+
+# --------------------------
+# FECHAS
+# --------------------------
+def inicio_del_dia(fecha):
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def rango_dias(desde, hasta):
+    # Rango semiabierto [desde 00:00, hasta+1 00:00) en la zona horaria local:
+    # incluye el último día completo y permite usar el índice sobre Venta.fecha
+    return inicio_del_dia(desde), inicio_del_dia(hasta + timedelta(days=1))
+
+
+# --------------------------
+# ACTUALIZACIÓN INCREMENTAL
+# --------------------------
+# Cada camino que cambia una venta suma aquí su diferencia, igual que con la caja:
+# Venta._guardar() el número de ventas y el total, DetalleVenta.save() y las
+# señales de borrado las líneas, y confirmar_venta() las líneas de su bulk_create.
+def sumar_venta(fecha, tipo_comprobante, num_ventas, total):
+    # fecha es la de la venta (datetime); el resumen es por día local
+    if not num_ventas and not total:
+        return
+    fecha = timezone.localdate(fecha)
+    filas = ResumenVentaDiaria.objects.filter(fecha=fecha, tipo_comprobante=tipo_comprobante)
+    incremento = {"num_ventas": F("num_ventas") + num_ventas, "total": F("total") + total}
+    if filas.update(**incremento) or num_ventas <= 0:
+        return  # un ajuste sobre un día sin resumen no se inventa: lo repone reconstruir_resumenes
+    try:
+        with transaction.atomic():
+            ResumenVentaDiaria.objects.create(
+                fecha=fecha, tipo_comprobante=tipo_comprobante, num_ventas=num_ventas, total=total
+            )
+    except IntegrityError:
+        filas.update(**incremento)  # otra venta creó la fila del día al mismo tiempo
+
+
+def sumar_lineas(fecha, lineas, signo=1):
+    # lineas: (producto_id, cantidad, precio). Se llama dentro de la transacción de la venta;
+    # las filas de esos productos ya están bloqueadas, así que dos ventas simultáneas
+    # del mismo producto no chocan al sumar su resumen.
+    por_producto = defaultdict(lambda: [Decimal("0"), Decimal("0")])
+    for pid, cantidad, precio in lineas:
+        por_producto[pid][0] += signo * cantidad
+        por_producto[pid][1] += signo * cantidad * precio
+    _sumar_productos(timezone.localdate(fecha), {
+        pid: (cantidad, importe.quantize(CENTIMOS))
+        for pid, (cantidad, importe) in por_producto.items()
+        if cantidad or importe
+    }, crear=signo > 0)
+
+
+def _sumar_productos(fecha, por_producto, crear=True):
+    if not por_producto:
+        return
+    existentes = set(
+        ResumenProductoDiario.objects.filter(fecha=fecha, producto_id__in=list(por_producto))
+        .values_list("producto_id", flat=True)
+    )
+    if existentes:
+        ResumenProductoDiario.objects.filter(fecha=fecha, producto_id__in=existentes).update(
+            cantidad=F("cantidad") + Case(
+                *[When(producto_id=pid, then=Value(por_producto[pid][0])) for pid in existentes],
+                output_field=_DECIMAL,
+            ),
+            importe=F("importe") + Case(
+                *[When(producto_id=pid, then=Value(por_producto[pid][1])) for pid in existentes],
+                output_field=_DECIMAL,
+            ),
+        )
+    if crear:
+        ResumenProductoDiario.objects.bulk_create([
+            ResumenProductoDiario(fecha=fecha, producto_id=pid, cantidad=cantidad, importe=importe)
+            for pid, (cantidad, importe) in por_producto.items()
+            if pid not in existentes
+        ])
+
+
+# --------------------------
+# RECONSTRUCCIÓN MASIVA
+# --------------------------
+def reconstruir(desde=None, hasta=None):
+    # Recalcula los resúmenes del rango (o de todo el historial) desde Venta/DetalleVenta
+    zona = timezone.get_current_timezone()
+
+    ventas = Venta.objects.all()
+    detalles = DetalleVenta.objects.all()
+    resumenes_venta = ResumenVentaDiaria.objects.all()
+    resumenes_producto = ResumenProductoDiario.objects.all()
+    if desde:
+        ventas = ventas.filter(fecha__gte=inicio_del_dia(desde))
+        detalles = detalles.filter(sale__fecha__gte=inicio_del_dia(desde))
+        resumenes_venta = resumenes_venta.filter(fecha__gte=desde)
+        resumenes_producto = resumenes_producto.filter(fecha__gte=desde)
+    if hasta:
+        fin = inicio_del_dia(hasta + timedelta(days=1))
+        ventas = ventas.filter(fecha__lt=fin)
+        detalles = detalles.filter(sale__fecha__lt=fin)
+        resumenes_venta = resumenes_venta.filter(fecha__lte=hasta)
+        resumenes_producto = resumenes_producto.filter(fecha__lte=hasta)
+
+    por_dia = (
+        ventas.annotate(dia=TruncDate("fecha", tzinfo=zona))
+        .values("dia", "tipo_comprobante")
+        .annotate(suma_ventas=Count("id"), suma_total=Sum("total"))
+        .order_by()
+    )
+    por_producto = (
+        detalles.annotate(dia=TruncDate("sale__fecha", tzinfo=zona))
+        .values("dia", "producto_id")
+        .annotate(suma_cantidad=Sum("cantidad"), suma_importe=Sum(F("cantidad") * F("precio"), output_field=_DECIMAL))
+        .order_by()
+    )
+
+    with transaction.atomic():
+        resumenes_venta.delete()
+        resumenes_producto.delete()
+        ResumenVentaDiaria.objects.bulk_create([
+            ResumenVentaDiaria(
+                fecha=fila["dia"], tipo_comprobante=fila["tipo_comprobante"],
+                num_ventas=fila["suma_ventas"], total=fila["suma_total"] or 0,
+            )
+            for fila in por_dia
+        ], batch_size=1000)
+        ResumenProductoDiario.objects.bulk_create([
+            ResumenProductoDiario(
+                fecha=fila["dia"], producto_id=fila["producto_id"],
+                cantidad=fila["suma_cantidad"] or 0,
+                importe=Decimal(fila["suma_importe"] or 0).quantize(CENTIMOS),
+            )
+            for fila in por_producto
+        ], batch_size=1000)
+
+
+# --------------------------
+# CONSULTAS
+# --------------------------
+def totales_periodo(desde, hasta):
+    # Totales entre dos fechas locales (ambas incluidas) leyendo solo filas de resumen
+    totales = ResumenVentaDiaria.objects.filter(fecha__gte=desde, fecha__lte=hasta).aggregate(
+        num_ventas=Sum("num_ventas"), total=Sum("total")
+    )
+    return {"num_ventas": totales["num_ventas"] or 0, "total": totales["total"] or Decimal("0.00")}
@@ -0,0 +1,110 @@
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from . import busqueda, catalogo, etiquetas, kardex, metricas, resumenes, tickets
+from .models import Caja, Producto, Venta, DetalleVenta
+
+
+# --------------------------
+# CAJA
+# --------------------------
+@receiver([post_save, post_delete], sender=Caja)
+def invalidar_caja_abierta(sender, **kwargs):
+    # Abrir, cerrar o borrar una caja cambia cuál es la caja abierta
+    Caja.invalidar_cache()
+
+
+# --------------------------
+# ÍNDICE DE BÚSQUEDA
+# --------------------------
+@receiver(post_save, sender=Producto)
+def indexar_producto(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Al borrar un producto sus trigramas se eliminan en cascada
+    if raw or (update_fields and not set(update_fields) & set(busqueda.CAMPOS_INDEXADOS)):
+        return
+    busqueda.indexar([instance.pk])
+
+
+# --------------------------
+# CÓDIGO DE BARRAS
+# --------------------------
+@receiver(post_save, sender=Producto)
+def asignar_codigo_barras(sender, instance, raw=False, **kwargs):
+    # Sin código del fabricante recibe uno interno al guardarse, no al imprimir sus etiquetas
+    if raw or instance.codigo_barras:
+        return
+    instance.codigo_barras = etiquetas.asignar_codigos([instance.pk]).get(instance.pk)
+
+
+# --------------------------
+# KARDEX
+# --------------------------
+@receiver(post_save, sender=Producto)
+def registrar_movimiento_stock(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    # Altas y ediciones con save() (formularios, shell). Las ventas y la importación
+    # usan operaciones masivas sin señales y escriben sus movimientos por su cuenta.
+    if raw or (update_fields and "stock" not in update_fields):
+        return
+    if created:
+        kardex.registrar_cambio(instance, 0, tipo="inicial")
+    elif getattr(instance, "_stock_cargado", None) is not None:
+        kardex.registrar_cambio(instance, instance._stock_cargado)
+    instance._stock_cargado = instance.stock
+
+
+# --------------------------
+# CATÁLOGO DEL POS
+# --------------------------
+@receiver(pre_delete, sender=Producto)
+def registrar_producto_eliminado(sender, instance, **kwargs):
+    # Dentro de la transacción del borrado: la lápida se confirma junto con él
+    catalogo.producto_eliminado(instance.pk)
+
+
+# --------------------------
+# RESÚMENES DIARIOS
+# --------------------------
+@receiver(post_delete, sender=Venta)
+def restar_venta_resumen(sender, instance, **kwargs):
+    # Altas y ediciones ajustan el resumen en Venta._guardar(); aquí los borrados
+    resumenes.sumar_venta(instance.fecha, instance.tipo_comprobante, -1, -instance.total)
+
+
+@receiver(post_delete, sender=DetalleVenta)
+def restar_linea_resumen(sender, instance, origin=None, **kwargs):
+    # Cubre el borrado de una línea y las cascadas al borrar su venta. Si lo que se borra
+    # es el producto, sus filas de resumen se van con él en la misma cascada.
+    if isinstance(origin, Producto) or getattr(origin, "model", None) is Producto:
+        return
+    if isinstance(origin, Venta) and origin.pk == instance.sale_id:
+        fecha = origin.fecha
+    else:
+        fecha = Venta.objects.filter(pk=instance.sale_id).values_list("fecha", flat=True).first()
+    if fecha is not None:
+        resumenes.sumar_lineas(fecha, [(instance.producto_id, instance.cantidad, instance.precio)], signo=-1)
+
+
+# --------------------------
+# MÉTRICAS DEL PANEL
+# --------------------------
+@receiver([post_save, post_delete], sender=Venta)
+@receiver([post_save, post_delete], sender=DetalleVenta)
+@receiver([post_save, post_delete], sender=Producto)
+def invalidar_metricas(sender, raw=False, **kwargs):
+    # Las operaciones masivas (importación, descuento de stock) no emiten señales:
+    # la importación invalida por su cuenta y la venta ya dispara post_save de Venta
+    if not raw:
+        metricas.invalidar()
+
+
+# --------------------------
+# TICKETS
+# --------------------------
+@receiver([post_save, post_delete], sender=Venta)
+def invalidar_ticket_venta(sender, instance, **kwargs):
+    tickets.invalidar(instance.pk)
+
+
+@receiver([post_save, post_delete], sender=DetalleVenta)
+def invalidar_ticket_detalle(sender, instance, **kwargs):
+    tickets.invalidar(instance.sale_id)
@@ -0,0 +1,130 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections, connection, transaction
+from django.utils import timezone
+
+from . import importacion
+from .models import TrabajoImportacion
+
+# --------------------------
+# POOL LOCAL DE TRABAJOS
+# --------------------------
+# Sin broker externo: cada proceso web mantiene su propio pool de hilos.
+HILOS_IMPORTACION = getattr(settings, "IMPORTACION_HILOS", 2)
+# Un trabajo vivo renueva su latido en la caché compartida; si el worker se reinicia
+# el latido expira y la próxima consulta de estado lo marca como interrumpido.
+LATIDO_SEGUNDOS = getattr(settings, "IMPORTACION_LATIDO_SEGUNDOS", 900)
+MENSAJE_INTERRUMPIDO = "La importación se interrumpió (el servidor se reinició). Vuelve a subir el archivo."
+CAMPOS_RESUMEN = ["filas_leidas", "insertados", "actualizados", "sin_cambios", "ausentes", "duplicados"]
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _obtener_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadPoolExecutor(max_workers=HILOS_IMPORTACION, thread_name_prefix="importacion")
+        return _pool
+
+
+def _clave_progreso(trabajo_id):
+    return f"importacion:{trabajo_id}:progreso"
+
+
+def _clave_latido(trabajo_id):
+    return f"importacion:{trabajo_id}:latido"
+
+
+def _latir(trabajo_id):
+    cache.set(_clave_latido(trabajo_id), True, LATIDO_SEGUNDOS)
+
+
+def _enviar(trabajo_id):
+    _latir(trabajo_id)
+    _obtener_pool().submit(ejecutar_importacion, trabajo_id)
+
+
+def encolar_importacion(trabajo):
+    # Se envía al pool cuando la fila del trabajo ya es visible para otros hilos
+    transaction.on_commit(lambda: _enviar(trabajo.pk))
+
+
+# --------------------------
+# EJECUCIÓN
+# --------------------------
+def ejecutar_importacion(trabajo_id):
+    close_old_connections()
+    try:
+        # Solo se toma si sigue pendiente: uno dado por interrumpido mientras esperaba no se ejecuta
+        if not TrabajoImportacion.objects.filter(pk=trabajo_id, estado="pendiente").update(estado="procesando"):
+            return
+        trabajo = TrabajoImportacion.objects.get(pk=trabajo_id)
+        _latir(trabajo_id)
+
+        # El avance se publica tras cada lote en la caché compartida, sin escribir la
+        # fila del trabajo en cada lote.
+        def progreso(resumen):
+            cache.set(_clave_progreso(trabajo_id), {c: resumen[c] for c in CAMPOS_RESUMEN}, 3600)
+            _latir(trabajo_id)
+
+        en_curso = TrabajoImportacion.objects.filter(pk=trabajo_id, estado="procesando")
+        try:
+            resumen = importacion.importar_libro(
+                trabajo.archivo.path, modo=trabajo.modo, progreso=progreso,
+                referencia=f"importacion:{trabajo_id}",
+            )
+        except Exception as e:
+            # Al actualizar, los lotes anteriores al error ya están guardados y el trabajo los
+            # informa; un reemplazo fallido se deshace entero y no deja nada guardado
+            guardado = {}
+            if trabajo.modo == importacion.MODO_ACTUALIZAR:
+                guardado = cache.get(_clave_progreso(trabajo_id)) or {}
+            en_curso.update(estado="error", errores=[str(e)], finalizado=timezone.now(), **guardado)
+        else:
+            en_curso.update(
+                estado="completado",
+                hojas_invalidas=resumen["hojas_invalidas"],
+                finalizado=timezone.now(),
+                **{c: resumen[c] for c in CAMPOS_RESUMEN},
+            )
+        finally:
+            cache.delete_many([_clave_progreso(trabajo_id), _clave_latido(trabajo_id)])
+            trabajo.archivo.delete(save=False)
+    finally:
+        connection.close()
+
+
+def revisar_interrumpido(trabajo):
+    # Un trabajo pendiente o en proceso sin latido quedó huérfano: su hilo murió con el worker
+    if trabajo.estado not in ("pendiente", "procesando") or cache.get(_clave_latido(trabajo.pk)):
+        return trabajo
+    ahora = timezone.now()
+    if TrabajoImportacion.objects.filter(pk=trabajo.pk, estado=trabajo.estado).update(
+        estado="error", errores=[MENSAJE_INTERRUMPIDO], finalizado=ahora
+    ):
+        trabajo.archivo.delete(save=False)
+        trabajo.estado, trabajo.errores, trabajo.finalizado = "error", [MENSAJE_INTERRUMPIDO], ahora
+    else:
+        trabajo.refresh_from_db()  # terminó justo ahora
+    return trabajo
+
+
+def estado_trabajo(trabajo):
+    trabajo = revisar_interrumpido(trabajo)
+    datos = {
+        "id": trabajo.pk,
+        "estado": trabajo.estado,
+        "modo": trabajo.modo,
+        "hojas_invalidas": trabajo.hojas_invalidas,
+        "errores": trabajo.errores,
+        "terminado": trabajo.estado in ("completado", "error"),
+    }
+    datos.update({c: getattr(trabajo, c) for c in CAMPOS_RESUMEN})
+    if trabajo.estado == "procesando":
+        datos.update(cache.get(_clave_progreso(trabajo.pk)) or {})
+    return datos
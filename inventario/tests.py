@@ -0,0 +1,737 @@
+import io
+import re
+import shutil
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
+
+import openpyxl
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DatabaseError, connection, transaction
+from django.http import QueryDict
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from . import (
+    busqueda, catalogo, etiquetas, importacion, instrumentacion, kardex, reportes, resumenes, respaldo, tickets,
+    ventas_views, views,
+)
+from .models import (
+    Caja, Categoria, DetalleVenta, MovimientoCaja, MovimientoStock, Producto,
+    ResumenProductoDiario, ResumenVentaDiaria, Secuencia, Venta,
+)
+from .ventas import ErrorVenta, StockInsuficiente, confirmar_venta
+
+
+CACHE_DE_PRUEBA = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+
+class DatosMixin:
+    def setUp(self):
+        # La caché en disco del proyecto no se toca (la restauración hace cache.clear())
+        self.enterContext(override_settings(CACHES=CACHE_DE_PRUEBA))
+        cache.clear()
+        Caja.invalidar_cache()
+        self.usuario = User.objects.create_user("cajero", password="clave")
+        self.caja = Caja.objects.create(usuario=self.usuario, monto_inicial=Decimal("0"))
+        categoria = Categoria.objects.create(nombre="PISOS")
+        self.p1, self.p2 = (
+            Producto.objects.create(nombre=nombre, categoria=categoria, stock=Decimal("10"), precio_venta=Decimal("25"))
+            for nombre in ("Porcelanato 60x60", "Cerámico 45x45")
+        )
+
+    def vender(self, tipo="Boleta", lineas=None):
+        return confirmar_venta("Cliente", tipo, lineas or [(self.p1.pk, Decimal("2"), Decimal("25"))])
+
+    def stock(self, producto):
+        return Producto.objects.values_list("stock", flat=True).get(pk=producto.pk)
+
+
+# --------------------------
+# VENTA TODO O NADA
+# --------------------------
+class ConfirmarVentaTests(DatosMixin, TestCase):
+    def test_descuenta_stock_y_registra_todo(self):
+        venta = self.vender(lineas=[(self.p1.pk, Decimal("2"), Decimal("25")), (self.p2.pk, Decimal("1.5"), Decimal("30"))])
+
+        self.assertEqual(venta.total, Decimal("95.00"))
+        self.assertEqual(venta.items.count(), 2)
+        self.assertEqual(self.stock(self.p1), Decimal("8"))
+        self.assertEqual(self.stock(self.p2), Decimal("8.5"))
+        self.assertEqual(MovimientoStock.objects.filter(venta=venta).count(), 2)
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total, Decimal("95.00"))
+
+    def test_stock_insuficiente_no_deja_nada(self):
+        with self.assertRaises(StockInsuficiente):
+            self.vender(lineas=[(self.p1.pk, Decimal("2"), Decimal("25")), (self.p2.pk, Decimal("11"), Decimal("30"))])
+
+        self.assertFalse(Venta.objects.exists())
+        self.assertFalse(DetalleVenta.objects.exists())
+        self.assertEqual(self.stock(self.p1), Decimal("10"))
+        self.assertEqual(self.stock(self.p2), Decimal("10"))
+        self.assertFalse(MovimientoCaja.objects.exists())
+        self.assertFalse(ResumenVentaDiaria.objects.exists())
+
+    def test_lineas_repetidas_suman_contra_el_stock(self):
+        with self.assertRaises(StockInsuficiente):
+            self.vender(lineas=[(self.p1.pk, Decimal("6"), Decimal("25")), (self.p1.pk, Decimal("5"), Decimal("25"))])
+        self.assertEqual(self.stock(self.p1), Decimal("10"))
+
+    def test_producto_inexistente(self):
+        with self.assertRaises(ErrorVenta):
+            self.vender(lineas=[(self.p1.pk, Decimal("1"), Decimal("25")), (999999, Decimal("1"), Decimal("1"))])
+        self.assertFalse(Venta.objects.exists())
+
+    def test_sin_caja_abierta(self):
+        Caja.objects.update(abierta=False)
+        Caja.invalidar_cache()
+        with self.assertRaises(ErrorVenta):
+            self.vender()
+        self.assertEqual(self.stock(self.p1), Decimal("10"))
+
+
+# --------------------------
+# NUMERACIÓN POR SERIE
+# --------------------------
+class NumeracionTests(DatosMixin, TestCase):
+    def test_cada_comprobante_lleva_su_serie(self):
+        numeros = [(v.tipo_comprobante, v.numero_venta) for v in (
+            self.vender("Boleta"), self.vender("Factura"), self.vender("Boleta"), self.vender("Nota"),
+        )]
+        self.assertEqual(numeros, [("Boleta", 1), ("Factura", 1), ("Boleta", 2), ("Nota", 1)])
+
+    def test_rollback_devuelve_el_numero(self):
+        self.vender("Boleta")
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                Venta.objects.create(cliente=Venta.objects.get().cliente, tipo_comprobante="Boleta")
+                raise RuntimeError
+        self.assertEqual(Secuencia.objects.get(nombre=Venta.serie("Boleta")).valor, 1)
+        self.assertEqual(self.vender("Boleta").numero_venta, 2)
+
+    def test_contador_sin_update_returning(self):
+        self.assertEqual(Secuencia.reservar("prueba", 3), range(1, 4))
+        with mock.patch.object(connection, "vendor", "mysql"):
+            self.assertEqual(Secuencia.reservar("prueba", 2), range(4, 6))
+            self.assertEqual(Secuencia.siguiente("otra"), 1)
+        self.assertEqual(Secuencia.siguiente("prueba"), 6)
+
+    def test_venta_fallida_no_consume_numero(self):
+        self.vender("Factura")
+        with self.assertRaises(StockInsuficiente):
+            self.vender("Factura", lineas=[(self.p1.pk, Decimal("50"), Decimal("25"))])
+        self.assertEqual(self.vender("Factura").numero_venta, 2)
+
+
+# --------------------------
+# LIBRO DE CAJA, KARDEX Y RESÚMENES
+# --------------------------
+class ConsistenciaTests(DatosMixin, TestCase):
+    def assertConsistente(self):
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total, self.caja.total_segun_movimientos())
+        self.assertEqual(kardex.conciliar(), {})
+        esperado = self._resumenes()
+        resumenes.reconstruir()
+        self.assertEqual(esperado, self._resumenes())
+
+    def _resumenes(self):
+        ventas = ResumenVentaDiaria.objects.exclude(num_ventas=0, total=0)
+        productos = ResumenProductoDiario.objects.exclude(cantidad=0, importe=0)
+        return (
+            sorted(ventas.values_list("fecha", "tipo_comprobante", "num_ventas", "total")),
+            sorted(productos.values_list("fecha", "producto_id", "cantidad", "importe")),
+        )
+
+    def test_tras_editar_y_borrar_lineas(self):
+        venta = self.vender(lineas=[(self.p1.pk, Decimal("2"), Decimal("25")), (self.p2.pk, Decimal("1"), Decimal("30"))])
+        self.vender("Factura")
+        self.assertConsistente()
+
+        linea = venta.items.get(producto=self.p1)
+        linea.cantidad = Decimal("3")
+        linea.precio = Decimal("20")
+        linea.save()
+        venta.refresh_from_db()
+        self.assertEqual(venta.total, Decimal("90.00"))
+        self.assertConsistente()
+
+        venta.items.get(producto=self.p2).delete()
+        venta.refresh_from_db()
+        self.assertEqual(venta.total, Decimal("60.00"))
+        self.assertConsistente()
+
+        venta.delete()
+        self.assertConsistente()
+
+    def test_tras_editar_el_stock_a_mano(self):
+        self.vender()
+        producto = Producto.objects.get(pk=self.p1.pk)
+        producto.stock = Decimal("40")
+        producto.save()
+        self.assertConsistente()
+        self.assertEqual(
+            list(MovimientoStock.objects.filter(producto=self.p1).order_by("id").values_list("tipo", "cantidad")),
+            [("inicial", Decimal("10")), ("venta", Decimal("-2")), ("ajuste", Decimal("32"))],
+        )
+
+
+class CajaTests(DatosMixin, TestCase):
+    def test_cierre_de_periodo_no_recibe_ventas(self):
+        self.vender()
+        self.client.force_login(self.usuario)
+        self.client.get(f"/caja/cerrar-periodo/dia/{timezone.localdate().isoformat()}/")
+        resumen = Caja.objects.exclude(pk=self.caja.pk).get()
+        self.assertFalse(resumen.abierta)
+        self.assertEqual(resumen.monto_cierre, Decimal("50.00"))
+
+        self.caja.abierta = False
+        self.caja.save()
+        nueva = Caja.objects.create(usuario=self.usuario, monto_inicial=Decimal("0"))
+        self.assertEqual(self.vender().caja_id, nueva.pk)
+
+
+# --------------------------
+# IMPORTACIÓN DE EXCEL
+# --------------------------
+def _libro(filas):
+    workbook = openpyxl.Workbook()
+    hoja = workbook.active
+    hoja.title = "PISOS"
+    hoja.append(importacion.ENCABEZADOS)
+    for fila in filas:
+        hoja.append(fila)
+    archivo = io.BytesIO()
+    workbook.save(archivo)
+    archivo.seek(0)
+    return archivo
+
+
+# --------------------------
+# BÚSQUEDA POR TRIGRAMAS
+# --------------------------
+class BusquedaTests(DatosMixin, TestCase):
+    def test_tolera_errores_tildes_y_mayusculas(self):
+        self.assertEqual(busqueda.buscar("porcelanto")[:1], [self.p1.pk])
+        self.assertEqual(busqueda.buscar("CERAMICO 45")[:1], [self.p2.pk])
+        self.assertEqual(busqueda.buscar("zzz"), [])
+        self.assertEqual(busqueda.buscar("  "), [])
+
+    def test_el_indice_sigue_a_las_ediciones(self):
+        self.p1.nombre = "Listelo decorado"
+        self.p1.save()
+        self.assertEqual(busqueda.buscar("listelo"), [self.p1.pk])
+        self.assertNotIn(self.p1.pk, busqueda.buscar("porcelanato"))
+
+    def test_importacion_indexa_los_productos_nuevos(self):
+        importacion.importar_libro(
+            _libro([["Zócalo Mármol", "Celima", "PISOS", "caja", 5, 100, 0, ""]]), modo=importacion.MODO_ACTUALIZAR
+        )
+        self.assertEqual(busqueda.buscar("zocalo marmol"), [Producto.objects.get(nombre="Zócalo Mármol").pk])
+
+    def test_autocompletar_pone_primero_los_que_empiezan_igual(self):
+        Producto.objects.create(nombre="Cerámico porcelanato", categoria=self.p1.categoria)
+        self.client.force_login(self.usuario)
+        response = self.client.get("/api/productos/buscar/", {"q": "porcelanato"})
+        self.assertEqual(response.status_code, 200)
+        nombres = [fila["nombre"] for fila in response.json()["results"]]
+        self.assertEqual(nombres[0], "Porcelanato 60x60")
+        self.assertIn("Cerámico porcelanato", nombres)
+        response = self.client.get("/api/productos/buscar/", {"q": "porcelanato"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(response.status_code, 304)
+
+
+class ImportacionTests(DatosMixin, TestCase):
+    def test_actualizar_solo_escribe_cambios(self):
+        resumen = importacion.importar_libro(_libro([
+            ["Porcelanato 60x60", "", "PISOS", "caja", 30, 12, 0, ""],
+            ["Cerámico 45x45", "", "PISOS", "caja", 25, 10, 0, ""],
+            ["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, "Celima"],
+            ["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, "Celima"],
+        ]), modo=importacion.MODO_ACTUALIZAR)
+
+        self.assertEqual(
+            {c: resumen[c] for c in ("insertados", "actualizados", "sin_cambios", "duplicados", "ausentes")},
+            {"insertados": 1, "actualizados": 1, "sin_cambios": 1, "duplicados": 1, "ausentes": 0},
+        )
+        self.assertEqual(self.stock(self.p1), Decimal("12"))
+        self.assertTrue(Producto.objects.filter(nombre="Zócalo", codigo_barras__isnull=False).exists())
+        self.assertEqual(kardex.conciliar(), {})
+
+    def test_reemplazar_borra_el_catalogo(self):
+        resumen = importacion.importar_libro(
+            _libro([["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, ""]]), modo=importacion.MODO_REEMPLAZAR
+        )
+        self.assertEqual(resumen["insertados"], 1)
+        self.assertEqual(list(Producto.objects.values_list("nombre", flat=True)), ["Zócalo"])
+
+    def test_reemplazar_con_fila_invalida_no_borra_nada(self):
+        with self.assertRaises(importacion.ErrorImportacion):
+            importacion.importar_libro(_libro([
+                ["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, ""],
+                ["Listelo", "Celima", "PISOS", "caja", "cinco", 100, 0, ""],
+            ]), modo=importacion.MODO_REEMPLAZAR)
+        self.assertEqual(Producto.objects.count(), 2)
+
+    def test_reemplazar_que_falla_en_la_bd_no_toca_catalogo_ni_historial(self):
+        self.vender()
+        filas = [[f"Zócalo {i}", "Celima", "PISOS", "caja", 5, 100, 0, ""] for i in range(2 * importacion.TAMANO_LOTE + 500)]
+        insertar = importacion._insertar
+        lotes = []
+
+        def falla_en_el_segundo_lote(*args):
+            lotes.append(1)
+            if len(lotes) == 2:
+                raise DatabaseError("value too long for type character varying(200)")
+            return insertar(*args)
+
+        with mock.patch.object(importacion, "_insertar", falla_en_el_segundo_lote):
+            with self.assertRaises(DatabaseError):
+                importacion.importar_libro(_libro(filas), modo=importacion.MODO_REEMPLAZAR)
+        self.assertEqual(set(Producto.objects.values_list("pk", flat=True)), {self.p1.pk, self.p2.pk})
+        self.assertEqual(DetalleVenta.objects.count(), 1)
+        self.assertEqual(self.stock(self.p1), Decimal("8"))
+
+    def test_modo_invalido(self):
+        with self.assertRaises(ValueError):
+            importacion.importar_libro(_libro([]), modo="reemplazo")
+        self.assertEqual(Producto.objects.count(), 2)
+
+    def test_vista_rechaza_modo_invalido(self):
+        self.client.force_login(self.usuario)
+        archivo = _libro([["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, ""]])
+        archivo.name = "productos.xlsx"
+        response = self.client.post("/importar/", {"archivo": archivo, "modo": "reemplazo"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Producto.objects.count(), 2)
+
+
+# --------------------------
+# CATÁLOGO OFFLINE DEL POS
+# --------------------------
+class CatalogoTests(DatosMixin, TestCase):
+    def test_cada_escritura_sube_la_marca_de_agua(self):
+        desde = catalogo.version_actual()
+        self.vender()
+        cambios = catalogo.cambios(desde)
+        self.assertEqual(cambios["version"], catalogo.version_actual())
+        self.assertGreater(cambios["version"], desde)
+        self.assertEqual([fila[0] for fila in cambios["productos"]], [self.p1.pk])
+        self.assertEqual(catalogo.cambios(cambios["version"])["productos"], [])
+
+    def test_version_sin_confirmar_no_se_entrega(self):
+        desde = catalogo.version_actual()
+        with transaction.atomic():
+            self.p1.precio_venta = Decimal("30")
+            self.p1.save()
+            # El número sale del contador; el rollback lo devuelve
+            self.assertEqual(self.p1.version_catalogo, desde + 1)
+            transaction.set_rollback(True)
+        self.assertEqual(catalogo.version_actual(), desde)
+        self.assertEqual(catalogo.cambios(desde)["productos"], [])
+
+    def test_importacion_y_borrado(self):
+        desde = catalogo.version_actual()
+        importacion.importar_libro(_libro([
+            ["Porcelanato 60x60", "", "PISOS", "caja", 30, 12, 0, ""],
+            ["Zócalo", "Celima", "PISOS", "caja", 5, 100, 0, ""],
+        ]), modo=importacion.MODO_ACTUALIZAR)
+        borrado = self.p2.pk
+        self.p2.delete()
+        cambios = catalogo.cambios(desde)
+        self.assertEqual({fila[1] for fila in cambios["productos"]}, {"Porcelanato 60x60", "Zócalo"})
+        self.assertEqual(cambios["eliminados"], [borrado])
+
+    def test_pagina_no_corta_una_version(self):
+        desde = catalogo.version_actual()
+        categoria = self.p1.categoria
+        Producto.versionar(
+            p.pk for p in Producto.objects.bulk_create([Producto(nombre=f"Z{i}", categoria=categoria) for i in range(5)])
+        )
+        self.p1.save()
+        pagina = catalogo.cambios(desde, limite=3)
+        self.assertEqual(len(pagina["productos"]), 5)
+        self.assertTrue(pagina["hay_mas"])
+        resto = catalogo.cambios(pagina["version"], limite=3)
+        self.assertEqual([fila[0] for fila in resto["productos"]], [self.p1.pk])
+        self.assertFalse(resto["hay_mas"])
+
+
+class CatalogoVistasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def test_instantanea_con_etag(self):
+        response = self.client.get("/api/catalogo/")
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual(datos["version"], catalogo.version_actual())
+        self.assertEqual({fila[0] for fila in datos["productos"]}, {self.p1.pk, self.p2.pk})
+
+        self.assertEqual(self.client.get("/api/catalogo/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        self.vender()
+        nueva = self.client.get("/api/catalogo/", HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(nueva.status_code, 200)
+        self.assertNotEqual(nueva["ETag"], response["ETag"])
+
+    def test_cambios_desde_una_version(self):
+        version = self.client.get("/api/catalogo/").json()["version"]
+        self.vender()
+        borrado = self.p2.pk
+        self.p2.delete()
+
+        datos = self.client.get("/api/catalogo/cambios/", {"desde": version}).json()
+        stock = catalogo.CAMPOS.index("stock")
+        self.assertEqual([(fila[0], Decimal(fila[stock])) for fila in datos["productos"]], [(self.p1.pk, Decimal("8"))])
+        self.assertEqual(datos["eliminados"], [borrado])
+        self.assertFalse(datos["hay_mas"])
+        self.assertEqual(self.client.get("/api/catalogo/cambios/", {"desde": datos["version"]}).json()["productos"], [])
+
+    def test_version_de_otra_base_pide_todo(self):
+        datos = self.client.get("/api/catalogo/cambios/", {"desde": catalogo.version_actual() + 100}).json()
+        self.assertTrue(datos["completo"])
+        self.assertEqual(self.client.get("/api/catalogo/cambios/", {"desde": "x"}).status_code, 400)
+        self.assertEqual(self.client.get("/api/catalogo/cambios/", {"desde": -1}).status_code, 400)
+
+    def test_lote_por_ids_con_etag(self):
+        url = "/api/productos/lote/"
+        response = self.client.get(url, {"ids": f"{self.p1.pk},{self.p2.pk},999999"})
+        self.assertEqual(response.status_code, 200)
+        datos = response.json()
+        self.assertEqual([fila["id"] for fila in datos["productos"]], sorted([self.p1.pk, self.p2.pk]))
+        self.assertEqual(datos["faltantes"], [999999])
+
+        repetida = self.client.get(url, {"ids": f"{self.p1.pk},{self.p2.pk},999999"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(repetida.status_code, 304)
+        self.vender()
+        tras_venta = self.client.get(url, {"ids": f"{self.p1.pk},{self.p2.pk},999999"}, HTTP_IF_NONE_MATCH=response["ETag"])
+        self.assertEqual(tras_venta.status_code, 200)
+
+    def test_lote_desde_una_marca(self):
+        marca = self.client.get("/api/productos/lote/", {"ids": f"{self.p1.pk},{self.p2.pk}"}).json()["version"]
+        self.vender()
+        datos = self.client.get("/api/productos/lote/", {"desde": marca}).json()
+        self.assertEqual([fila["id"] for fila in datos["productos"]], [self.p1.pk])
+        self.assertEqual(self.client.get("/api/productos/lote/", {"desde": datos["version"]}).json()["productos"], [])
+
+    def test_lote_rechaza_pedidos_invalidos(self):
+        url = "/api/productos/lote/"
+        self.assertEqual(self.client.get(url).status_code, 400)
+        self.assertEqual(self.client.get(url, {"ids": "1,a"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"desde": "ayer"}).status_code, 400)
+        ids = ",".join(str(i) for i in range(1, views.LOTE_MAXIMO + 2))
+        self.assertEqual(self.client.get(url, {"ids": ids}).status_code, 400)
+
+
+# --------------------------
+# MÉTRICAS (/metrics)
+# --------------------------
+class MetricasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        instrumentacion.reiniciar()
+        self.addCleanup(instrumentacion.reiniciar)
+
+    def test_solo_staff_o_token(self):
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get("/metrics").status_code, 403)
+        self.client.logout()
+
+        with mock.patch.object(instrumentacion, "TOKEN", "secreto"):
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer otro").status_code, 403)
+            self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secreto").status_code, 200)
+        # Sin token configurado, una cabecera cualquiera no abre la puerta
+        self.assertEqual(self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer ").status_code, 403)
+
+        self.usuario.is_staff = True
+        self.usuario.save()
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get("/metrics").status_code, 200)
+
+    def test_histogramas_por_vista(self):
+        self.client.force_login(self.usuario)
+        self.client.get("/api/catalogo/")
+        self.client.get("/api/catalogo/")
+        self.client.get("/api/productos/lote/")
+        with mock.patch.object(instrumentacion, "TOKEN", "secreto"):
+            texto = self.client.get("/metrics", HTTP_AUTHORIZATION="Bearer secreto").content.decode()
+
+        self.assertIn("# TYPE inventario_vista_duracion_segundos histogram", texto)
+        self.assertIn('inventario_vista_duracion_segundos_bucket{vista="catalogo_instantanea",le="+Inf"} 2', texto)
+        self.assertIn('inventario_vista_consultas_count{vista="catalogo_instantanea"} 2', texto)
+        self.assertIn('inventario_vista_peticiones_total{vista="catalogo_instantanea",estado="2xx"} 2', texto)
+        self.assertIn('inventario_vista_peticiones_total{vista="productos_lote",estado="4xx"} 1', texto)
+        # Las cubetas son acumuladas y la última coincide con el total
+        patron = r'inventario_vista_consultas_bucket\{vista="catalogo_instantanea",le="[^"]+"\} (\d+)'
+        cubetas = [int(valor) for valor in re.findall(patron, texto)]
+        self.assertEqual(cubetas, sorted(cubetas))
+        self.assertEqual(cubetas[-1], 2)
+
+    def test_limite_de_cubeta_inclusivo(self):
+        histograma = instrumentacion.Histograma((1, 5))
+        for valor in (1, 3, 5, 9):
+            histograma.observar(valor)
+        self.assertEqual(histograma.cubetas, [1, 2, 1])
+        self.assertEqual((histograma.total, histograma.suma), (4, 18))
+
+
+# --------------------------
+# HISTORIAL DE VENTAS (paginación por clave)
+# --------------------------
+class ListarVentasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(self.usuario)
+
+    def _en(self, venta, fecha):
+        Venta.objects.filter(pk=venta.pk).update(fecha=fecha)
+        return venta.pk
+
+    def _pagina(self, **parametros):
+        response = self.client.get("/ventas/", parametros)
+        self.assertEqual(response.status_code, 200)
+        return [venta.pk for venta in response.context["ventas"]], response.context["siguiente"]
+
+    def test_cursor_no_salta_ni_repite_ventas_con_la_misma_fecha(self):
+        momento = timezone.now().replace(microsecond=0)
+        ids = [self._en(self.vender(), momento) for _ in range(3)]
+        anterior = self._en(self.vender(), momento - timedelta(seconds=1))
+
+        vistas = []
+        parametros = {}
+        with mock.patch.object(ventas_views, "VENTAS_POR_PAGINA", 2):
+            while True:
+                pagina, siguiente = self._pagina(**parametros)
+                vistas += pagina
+                if not siguiente:
+                    break
+                parametros = QueryDict(siguiente).dict()
+        self.assertEqual(vistas, sorted(ids, reverse=True) + [anterior])
+
+    def test_cursor_mal_formado_muestra_la_primera_pagina(self):
+        venta = self.vender()
+        self.assertEqual(self._pagina(despues="basura")[0], [venta.pk])
+        self.assertEqual(self._pagina(despues="2025-01-01T00:00:00+00:00_x")[0], [venta.pk])
+
+    def test_rango_de_fechas_semiabierto(self):
+        dia = date(2025, 3, 10)
+        inicio = timezone.make_aware(datetime.combine(dia, time.min))
+        primera = self._en(self.vender(), inicio)
+        ultima = self._en(self.vender(), inicio + timedelta(days=1, microseconds=-1))
+        self._en(self.vender(), inicio + timedelta(days=1))
+        self._en(self.vender(), inicio - timedelta(microseconds=1))
+
+        pagina, _ = self._pagina(fecha_inicio=dia.isoformat(), fecha_fin=dia.isoformat())
+        self.assertEqual(pagina, [ultima, primera])
+
+
+# --------------------------
+# TICKETS EN CACHÉ
+# --------------------------
+class TicketsTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.enterContext(mock.patch.object(tickets, "DIRECTORIO", Path(directorio)))
+        self.client.force_login(self.usuario)
+
+    def test_se_dibuja_al_confirmar_y_la_reimpresion_no_consulta_la_bd(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venta = self.vender()
+        for formato in tickets.FORMATOS:
+            with self.assertNumQueries(0):
+                ruta, _ = tickets.obtener(venta.pk, formato)
+            self.assertTrue(ruta.exists())
+
+    def test_editar_la_venta_cambia_el_ticket(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            venta = self.vender()
+        ruta, huella = tickets.obtener(venta.pk)
+        linea = venta.items.get()
+        linea.precio = Decimal("20")
+        linea.save()
+        nueva_ruta, nueva_huella = tickets.obtener(venta.pk)
+        self.assertNotEqual(nueva_huella, huella)
+        self.assertNotEqual(nueva_ruta, ruta)
+        self.assertIn(b"40,00", nueva_ruta.read_bytes())
+
+    def test_vista_responde_304_con_el_mismo_etag(self):
+        venta = self.vender()
+        response = self.client.get(f"/ventas/nota/{venta.pk}/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get(f"/ventas/nota/{venta.pk}/", HTTP_IF_NONE_MATCH=response["ETag"]).status_code, 304)
+        pdf = self.client.get(f"/ventas/nota/{venta.pk}/", {"formato": "pdf"})
+        self.assertEqual(pdf["Content-Type"], "application/pdf")
+        self.assertNotEqual(pdf["ETag"], response["ETag"])
+        self.assertEqual(self.client.get("/ventas/nota/999999/").status_code, 404)
+
+
+# --------------------------
+# ETIQUETAS CON CÓDIGO DE BARRAS
+# --------------------------
+class EtiquetasTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.enterContext(mock.patch.object(etiquetas, "DIRECTORIO", Path(directorio)))
+        self.client.force_login(self.usuario)
+
+    def test_por_stock_cuenta_cajas_enteras(self):
+        Producto.objects.filter(pk=self.p1.pk).update(stock=Decimal("2.7"))
+        Producto.objects.filter(pk=self.p2.pk).update(stock=Decimal("-3"))
+        consulta = etiquetas.seleccionar(categoria_id=self.p1.categoria_id)
+        self.assertEqual(etiquetas.contar(consulta), 2)
+        self.assertEqual(etiquetas.contar(consulta, por_stock=True), 2)
+        self.assertEqual(len(etiquetas.etiquetas(consulta, por_stock=True)), 2)
+
+    def test_codigo_interno_con_digito_verificador(self):
+        self.assertEqual(etiquetas.codigo_interno(1), "2000000000015")
+        self.assertEqual(etiquetas.codigo_interno(123, "21"), "2100000001231")
+        self.p1.refresh_from_db()
+        self.assertEqual(self.p1.codigo_barras, etiquetas.codigo_interno(self.p1.pk))
+        self.assertEqual(etiquetas._simbologia("7750182000017"), "ean13")
+        self.assertEqual(etiquetas._simbologia("7750182000018"), "code128")
+        self.assertEqual(etiquetas._simbologia("ABC-123"), "code128")
+
+    def test_codigo_ocupado_pasa_al_siguiente_prefijo(self):
+        siguiente = Producto.objects.order_by("-pk").values_list("pk", flat=True).first() + 1
+        Producto.objects.create(
+            nombre="Manual", categoria=self.p1.categoria, codigo_barras=etiquetas.codigo_interno(siguiente + 1),
+        )
+        nuevo = Producto.objects.create(nombre="Nuevo", categoria=self.p1.categoria)
+        nuevo.refresh_from_db()
+        self.assertEqual(nuevo.codigo_barras, etiquetas.codigo_interno(nuevo.pk, "21"))
+
+    def test_pdf_de_varias_paginas(self):
+        lista = etiquetas.etiquetas(etiquetas.seleccionar(categoria_id=self.p1.categoria_id)) * 13
+        with mock.patch.object(etiquetas, "PROCESOS", 1):
+            contenido = etiquetas.hoja(lista).read_bytes()
+        self.assertTrue(contenido.startswith(b"%PDF-1.4"))
+        self.assertIn(b"/Count 2", contenido)
+        # Cada entrada del xref apunta al inicio de su objeto
+        inicio_xref = int(contenido.rsplit(b"startxref\n", 1)[1].split(b"\n")[0])
+        posiciones = re.findall(rb"(\d{10}) 00000 n", contenido[inicio_xref:])
+        for numero, posicion in enumerate(posiciones, start=1):
+            self.assertTrue(contenido[int(posicion):].startswith(b"%d 0 obj" % numero))
+        # La imagen es solo la tira G4 de la página, sin restos del TIFF
+        imagen = re.search(rb"/CCITTFaxDecode.*?/Length (\d+) >>\nstream\n", contenido, re.S)
+        datos = contenido[imagen.end():imagen.end() + int(imagen.group(1))]
+        self.assertEqual(datos, etiquetas._pagina(lista[:etiquetas.POR_PAGINA]))
+        self.assertTrue(contenido[imagen.end() + len(datos):].startswith(b"\nendstream"))
+
+    def test_tope_se_revisa_antes_de_armar_la_lista(self):
+        url = f"/productos/etiquetas/?categoria={self.p1.categoria_id}&por_stock=1"
+        with mock.patch.object(etiquetas, "MAXIMO", 19), mock.patch.object(etiquetas, "etiquetas") as armar:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 400)
+        armar.assert_not_called()
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "application/pdf")
+
+
+# --------------------------
+# REPORTE DE VENTAS
+# --------------------------
+class ReportesTests(DatosMixin, TestCase):
+    def test_rango_sin_ventas(self):
+        hojas = reportes.calcular(date(2020, 1, 1), date(2020, 1, 31))
+        self.assertEqual(len(hojas["Por día"]), 31)
+        self.assertEqual(hojas["Por día"]["importe"].sum(), 0)
+        self.assertEqual(hojas["Resumen"].loc["Ventas", "valor"], 0)
+        self.assertEqual(hojas["Resumen"].loc["Ticket promedio (S/)", "valor"], 0)
+        for nombre in ("Por categoría", "Por marca", "Por proveedor", "Por comprobante", "ABC productos"):
+            self.assertTrue(hojas[nombre].empty, nombre)
+
+        self.client.force_login(self.usuario)
+        response = self.client.get("/reportes/ventas/", {"desde": "2020-01-01", "hasta": "2020-01-31"})
+        self.assertEqual(response.status_code, 200)
+        libro = openpyxl.load_workbook(io.BytesIO(b"".join(response.streaming_content)))
+        self.assertEqual(libro.sheetnames, list(hojas))
+
+    def test_ventas_del_rango(self):
+        self.vender(lineas=[(self.p1.pk, Decimal("2"), Decimal("25")), (self.p2.pk, Decimal("1"), Decimal("10"))])
+        hoy = timezone.localdate()
+        hojas = reportes.calcular(hoy, hoy)
+        self.assertEqual(hojas["Resumen"].loc["Importe total (S/)", "valor"], 60)
+        self.assertEqual(list(hojas["ABC productos"]["clase"]), ["A", "B"])
+        self.assertEqual(hojas["Por día"].loc[hoy, "ventas"], 1)
+
+    def test_rango_invalido(self):
+        self.client.force_login(self.usuario)
+        self.assertEqual(self.client.get("/reportes/ventas/", {"desde": "2020-02-01", "hasta": "2020-01-01"}).status_code, 400)
+        self.assertEqual(self.client.get("/reportes/ventas/", {"desde": "ayer"}).status_code, 400)
+
+
+# --------------------------
+# DESCARGAS BAJO ASGI
+# --------------------------
+class DescargasAsgiTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio)
+        self.enterContext(override_settings(MEDIA_ROOT=directorio))
+        self.venta = self.vender()
+
+    async def test_archivos_se_envian_con_iterador_async(self):
+        await self.async_client.aforce_login(self.usuario)
+        for url in (
+            "/exportar/?formato=xlsx",
+            f"/ventas/nota/{self.venta.pk}/?formato=pdf",
+            f"/productos/etiquetas/?categoria={self.p1.categoria_id}",
+            "/reportes/ventas/",
+        ):
+            with self.subTest(url=url):
+                response = await self.async_client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertTrue(response.is_async)
+                self.assertTrue(b"".join([bloque async for bloque in response.streaming_content]))
+
+
+# --------------------------
+# RESTAURAR UN RESPALDO
+# --------------------------
+class RespaldoTests(DatosMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio)
+
+    def test_venta_despues_de_restaurar(self):
+        self.vender("Boleta")
+        self.vender("Boleta")
+        self.vender("Factura")
+        # Un volcado anterior al libro de caja y a las series: sin esas tablas
+        ruta = f"{self.directorio}/datos.json"
+        call_command(
+            "dumpdata", "auth.user", "inventario", output=ruta, verbosity=0,
+            exclude=["inventario.movimientocaja", "inventario.secuencia"],
+        )
+        MovimientoCaja.objects.all().delete()
+        Secuencia.objects.all().delete()
+        Venta.objects.all().delete()
+
+        respaldo.cargar(ruta)
+        self.assertEqual(Venta.objects.count(), 3)
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total, self.caja.total_segun_movimientos())
+
+        with override_settings(MEDIA_ROOT=self.directorio):
+            venta = self.vender("Boleta")
+        self.assertEqual(venta.numero_venta, 3)
+        self.assertEqual(self.vender("Factura").numero_venta, 2)
+        self.caja.refresh_from_db()
+        self.assertEqual(self.caja.total, Decimal("250.00"))
+        self.assertEqual(self.caja.total, self.caja.total_segun_movimientos())
+        self.assertEqual(kardex.conciliar(), {})
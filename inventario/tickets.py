@@ -0,0 +1,234 @@
+import base64
+import hashlib
+import io
+import json
+import os
+import tempfile
+from pathlib import Path
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import Http404
+from django.template.loader import render_to_string
+from django.utils import timezone
+from escpos.printer import Dummy
+from PIL import Image, ImageDraw, ImageFont
+
+from .models import DetalleVenta, Venta
+
+# --------------------------
+# CONFIGURACIÓN
+# --------------------------
+EMPRESA = "MULTICERAMICOS DIVINO SEÑOR"
+RUC = "20610735712"
+VERSION = 1  # subir al cambiar el diseño: cambia la dirección de todos los tickets
+DIRECTORIO = Path(settings.MEDIA_ROOT) / "tickets"
+PERFIL_IMPRESORA = getattr(settings, "TICKET_PERFIL_IMPRESORA", "TM-T20II")
+COLUMNAS = 48  # caracteres por línea en papel de 80 mm (fuente A)
+ANCHO_PX = 576  # 72 mm imprimibles a 203 dpi
+DPI = 203
+FUENTE = getattr(settings, "TICKET_FUENTE", "DejaVuSansMono.ttf")  # monoespaciada, con Ñ y tildes
+
+FORMATOS = {
+    "html": ("html", "text/html; charset=utf-8"),
+    "pdf": ("pdf", "application/pdf"),
+    "escpos": ("bin", "application/octet-stream"),
+}
+
+
+def _clave_cache(venta_id):
+    return f"ticket:venta:{venta_id}"
+
+
+# --------------------------
+# DATOS DE LA VENTA
+# --------------------------
+def datos_venta(venta_id):
+    # Una sola consulta: cada línea trae su producto, la venta y el cliente por JOIN
+    lineas = list(
+        DetalleVenta.objects.filter(sale_id=venta_id)
+        .select_related("sale__cliente", "producto")
+        .only("cantidad", "precio", "producto__nombre", "sale__numero_venta", "sale__tipo_comprobante",
+              "sale__fecha", "sale__total", "sale__cliente__nombre")
+        .order_by("id")
+    )
+    if lineas:
+        venta = lineas[0].sale
+    else:
+        venta = Venta.objects.select_related("cliente").filter(pk=venta_id).first()
+        if venta is None:
+            raise Http404("Venta no encontrada")
+    return {
+        "version": VERSION,
+        "numero": venta.numero_venta,
+        "comprobante": venta.tipo_comprobante,
+        "cliente": venta.cliente.nombre,
+        "fecha": timezone.localtime(venta.fecha),
+        "total": venta.total,
+        "lineas": [
+            {
+                "nombre": linea.producto.nombre,
+                "cantidad": linea.cantidad,
+                "precio": linea.precio,
+                "subtotal": linea.cantidad * linea.precio,
+            }
+            for linea in lineas
+        ],
+    }
+
+
+def _huella(datos):
+    contenido = json.dumps(datos, cls=DjangoJSONEncoder, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _contenido_qr(datos):
+    return "|".join([RUC, datos["comprobante"], str(datos["numero"] or ""), f"{datos['total']:.2f}",
+                     datos["fecha"].strftime("%Y-%m-%d %H:%M")])
+
+
+def _imagen_qr(datos, tamano_caja=4):
+    qr = qrcode.QRCode(box_size=tamano_caja, border=1)
+    qr.add_data(_contenido_qr(datos))
+    return qr.make_image(fill_color="black", back_color="white").get_image().convert("L")
+
+
+# --------------------------
+# RENDERIZADORES
+# --------------------------
+def _html(datos):
+    buffer = io.BytesIO()
+    _imagen_qr(datos).save(buffer, "PNG")
+    return render_to_string("ventas/nota_venta.html", {
+        "empresa": EMPRESA,
+        "ruc": RUC,
+        "sale": datos,
+        "items": datos["lineas"],
+        "total": datos["total"],
+        "qr": base64.b64encode(buffer.getvalue()).decode("ascii"),
+    }).encode("utf-8")
+
+
+def _renglones(datos):
+    # Texto de ancho fijo compartido por el PDF y la impresora térmica
+    encabezado = [
+        f"N° Venta: {datos['numero'] or '-'}",
+        f"Cliente: {datos['cliente']}"[:COLUMNAS],
+        f"Comprobante: {datos['comprobante']}",
+        f"Fecha: {datos['fecha']:%d/%m/%Y %H:%M}",
+        "-" * COLUMNAS,
+        f"{'Producto':<22}{'Cant':>8}{'P.U.':>9}{'Subt':>9}",
+    ]
+    detalle = []
+    for linea in datos["lineas"]:
+        detalle.append(linea["nombre"][:COLUMNAS])
+        detalle.append(f"{'':<22}{linea['cantidad']:>8.2f}{linea['precio']:>9.2f}{linea['subtotal']:>9.2f}")
+    pie = ["-" * COLUMNAS, f"{'TOTAL S/.':<30}{datos['total']:>18.2f}"]
+    return encabezado, detalle, pie
+
+
+def fuente(tamano):
+    # Pillow busca el nombre en las carpetas de fuentes del sistema; si no está, la integrada
+    try:
+        return ImageFont.truetype(FUENTE, tamano)
+    except OSError:
+        return ImageFont.load_default(size=tamano)
+
+
+def _pdf(datos):
+    encabezado, detalle, pie = _renglones(datos)
+    letra = fuente(19)
+    titulo = fuente(24)
+    alto_linea = 26
+    qr = _imagen_qr(datos, tamano_caja=6)
+
+    alto = 40 + 2 * 34 + alto_linea * (len(encabezado) + len(detalle) + len(pie)) + qr.height + 80
+    imagen = Image.new("L", (ANCHO_PX, alto), 255)
+    dibujo = ImageDraw.Draw(imagen)
+    y = 20
+    for texto, tipo in ((EMPRESA, titulo), (f"RUC: {RUC}", letra)):
+        dibujo.text((ANCHO_PX // 2, y), texto, font=tipo, fill=0, anchor="ma")
+        y += 34
+    for renglon in encabezado + detalle + pie:
+        dibujo.text((12, y), renglon, font=letra, fill=0)
+        y += alto_linea
+    imagen.paste(qr, ((ANCHO_PX - qr.width) // 2, y + 12))
+    dibujo.text((ANCHO_PX // 2, y + qr.height + 30), "¡Gracias por su compra!", font=letra, fill=0, anchor="ma")
+
+    salida = io.BytesIO()
+    imagen.convert("1").save(salida, "PDF", resolution=DPI)  # 1 bit, como la ticketera
+    return salida.getvalue()
+
+
+def _escpos(datos):
+    # Bytes crudos para la ticketera: se envían tal cual al puerto/USB de la impresora
+    encabezado, detalle, pie = _renglones(datos)
+    impresora = Dummy(profile=PERFIL_IMPRESORA)
+    impresora.set(align="center", bold=True)
+    impresora.text(f"{EMPRESA}\n")
+    impresora.set(align="center", bold=False)
+    impresora.text(f"RUC: {RUC}\n{datos['comprobante']}\n\n")
+    impresora.set(align="left")
+    impresora.text("\n".join(encabezado + detalle) + "\n")
+    impresora.set(align="left", bold=True)
+    impresora.text("\n".join(pie) + "\n\n")
+    impresora.set(align="center", bold=False)
+    impresora.qr(_contenido_qr(datos), size=6, center=True)
+    impresora.text("\n¡Gracias por su compra!\n")
+    impresora.cut()
+    return impresora.output
+
+
+RENDERIZADORES = {"html": _html, "pdf": _pdf, "escpos": _escpos}
+
+
+# --------------------------
+# CACHÉ EN DISCO DIRECCIONADA POR CONTENIDO
+# --------------------------
+def _ruta(huella, formato):
+    extension = FORMATOS[formato][0]
+    return DIRECTORIO / huella[:2] / f"{huella}.{extension}"
+
+
+def escribir_atomico(ruta, contenido):
+    # Escritura atómica: nunca se sirve un archivo a medio escribir
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    with os.fdopen(descriptor, "wb") as archivo:
+        archivo.write(contenido)
+    os.replace(temporal, ruta)
+
+
+def _renderizar(venta_id, formatos):
+    # Una consulta para todos los formatos; los que ya están en disco no se vuelven a dibujar
+    datos = datos_venta(venta_id)
+    huella = _huella(datos)
+    for formato in formatos:
+        ruta = _ruta(huella, formato)
+        if not ruta.exists():
+            escribir_atomico(ruta, RENDERIZADORES[formato](datos))
+    cache.set(_clave_cache(venta_id), huella, None)
+    return huella
+
+
+def prerenderizar(venta_id):
+    # Se llama al confirmar la venta (transaction.on_commit en ventas.py): cuando el
+    # cajero imprime, los tres formatos ya están en disco y la primera impresión es inmediata
+    _renderizar(venta_id, RENDERIZADORES)
+
+
+def obtener(venta_id, formato="html"):
+    # Devuelve (ruta, huella). Una reimpresión con la huella en caché no consulta la BD:
+    # solo comprueba que el archivo exista y lo sirve.
+    huella = cache.get(_clave_cache(venta_id))
+    if not huella or not _ruta(huella, formato).exists():
+        # Venta editada después de confirmarse o archivo borrado: se dibuja ahora
+        huella = _renderizar(venta_id, [formato])
+    return _ruta(huella, formato), huella
+
+
+def invalidar(venta_id):
+    # Si la venta cambia, su próxima impresión recalcula la huella (y por tanto el archivo)
+    cache.delete(_clave_cache(venta_id))
@@ -20,12 +20,16 @@ urlpatterns = [
     # -----------------------------
     path('productos/', views.lista_productos, name='lista_productos'),
     path('productos/agregar/', views.agregar_producto, name='agregar_producto'),
+    path('productos/categoria/<int:categoria_id>/', views.productos_categoria, name='productos_categoria'),
     path('productos/editar/<int:producto_id>/', views.editar_producto, name='editar_producto'),
     path('productos/eliminar/<int:producto_id>/', views.eliminar_producto, name='eliminar_producto'),
+    path('productos/etiquetas/', views.etiquetas_productos, name='etiquetas_productos'),
 
     # Importar/Exportar
     path('importar/', views.importar_excel, name='importar_excel'),
+    path('importar/estado/<int:trabajo_id>/', views.estado_importacion, name='estado_importacion'),
     path('exportar/', views.exportar_excel, name='exportar_excel'),
+    path('reportes/ventas/', views.reporte_ventas, name='reporte_ventas'),
 
     # Categorías
     path('categorias/eliminar/<int:categoria_id>/', views.eliminar_categoria, name='eliminar_categoria'),
@@ -50,7 +54,13 @@ urlpatterns = [
     # API
     # -----------------------------
     path('api/producto/<int:pk>/', views.producto_api, name='producto_api'),
+    path('api/productos/lote/', views.productos_lote, name='productos_lote'),
+    path('api/productos/buscar/', views.producto_autocompletar, name='producto_autocompletar'),
+    path('api/productos/escanear/', views.producto_escanear, name='producto_escanear'),
+    path('api/catalogo/', views.catalogo_instantanea, name='catalogo_instantanea'),
+    path('api/catalogo/cambios/', views.catalogo_cambios, name='catalogo_cambios'),
 
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('metrics', views.metricas_prometheus, name='metricas'),
 
 ]
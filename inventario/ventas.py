@@ -0,0 +1,107 @@
+import logging
+from collections import defaultdict
+from decimal import Decimal
+from functools import reduce
+from operator import or_
+
+from django.db import DatabaseError, transaction
+from django.db.models import Case, DecimalField, F, Q, Value, When
+from django.utils import timezone
+
+from . import kardex, resumenes, tickets
+from .escritura import serializada
+from .models import Producto, Cliente, Venta, DetalleVenta, Caja, CajaCerrada, MovimientoStock
+
+logger = logging.getLogger("inventario.ventas")
+
+MENSAJE_REINTENTAR = "No se pudo registrar la venta porque la base de datos está ocupada. Inténtalo de nuevo."
+
+
+class ErrorVenta(Exception):
+    pass
+
+
+class StockInsuficiente(ErrorVenta):
+    pass
+
+
+# --------------------------
+# CONFIRMAR VENTA
+# --------------------------
+def confirmar_venta(cliente_nombre, tipo_comprobante, lineas):
+    # lineas: lista de (producto_id, cantidad, precio) con Decimals ya validados.
+    # Todo se confirma en una transacción con un número constante de consultas,
+    # sin importar cuántas líneas tenga el carrito.
+    if not lineas:
+        raise ErrorVenta("Debes ingresar el cliente y al menos un producto.")
+
+    caja_id = Caja.abierta_actual_id()
+    if not caja_id:
+        raise ErrorVenta("No hay ninguna caja abierta. Abre una caja antes de registrar ventas.")
+
+    cantidades = defaultdict(Decimal)
+    for pid, cantidad, _ in lineas:
+        cantidades[pid] += cantidad
+
+    try:
+        with serializada(), transaction.atomic():
+            return _confirmar(cliente_nombre, tipo_comprobante, lineas, cantidades, caja_id)
+    except CajaCerrada:
+        Caja.invalidar_cache()
+        raise ErrorVenta("La caja se cerró mientras se registraba la venta. Abre una caja e inténtalo de nuevo.")
+    except DatabaseError:
+        # Interbloqueo, choque de numeración o la cola de escritura agotada: la transacción
+        # ya se deshizo entera, así que el cajero puede reintentar con el mismo carrito
+        logger.exception("Venta no registrada por un error de base de datos")
+        raise ErrorVenta(MENSAJE_REINTENTAR)
+
+
+def _confirmar(cliente_nombre, tipo_comprobante, lineas, cantidades, caja_id):
+    # Bloquea las filas de los productos del carrito hasta el commit, siempre en orden de
+    # id: dos carritos con productos en común no pueden quedar esperándose el uno al otro
+    productos = Producto.objects.select_for_update().order_by("pk").in_bulk(list(cantidades))
+    for pid, cantidad in cantidades.items():
+        producto = productos.get(pid)
+        if producto is None:
+            raise ErrorVenta(f"El producto {pid} no existe.")
+        if producto.stock < cantidad:
+            raise StockInsuficiente(
+                f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}"
+            )
+
+    # El total se calcula una sola vez en memoria; la venta nace con él y la caja se ajusta una vez
+    total = Venta.calcular_total((cantidad, precio) for _, cantidad, precio in lineas)
+    cliente_obj, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
+    venta = Venta.objects.create(
+        cliente=cliente_obj, tipo_comprobante=tipo_comprobante, total=total, caja_id=caja_id
+    )
+    DetalleVenta.objects.bulk_create([
+        DetalleVenta(sale=venta, producto_id=pid, cantidad=cantidad, precio=precio)
+        for pid, cantidad, precio in lineas
+    ])
+
+    kardex.registrar([
+        MovimientoStock(producto_id=pid, tipo="venta", cantidad=-cantidad, venta=venta, referencia=f"venta:{venta.pk}")
+        for pid, cantidad in cantidades.items()
+    ])
+    # El resumen de la venta lo suma Venta.save(); el bulk_create de líneas no pasa por save()
+    resumenes.sumar_lineas(venta.fecha, lineas)
+    # El ticket se dibuja una vez confirmada la venta; si falla, la venta sigue registrada
+    # y el ticket se genera al imprimirlo
+    transaction.on_commit(lambda: tickets.prerenderizar(venta.pk), robust=True)
+
+    # Último paso: un solo UPDATE condicional, cada fila solo se descuenta si aún alcanza
+    # el stock. Lleva la versión del catálogo para el POS; el contador se toma aquí, ya con
+    # las filas bloqueadas, y queda tomado solo hasta el commit que sigue.
+    descuento = Case(
+        *[When(pk=pid, then=Value(cantidad)) for pid, cantidad in cantidades.items()],
+        output_field=DecimalField(max_digits=10, decimal_places=2),
+    )
+    condicion = reduce(or_, [Q(pk=pid, stock__gte=cantidad) for pid, cantidad in cantidades.items()])
+    actualizados = Producto.objects.filter(condicion).update(
+        stock=F("stock") - descuento, actualizado=timezone.now(),
+        version_catalogo=Producto.reservar_versiones(1)[0],
+    )
+    if actualizados != len(cantidades):
+        raise StockInsuficiente("El stock cambió mientras se registraba la venta. Inténtalo de nuevo.")
+    return venta
@@ -4,12 +4,20 @@ from django.urls import reverse
 from django.contrib import messages
 from .forms import ProductoForm, VentaForm, DetalleVentaForm
 from .models import Producto, Categoria, Cliente, Venta, DetalleVenta, Caja
+from .ventas import confirmar_venta, ErrorVenta
+from . import resumenes, tickets
+from .escritura import serializada
+from .estaticos import servir_archivo
 from decimal import Decimal
-from django.db.models import Sum
+from django.db.models import Q, Sum
 from django.utils.timezone import now
-from datetime import datetime
+from datetime import datetime, date, timedelta
+import calendar
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
+from django.http import FileResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from asgiref.sync import sync_to_async
 
 # -----------------------------
 # Caja
@@ -19,12 +27,13 @@ def abrir_caja(request):
     if request.method == 'POST':
         monto_inicial = request.POST.get('monto_inicial')
         if monto_inicial:
-            Caja.objects.create(
-                usuario=request.user,
-                monto_inicial=Decimal(monto_inicial),
-                abierta=True,
-                fecha_apertura=timezone.now()
-            )
+            with serializada():  # una escritura más en la cola, igual que las ventas
+                Caja.objects.create(
+                    usuario=request.user,
+                    monto_inicial=Decimal(monto_inicial),
+                    abierta=True,
+                    fecha_apertura=timezone.now()
+                )
             return redirect('listar_ventas')
         else:
             messages.error(request, "Debes ingresar el monto inicial")
@@ -39,7 +48,8 @@ def cerrar_caja(request, caja_id):
         caja.monto_cierre = Decimal(monto_cierre)
         caja.fecha_cierre = timezone.now()
         caja.abierta = False
-        caja.save()
+        with serializada():
+            caja.save()
         return redirect('historial_caja')
     return render(request, 'inventario/cerrar_caja.html', {'caja': caja})
 
@@ -52,27 +62,35 @@ def historial_caja(request):
 
 @login_required
 def cerrar_caja_periodo(request, periodo, valor):
-    if periodo == "dia":
-        ventas = Venta.objects.filter(fecha__date=valor)
-    elif periodo == "mes":
-        year, month = valor.split("-")
-        ventas = Venta.objects.filter(fecha__year=year, fecha__month=month)
-    elif periodo == "anio":
-        ventas = Venta.objects.filter(fecha__year=valor)
-    else:
-        ventas = Venta.objects.none()
-
-    total = ventas.aggregate(Sum("total"))["total"] or 0
-
-    # Crear caja de resumen
-    Caja.objects.create(
-        usuario=request.user,
-        fecha_apertura=now(),
-        fecha_cierre=now(),
-        monto_inicial=0,
-        monto_cierre=total,
-        abierta=True
-    )
+    # Los totales salen de los resúmenes diarios, no de recorrer todas las ventas
+    try:
+        if periodo == "dia":
+            desde = hasta = date.fromisoformat(valor)
+        elif periodo == "mes":
+            year, month = (int(x) for x in valor.split("-"))
+            desde = date(year, month, 1)
+            hasta = date(year, month, calendar.monthrange(year, month)[1])
+        elif periodo == "anio":
+            desde, hasta = date(int(valor), 1, 1), date(int(valor), 12, 31)
+        else:
+            desde = hasta = None
+    except ValueError:
+        messages.error(request, f"Periodo inválido: {periodo} {valor}")
+        return redirect("historial_caja")
+
+    total = resumenes.totales_periodo(desde, hasta)["total"] if desde else 0
+
+    # Crear caja de resumen. Nace cerrada: si no, Caja.abierta_actual_id() podría
+    # elegirla y las ventas siguientes se anotarían en ella
+    with serializada():
+        Caja.objects.create(
+            usuario=request.user,
+            fecha_apertura=now(),
+            fecha_cierre=now(),
+            monto_inicial=0,
+            monto_cierre=total,
+            abierta=False
+        )
 
     messages.success(request, f"Caja del {periodo} {valor} cerrada con total {total}")
     return redirect("historial_caja")
@@ -92,35 +110,70 @@ SaleItemFormSet = inlineformset_factory(
 )
 
 
-@login_required
-def listar_ventas(request):
-    ventas = Venta.objects.all().order_by('-fecha')
+VENTAS_POR_PAGINA = 50
 
-    # Filtros por fecha
-    fecha_inicio = request.GET.get('fecha_inicio')
-    fecha_fin = request.GET.get('fecha_fin')
+
+@login_required
+async def listar_ventas(request):
+    # Paginación por clave (fecha, id): cada página es un rango sobre el índice
+    # venta_fecha_id_idx, igual de rápida en la primera semana que tras años de ventas.
+    # Async: un filtro de fechas lento no bloquea un hilo que necesita una venta
+    ventas = Venta.objects.select_related('cliente').order_by('-fecha', '-id')
+
+    # Filtros por fecha (rango semiabierto: "hasta" incluye el día completo)
+    try:
+        fecha_inicio = date.fromisoformat(request.GET['fecha_inicio']) if request.GET.get('fecha_inicio') else None
+        fecha_fin = date.fromisoformat(request.GET['fecha_fin']) if request.GET.get('fecha_fin') else None
+    except ValueError:
+        messages.error(request, "Fecha inválida en el filtro.")
+        fecha_inicio = fecha_fin = None
 
     if fecha_inicio:
-        fecha_inicio = timezone.make_aware(datetime.strptime(fecha_inicio, "%Y-%m-%d"))
-        ventas = ventas.filter(fecha__gte=fecha_inicio)
+        ventas = ventas.filter(fecha__gte=resumenes.inicio_del_dia(fecha_inicio))
     if fecha_fin:
-        fecha_fin = timezone.make_aware(datetime.strptime(fecha_fin, "%Y-%m-%d"))
-        ventas = ventas.filter(fecha__lte=fecha_fin)
+        ventas = ventas.filter(fecha__lt=resumenes.inicio_del_dia(fecha_fin + timedelta(days=1)))
+
+    cursor = _leer_cursor(request.GET.get('despues'))
+    if cursor:
+        fecha, venta_id = cursor
+        ventas = ventas.filter(Q(fecha__lt=fecha) | Q(fecha=fecha, id__lt=venta_id))
+
+    pagina = [venta async for venta in ventas[:VENTAS_POR_PAGINA + 1]]
+    siguiente = None
+    if len(pagina) > VENTAS_POR_PAGINA:
+        pagina = pagina[:VENTAS_POR_PAGINA]
+        parametros = request.GET.copy()
+        parametros['despues'] = _crear_cursor(pagina[-1])
+        siguiente = parametros.urlencode()
+
+    caja_abierta = await sync_to_async(Caja.abierta_actual)()
+
+    return await sync_to_async(render)(request, 'inventario/listar_ventas.html', {
+        'ventas': pagina,
+        'caja_abierta': caja_abierta,
+        'siguiente': siguiente,
+        'es_primera_pagina': cursor is None,
+    })
 
-    caja_abierta = Caja.objects.filter(abierta=True).first()
 
-    return render(request, 'inventario/listar_ventas.html', {
-        'ventas': ventas,
-        'caja_abierta': caja_abierta
-    })
+def _crear_cursor(venta):
+    return f"{venta.fecha.isoformat()}_{venta.id}"
+
+
+def _leer_cursor(valor):
+    # "2025-03-01T10:15:00.123456+00:00_42" -> (datetime, 42); un cursor mal formado se ignora
+    if not valor:
+        return None
+    fecha, _, venta_id = valor.rpartition('_')
+    try:
+        return datetime.fromisoformat(fecha), int(venta_id)
+    except ValueError:
+        return None
 
 
 @login_required
 def registrar_venta(request):
-    productos = Producto.objects.all()
-    caja_abierta = Caja.objects.filter(abierta=True).first()
-
-    if not caja_abierta:
+    if not Caja.abierta_actual_id():
         messages.error(request, "No hay ninguna caja abierta. Abre una caja antes de registrar ventas.")
         return redirect('abrir_caja')
 
@@ -133,38 +186,28 @@ def registrar_venta(request):
 
         if not cliente_nombre or not producto_ids:
             messages.error(request, "Debes ingresar el cliente y al menos un producto.")
-            return redirect('ventas_nueva')
-
-        cliente_obj, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
-        venta = Venta.objects.create(cliente=cliente_obj, tipo_comprobante=tipo_comprobante, total=Decimal("0.00"))
-
-        total_venta = Decimal("0.00")
+            return redirect('registrar_venta')
 
+        lineas = []
         for pid, cant, prec in zip(producto_ids, cantidades, precios):
             if not cant or not prec:
                 continue
             try:
+                pid = int(pid)
                 cantidad = Decimal(cant)
                 precio = Decimal(prec)
             except:
                 continue
+            if cantidad <= 0:
+                continue
+            lineas.append((pid, cantidad, precio))
 
-            producto = get_object_or_404(Producto, id=pid)
-
-            if producto.stock < cantidad:
-                messages.error(request, f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}")
-                venta.delete()  # eliminar venta incompleta
-                return redirect('ventas_nueva')
-
-            subtotal = cantidad * precio
-            total_venta += subtotal
-
-            DetalleVenta.objects.create(sale=venta, producto=producto, cantidad=cantidad, precio=precio)
-            producto.stock -= cantidad
-            producto.save()
-
-        venta.total = total_venta
-        venta.save()
+        try:
+            venta = confirmar_venta(cliente_nombre, tipo_comprobante, lineas)
+        except ErrorVenta as e:
+            messages.error(request, str(e))
+            return redirect('registrar_venta')
+        total_venta = venta.total
 
         messages.success(request, f"Venta registrada correctamente. Total: S/. {total_venta:.2f}")
 
@@ -173,7 +216,7 @@ def registrar_venta(request):
         else:
             return redirect('nota_venta', sale_id=venta.id)
 
-    return render(request, 'inventario/registrar_venta.html', {'productos': productos})
+    return render(request, 'inventario/registrar_venta.html')
 
 
 def smartclick_redirect(request, sale_id):
@@ -182,24 +225,21 @@ def smartclick_redirect(request, sale_id):
 
 
 def nota_venta(request, sale_id):
-    sale = get_object_or_404(Venta, id=sale_id)
-    items = DetalleVenta.objects.filter(sale=sale)
-
-    items_con_subtotal = []
-    total = Decimal("0.00")
-    for item in items:
-        subtotal = item.cantidad * item.precio
-        items_con_subtotal.append({
-            'producto': item.producto,
-            'cantidad': item.cantidad,
-            'precio': item.precio,
-            'subtotal': subtotal,
-        })
-        total += subtotal
-
-    context = {
-        'sale': sale,
-        'items': items_con_subtotal,
-        'total': total,
-    }
-    return render(request, 'ventas/nota_venta.html', context)
+    # El ticket se genera una vez por contenido y las reimpresiones salen del disco
+    formato = request.GET.get('formato', 'html')
+    if formato not in tickets.FORMATOS:
+        formato = 'html'
+    ruta, huella = tickets.obtener(sale_id, formato)
+
+    etag = f'"{huella}-{formato}"'
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        extension, content_type = tickets.FORMATOS[formato]
+        response = FileResponse(
+            open(ruta, 'rb'), content_type=content_type,
+            as_attachment=(formato == 'escpos'), filename=f"ticket-{sale_id}.{extension}",
+        )
+        response = servir_archivo(request, response)
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
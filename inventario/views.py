@@ -1,6 +1,4 @@
 from decimal import Decimal
-import openpyxl
-from openpyxl.utils import get_column_letter
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, user_passes_test
@@ -13,9 +11,22 @@ from django.urls import reverse
 from django.utils.timezone import now
 from django.utils import timezone
 from datetime import datetime
-from django.http import HttpResponse, JsonResponse
-from .models import Producto, Categoria, Cliente, Venta, DetalleVenta, Caja
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseBadRequest, JsonResponse
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.paginator import Paginator
+from django.db.models import DecimalField, ExpressionWrapper
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date
+from django.views.decorators.gzip import gzip_page
+import hashlib
+from asgiref.sync import sync_to_async
+from .models import Producto, Categoria, Cliente, Venta, DetalleVenta, Caja, TrabajoImportacion
 from .forms import ProductoForm, VentaForm, DetalleVentaForm, CategoriaForm
+from . import importacion, exportacion, tareas, busqueda, metricas, instrumentacion, etiquetas, catalogo
+from .estaticos import servir_archivo
 from django.db.models import Sum, Count
 from .models import Venta, DetalleVenta, Producto
 from datetime import date
@@ -39,35 +50,22 @@ from .models import Venta, DetalleVenta, Producto
 import json
 from datetime import date
 
-def dashboard(request):
-    # Ventas hoy
-    ventas_hoy = Venta.objects.filter(fecha=date.today()).count()
-
-    # Ventas totales
-    total_ventas = Venta.objects.count()
-
-    # Productos con bajo stock
-    productos_bajo_stock = Producto.objects.filter(stock__lte=5)
-
-    # Productos más vendidos
-    detalles = (
-        DetalleVenta.objects.values('producto__nombre')
-        .annotate(total_cantidad=Sum('cantidad'))
-        .order_by('-total_cantidad')[:5]
-    )
-
-    productos = [item['producto__nombre'] for item in detalles]
-    cantidades = [float(item['total_cantidad']) for item in detalles]  # Convertir Decimal a float
-
+async def dashboard(request):
+    datos = await metricas.aobtener()
     context = {
-        'ventas_hoy': ventas_hoy,
-        'total_ventas': total_ventas,
-        'productos_bajo_stock': productos_bajo_stock,
-        'productos_json': json.dumps(productos),
-        'cantidades_json': json.dumps(cantidades),
+        'ventas_hoy': datos['ventas_hoy'],
+        'total_ventas': datos['total_ventas'],
+        'stock_bajo': datos['stock_bajo'],
+        'productos_json': json.dumps(datos['productos']),
+        'cantidades_json': json.dumps(datos['cantidades']),
     }
+    # La plantilla se arma en un hilo: base.html lee el usuario y los mensajes de la sesión
+    return await sync_to_async(render)(request, 'inventario/dashboard.html', context)
 
-    return render(request, 'inventario/dashboard.html', context)
+def metricas_prometheus(request):
+    if not instrumentacion.autorizado(request):
+        return HttpResponse(status=403)
+    return HttpResponse(instrumentacion.exportar(), content_type='text/plain; version=0.0.4; charset=utf-8')
 
 # --------------------------
 # DECORADOR ADMIN
@@ -83,78 +81,61 @@ def importar_excel(request):
         if not archivo_excel:
             messages.error(request, "Por favor, selecciona un archivo Excel.")
             return redirect("importar_excel")
-        try:
-            Producto.objects.all().delete()  # limpia productos antes de importar
-            workbook = openpyxl.load_workbook(archivo_excel)
-            for hoja in workbook.sheetnames:
-                hoja_excel = workbook[hoja]
-                encabezados = ["Nombre", "Marca", "Categoría", "Formato", "Precio", "Stock", "Vendidos", "Proveedor"]
-                primera_fila = [str(celda.value).strip() if celda.value else "" for celda in next(hoja_excel.iter_rows(min_row=1, max_row=1))]
-                if not all(col in primera_fila for col in encabezados):
-                    messages.error(request, f"La hoja {hoja} no tiene el formato esperado.")
-                    continue
-                idx = {col: primera_fila.index(col) for col in encabezados}
-                for fila in hoja_excel.iter_rows(min_row=2, values_only=True):
-                    if not fila[idx["Nombre"]]:
-                        continue
-                    nombre = fila[idx["Nombre"]]
-                    marca = fila[idx["Marca"]] or ""
-                    categoria_nombre = fila[idx["Categoría"]] or hoja.strip()
-                    unidad_medida = fila[idx["Formato"]] or "unidad"
-                    precio_venta = fila[idx["Precio"]] or 0
-                    stock = fila[idx["Stock"]] or 0
-                    vendidos = fila[idx["Vendidos"]] or 0
-                    proveedor = fila[idx["Proveedor"]] or ""
-                    categoria_obj, _ = Categoria.objects.get_or_create(nombre=categoria_nombre.strip().upper())
-                    Producto.objects.create(
-                        nombre=nombre,
-                        marca=marca,
-                        categoria=categoria_obj,
-                        stock=stock,
-                        unidad_medida=unidad_medida,
-                        precio_venta=precio_venta,
-                        vendidos=vendidos,
-                        proveedor=proveedor
-                    )
-            messages.success(request, "Productos importados correctamente.")
-            return redirect("lista_productos")
-        except Exception as e:
-            messages.error(request, f"Error al importar: {str(e)}")
-            return redirect("importar_excel")
-    return render(request, "inventario/importar_excel.html")
+        modo = request.POST.get("modo", importacion.MODO_ACTUALIZAR)
+        if modo not in dict(importacion.MODOS):
+            # Un modo desconocido nunca debe terminar en el reemplazo (borra el catálogo)
+            return HttpResponseBadRequest("Modo de importación inválido.")
+        trabajo = TrabajoImportacion.objects.create(
+            usuario=request.user if request.user.is_authenticated else None,
+            archivo=archivo_excel,
+            modo=modo,
+        )
+        tareas.encolar_importacion(trabajo)
+        messages.info(request, "Archivo recibido. La importación continúa en segundo plano.")
+        return redirect(f"{reverse('importar_excel')}?trabajo={trabajo.pk}")
+
+    trabajo = None
+    trabajo_id = request.GET.get("trabajo")
+    if trabajo_id and trabajo_id.isdigit():
+        trabajo = TrabajoImportacion.objects.filter(pk=trabajo_id).first()
+    return render(request, "inventario/importar_excel.html", {"modos": importacion.MODOS, "trabajo": trabajo})
+
+
+@login_required
+def estado_importacion(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoImportacion, pk=trabajo_id)
+    return JsonResponse(tareas.estado_trabajo(trabajo))
 
 # --------------------------
 # EXPORTAR EXCEL DE PRODUCTOS
 # --------------------------
 
 def exportar_excel(request):
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Inventario"
-    encabezados = ["Nombre", "Marca", "Categoría", "Formato", "Precio", "Stock", "Vendidos", "Proveedor"]
-    ws.append(encabezados)
-
-    for producto in Producto.objects.all():
-        fila = [
-            producto.nombre,
-            producto.marca,
-            producto.categoria.nombre if producto.categoria else "",
-            producto.unidad_medida,
-            float(producto.precio_venta),
-            float(producto.stock),
-            float(producto.vendidos),
-            producto.proveedor or "",
-        ]
-        ws.append(fila)
+    formato = request.GET.get("formato", "xlsx")
+    if formato not in exportacion.FORMATOS:
+        formato = "xlsx"
+    return servir_archivo(request, exportacion.exportar(formato, asincrono=isinstance(request, ASGIRequest)))
 
-    for i, col in enumerate(ws.columns, 1):
-        max_length = max(len(str(cell.value)) for cell in col)
-        ws.column_dimensions[get_column_letter(i)].width = max_length + 2
+# --------------------------
+# REPORTE DE VENTAS POR PERIODO
+# --------------------------
+REPORTE_DIAS_MAXIMO = 731
 
-    response = HttpResponse(content_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet")
-    response['Content-Disposition'] = 'attachment; filename=Inventario.xlsx'
-    wb.save(response)
-    return response
+
+@login_required
+def reporte_ventas(request):
+    # ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD (por defecto, el mes en curso). XLSX con una hoja por desglose.
+    hoy = timezone.localdate()
+    try:
+        desde = date.fromisoformat(request.GET['desde']) if request.GET.get('desde') else hoy.replace(day=1)
+        hasta = date.fromisoformat(request.GET['hasta']) if request.GET.get('hasta') else hoy
+    except ValueError:
+        return JsonResponse({'error': 'Fechas inválidas (formato AAAA-MM-DD)'}, status=400)
+    if desde > hasta or (hasta - desde).days >= REPORTE_DIAS_MAXIMO:
+        return JsonResponse({'error': f'El rango debe ser de 1 a {REPORTE_DIAS_MAXIMO} días'}, status=400)
+    # pandas tarda en importarse y ocupa memoria: solo lo cargan los workers que generan reportes
+    from . import reportes
+    return servir_archivo(request, reportes.exportar_xlsx(desde, hasta))
 
 # --------------------------
 # HISTORIAL DE CAJA
@@ -225,10 +206,26 @@ def login_view(request):
 # LISTA DE PRODUCTOS
 # --------------------------
 
+PRODUCTOS_POR_PAGINA = 50
+
+
+def _productos_con_inversion():
+    # total_inversion se calcula en SQL, no fila por fila en Python
+    return Producto.objects.annotate(
+        total_inversion=ExpressionWrapper(
+            F('precio_venta') * F('stock'), output_field=DecimalField(max_digits=22, decimal_places=4)
+        )
+    )
+
+
+def _pagina_categoria(categoria, numero_pagina):
+    productos = _productos_con_inversion().filter(categoria=categoria).order_by('nombre', 'id')
+    return Paginator(productos, PRODUCTOS_POR_PAGINA).get_page(numero_pagina)
+
+
 def lista_productos(request):
     query = request.GET.get('q', '')
-    categorias = Categoria.objects.all().order_by("nombre")
-    productos_por_categoria = {}
+    categorias = list(Categoria.objects.all().order_by("nombre"))
 
     if request.method == "POST" and 'nueva_categoria' in request.POST and request.user.is_superuser:
         categoria_form = CategoriaForm(request.POST)
@@ -239,47 +236,46 @@ def lista_productos(request):
     else:
         categoria_form = CategoriaForm()
 
-    for categoria in categorias:
-        productos_categoria = Producto.objects.filter(categoria=categoria).order_by("nombre")
-        productos_list = []
-        for p in productos_categoria:
-            stock = p.stock or 0
-            precio_venta = p.precio_venta or 0
-            total_inversion = precio_venta * stock
-            productos_list.append({
-                'obj': p,
-                'total_inversion': total_inversion,
-            })
-        productos_por_categoria[categoria] = productos_list
+    # Solo se consulta la pestaña visible; las demás se cargan al abrirlas
+    categoria_activa = None
+    page_obj = None
+    if not query and categorias:
+        categoria_id = request.GET.get('categoria')
+        categoria_activa = next((c for c in categorias if str(c.id) == categoria_id), categorias[0])
+        page_obj = _pagina_categoria(categoria_activa, request.GET.get('page'))
 
     productos_filtrados = []
     if query:
-        qs = Producto.objects.filter(Q(nombre__icontains=query) | Q(marca__icontains=query))
-        for p in qs:
-            stock = p.stock or 0
-            precio_venta = p.precio_venta or 0
-            total_inversion = precio_venta * stock
-            productos_filtrados.append({
-                'obj': p,
-                'total_inversion': total_inversion,
-            })
+        productos_filtrados = busqueda.buscar_productos(query, queryset=_productos_con_inversion())
 
     context = {
         'categorias': categorias,
-        'productos_por_categoria': productos_por_categoria,
+        'categoria_activa': categoria_activa,
+        'page_obj': page_obj,
         'query': query,
         'productos_filtrados': productos_filtrados,
         'categoria_form': categoria_form,
     }
     return render(request, 'inventario/lista_productos.html', context)
 
+
+def productos_categoria(request, categoria_id):
+    # Fragmento HTML con una página de productos de la categoría (pestañas diferidas)
+    categoria = get_object_or_404(Categoria, id=categoria_id)
+    page_obj = _pagina_categoria(categoria, request.GET.get('page'))
+    return render(request, 'inventario/tabla_productos.html', {
+        'productos': page_obj,
+        'page_obj': page_obj,
+        'categoria': categoria,
+    })
+
 # --------------------------
 # API PRODUCTO
 # --------------------------
 
-def producto_api(request, pk):
+async def producto_api(request, pk):
     try:
-        producto = Producto.objects.get(pk=pk)
+        producto = await Producto.objects.aget(pk=pk)
         data = {
             'id': producto.id,
             'nombre': producto.nombre,
@@ -290,89 +286,195 @@ def producto_api(request, pk):
     except Producto.DoesNotExist:
         return JsonResponse({'error': 'Producto no encontrado'}, status=404)
 
+LOTE_MAXIMO = 500
+CAMPOS_LOTE = ('id', 'nombre', 'precio_venta', 'stock', 'actualizado')
+
+
+@login_required
+def productos_lote(request):
+    # Precio y stock de muchos productos en una sola consulta:
+    #   ?ids=1,2,3      los productos del carrito
+    #   ?desde=<ISO>    los que cambiaron después de esa marca de tiempo
+    # ETag y Last-Modified salen de la columna `actualizado`, así que si nada
+    # cambió el navegador recibe un 304 sin cuerpo.
+    consulta = Producto.objects.order_by('id')
+    ids = []
+    if request.GET.get('ids'):
+        try:
+            ids = sorted({int(pid) for pid in request.GET['ids'].split(',') if pid.strip()})
+        except ValueError:
+            return JsonResponse({'error': 'ids inválidos'}, status=400)
+        if len(ids) > LOTE_MAXIMO:
+            return JsonResponse({'error': f'Máximo {LOTE_MAXIMO} productos por consulta'}, status=400)
+        consulta = consulta.filter(pk__in=ids)
+    elif request.GET.get('desde'):
+        desde = parse_datetime(request.GET['desde'])
+        if desde is None:
+            return JsonResponse({'error': 'Fecha "desde" inválida'}, status=400)
+        if timezone.is_naive(desde):
+            desde = timezone.make_aware(desde)
+        # En orden de versión, para que `version` sirva como cursor si hay más páginas
+        consulta = consulta.filter(actualizado__gt=desde).order_by('actualizado', 'id')[:LOTE_MAXIMO]
+    else:
+        return JsonResponse({'error': 'Indica ids o desde'}, status=400)
+
+    filas = list(consulta.values(*CAMPOS_LOTE))
+    ultima = max((fila['actualizado'] for fila in filas), default=None)
+    version = '|'.join(f"{fila['id']}:{fila['actualizado'].timestamp()}" for fila in filas)
+    etag = '"%s"' % hashlib.md5(f"{request.GET.urlencode()}|{version}".encode()).hexdigest()
+    ultima_ts = int(ultima.timestamp()) if ultima else None
+
+    response = get_conditional_response(request, etag=etag, last_modified=ultima_ts)
+    if response is None:
+        encontrados = {fila['id'] for fila in filas}
+        response = JsonResponse({
+            'productos': filas,
+            'faltantes': [pid for pid in ids if pid not in encontrados],
+            'hay_mas': not ids and len(filas) == LOTE_MAXIMO,
+            # Marca exacta para el siguiente ?desde= (el JSON recorta a milisegundos)
+            'version': ultima.isoformat() if ultima else request.GET.get('desde'),
+        })
+    response['ETag'] = etag
+    if ultima_ts:
+        response['Last-Modified'] = http_date(ultima_ts)
+    # Siempre revalidar: el stock cambia con cada venta
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+AUTOCOMPLETAR_POR_PAGINA = 20
+AUTOCOMPLETAR_CACHE_SEGUNDOS = 30
+CAMPOS_AUTOCOMPLETAR = ('id', 'nombre', 'marca', 'stock', 'precio_venta')
+
+
+@login_required
+async def producto_autocompletar(request):
+    # Búsqueda paginada para select2 (modo ajax) en la pantalla de ventas.
+    # Async: mientras espera a la BD o a la caché no ocupa un hilo del worker
+    query = request.GET.get('q', '').strip()
+    try:
+        pagina = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        pagina = 1
+
+    clave = 'autocompletar:' + hashlib.md5(f"{busqueda.normalizar(query)}|{pagina}".encode()).hexdigest()
+    cuerpo = await cache.aget(clave)
+    if cuerpo is None:
+        cuerpo = json.dumps(await _pagina_autocompletar(query, pagina), cls=DjangoJSONEncoder)
+        await cache.aset(clave, cuerpo, AUTOCOMPLETAR_CACHE_SEGUNDOS)
+
+    etag = '"%s"' % hashlib.md5(cuerpo.encode()).hexdigest()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = HttpResponse(cuerpo, content_type='application/json')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=AUTOCOMPLETAR_CACHE_SEGUNDOS)
+    return response
+
+
+async def _pagina_autocompletar(query, pagina):
+    inicio = (pagina - 1) * AUTOCOMPLETAR_POR_PAGINA
+    fin = inicio + AUTOCOMPLETAR_POR_PAGINA
+    if query:
+        # Primero los que empiezan con el texto, luego los parecidos (tolerante a errores)
+        prefijo = [
+            pid async for pid in Producto.objects.filter(nombre__istartswith=query)
+            .order_by('nombre').values_list('id', flat=True)[:busqueda.LIMITE_RESULTADOS]
+        ]
+        vistos = set(prefijo)
+        ids = prefijo + [pid for pid in await busqueda.abuscar(query) if pid not in vistos]
+        por_id = {
+            fila['id']: fila
+            async for fila in Producto.objects.filter(pk__in=ids[inicio:fin]).values(*CAMPOS_AUTOCOMPLETAR)
+        }
+        filas = [por_id[pid] for pid in ids[inicio:fin] if pid in por_id]
+        hay_mas = len(ids) > fin
+    else:
+        filas = [
+            fila async for fila in Producto.objects.order_by('nombre', 'id').values(*CAMPOS_AUTOCOMPLETAR)[inicio:fin + 1]
+        ]
+        hay_mas = len(filas) > AUTOCOMPLETAR_POR_PAGINA
+        filas = filas[:AUTOCOMPLETAR_POR_PAGINA]
+
+    for fila in filas:
+        fila['text'] = f"{fila['nombre']} - {fila['marca']} (Stock: {fila['stock']}) - S/. {fila['precio_venta']:.2f}"
+    return {'results': filas, 'pagination': {'more': hay_mas}}
+
+
+@login_required
+async def producto_escanear(request):
+    # Lectura de la pistola en caja: una búsqueda exacta por el índice único de codigo_barras
+    codigo = request.GET.get('codigo', '').strip()
+    fila = await Producto.objects.filter(codigo_barras=codigo).values(*CAMPOS_AUTOCOMPLETAR).afirst() if codigo else None
+    if fila is None:
+        return JsonResponse({'error': 'Código no registrado', 'codigo': codigo}, status=404)
+    return JsonResponse(fila)
+
+
 # --------------------------
-# REGISTRAR VENTA
+# CATÁLOGO OFFLINE DEL POS
 # --------------------------
+# La caja guarda una copia del catálogo en el navegador (IndexedDB) y la pone al día
+# pidiendo solo lo que cambió desde su versión; sin red sigue vendiendo con esa copia.
+
+@login_required
+@gzip_page
+def catalogo_instantanea(request):
+    # Catálogo completo en filas compactas; el ETag es la versión confirmada del catálogo
+    # (una lectura del contador), así que una recarga sin cambios se resuelve con un 304
+    etag = '"catalogo-%d"' % catalogo.version_actual()
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        response = JsonResponse(catalogo.instantanea())
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
-def registrar_venta(request):
-    productos = Producto.objects.all()
-    caja_abierta = Caja.objects.filter(abierta=True).first()
-    if not caja_abierta:
-        messages.error(request, "No hay ninguna caja abierta. Abre una caja antes de registrar ventas.")
-        return redirect('abrir_caja')
 
-    if request.method == 'POST':
-        cliente_nombre = request.POST.get('cliente')
-        tipo_comprobante = request.POST.get('tipo_comprobante')
-        producto_ids = request.POST.getlist('producto_id[]')
-        cantidades = request.POST.getlist('cantidad[]')
-        precios = request.POST.getlist('precio[]')
-
-        if not cliente_nombre or not producto_ids:
-            messages.error(request, "Debes ingresar el cliente y al menos un producto.")
-            return redirect('registrar_venta')
-
-        cliente_obj, _ = Cliente.objects.get_or_create(nombre=cliente_nombre)
-        venta = Venta.objects.create(cliente=cliente_obj, tipo_comprobante=tipo_comprobante, total=0)
-        total_venta = Decimal("0.00")
-
-        for pid, cant, prec in zip(producto_ids, cantidades, precios):
-            if not cant or not prec:
-                continue
-            try:
-                cantidad = int(cant)
-                precio = Decimal(prec)
-            except ValueError:
-                continue
-
-            producto = get_object_or_404(Producto, id=pid)
-
-            if producto.stock < cantidad:
-                messages.error(request, f"Stock insuficiente para {producto.nombre}. Disponible: {producto.stock}")
-                return redirect('registrar_venta')
-
-            subtotal = cantidad * precio
-            total_venta += subtotal
-
-            DetalleVenta.objects.create(sale=venta, producto=producto, cantidad=cantidad, precio=precio)
-            producto.stock -= cantidad
-            producto.save()
-
-        venta.total = total_venta
-        venta.save()
-        messages.success(request, f"Venta registrada correctamente. Total: S/. {total_venta:.2f}")
-
-        if tipo_comprobante in ['Boleta', 'Factura']:
-            return redirect('smartclick_redirect', sale_id=venta.id)
-        else:
-            return redirect('nota_venta', sale_id=venta.id)
+@login_required
+@gzip_page
+def catalogo_cambios(request):
+    # ?desde=N: productos creados o modificados y los ids borrados con versión > N
+    try:
+        desde = int(request.GET.get('desde', ''))
+    except ValueError:
+        return JsonResponse({'error': 'Indica desde (versión del catálogo)'}, status=400)
+    if desde < 0:
+        return JsonResponse({'error': 'Versión inválida'}, status=400)
+    response = JsonResponse(catalogo.cambios(desde))
+    patch_cache_control(response, private=True, no_store=True)
+    return response
 
-    return render(request, 'inventario/registrar_venta.html', {'productos': productos})
 
 # --------------------------
-# VISTA NOTA DE VENTA
+# ETIQUETAS CON CÓDIGO DE BARRAS
 # --------------------------
 
-def nota_venta(request, sale_id):
-    sale = get_object_or_404(Venta, id=sale_id)
-    items = DetalleVenta.objects.filter(sale=sale)
-    items_con_subtotal = []
-    total = 0
-    for item in items:
-        subtotal = item.cantidad * item.precio
-        items_con_subtotal.append({
-            'producto': item.producto,
-            'cantidad': item.cantidad,
-            'precio': item.precio,
-            'subtotal': subtotal,
-        })
-        total += subtotal
-    return render(request, 'ventas/nota_venta.html', {
-        'sale': sale,
-        'items': items_con_subtotal,
-        'total': total,
-    })
-
+@login_required
+def etiquetas_productos(request):
+    # Hoja PDF para imprimir: ?categoria=<id> o ?trabajo=<id de importación>.
+    # Con ?por_stock=1 sale una etiqueta por cada caja en stock.
+    try:
+        categoria_id = int(request.GET['categoria']) if request.GET.get('categoria') else None
+        trabajo_id = int(request.GET['trabajo']) if request.GET.get('trabajo') else None
+    except ValueError:
+        return JsonResponse({'error': 'categoria/trabajo inválidos'}, status=400)
+    if categoria_id is None and trabajo_id is None:
+        return JsonResponse({'error': 'Indica categoria o trabajo'}, status=400)
+
+    consulta = etiquetas.seleccionar(categoria_id=categoria_id, trabajo_id=trabajo_id)
+    por_stock = request.GET.get('por_stock') == '1'
+    # Se cuenta en la BD antes de armar la lista: una categoría con mucho stock no llega a memoria
+    cantidad = etiquetas.contar(consulta, por_stock=por_stock)
+    if not cantidad:
+        raise Http404("No hay productos para etiquetar")
+    if cantidad > etiquetas.MAXIMO:
+        return JsonResponse({'error': f'Máximo {etiquetas.MAXIMO} etiquetas por hoja'}, status=400)
+    lista = etiquetas.etiquetas(consulta, por_stock=por_stock)
+
+    nombre = f"etiquetas-categoria-{categoria_id}" if categoria_id is not None else f"etiquetas-importacion-{trabajo_id}"
+    response = FileResponse(open(etiquetas.hoja(lista), 'rb'), content_type='application/pdf', filename=f"{nombre}.pdf")
+    return servir_archivo(request, response)
 
 # --------------------------
 # CRUD PRODUCTOS